@@ -0,0 +1,97 @@
+"""
+Checks the DuckDB MOER stage (utils.refresh.write_asset_moer) against the
+pandas data_add_moer it replaced, on a synthetic annual asset table, and
+times both.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_asset_moer [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from utils.refresh import write_asset_moer
+from utils.utils import data_add_moer
+
+
+SUBSECTORS = ['electricity-generation', 'iron-and-steel', 'cement', 'aluminum', 'road-transportation', None]
+
+
+def make_frames(rows, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    def numeric_text(size):
+        # what comes back from postgres: numbers as text, with gaps and junk
+        values = rng.uniform(0, 1000, size).round(3).astype(str).astype(object)
+        values[rng.random(size) < 0.1] = None
+        values[rng.random(size) < 0.02] = 'n/a'
+        return values
+
+    df_asset = pd.DataFrame({
+        'row_id': np.arange(rows),
+        'asset_id': rng.integers(0, rows // 2, rows).astype(str),
+        'subsector': rng.choice(np.array(SUBSECTORS, dtype=object), rows),
+        'asset_type': rng.choice(np.array(['biomass', 'coal', 'gas', None], dtype=object), rows),
+        'activity': np.where(rng.random(rows) < 0.05, 0.0, rng.uniform(0, 1e6, rows)),
+        'emissions_quantity': rng.uniform(0, 1e6, rows),
+        'average_emissions_factor': rng.uniform(0, 2, rows),
+    })
+    for n in range(1, 11):
+        df_asset[f'other{n}'] = numeric_text(rows)
+
+    moer_ids = rng.choice(rows // 2, rows // 4, replace=False)
+    df_moer = pd.DataFrame({
+        'asset_id': moer_ids,
+        'original_inventory_sector': rng.choice(np.array(SUBSECTORS[:3], dtype=object), len(moer_ids)),
+        'year': 2023.0,
+        'moer_avg': rng.uniform(500, 2500, len(moer_ids)),
+    })
+
+    return df_asset, df_moer
+
+
+def main():
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / 'percentile_moer').mkdir()
+        df_asset, df_moer = make_frames(rows)
+        df_asset.to_parquet(tmp / 'assets.parquet', index=False)
+        df_moer.to_parquet(tmp / 'percentile_moer' / 'asset_moer_2023.parquet', index=False)
+        del df_asset, df_moer
+
+        # data_add_moer reads the MOER file relative to data/
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            start = time.perf_counter()
+            df = data_add_moer(pd.read_parquet('assets.parquet'), cond={'moer': True})
+            df.to_parquet('pandas.parquet', index=False)
+            pandas_time = time.perf_counter() - start
+            del df
+
+            start = time.perf_counter()
+            write_asset_moer('assets.parquet', 'percentile_moer/asset_moer_2023.parquet', 'duckdb.parquet')
+            duckdb_time = time.perf_counter() - start
+
+            expected = pd.read_parquet('pandas.parquet').sort_values('row_id').reset_index(drop=True)
+            result = pd.read_parquet('duckdb.parquet').sort_values('row_id').reset_index(drop=True)
+        finally:
+            os.chdir(cwd)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    print(f"{rows:,} assets, outputs match")
+    print(f"pandas data_add_moer: {pandas_time:,.2f} s")
+    print(f"duckdb stage:         {duckdb_time:,.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Times get_reduction_induction_json against the iterrows version it replaced,
+on a synthetic subsector-level frame with hundreds of receiving/inducing
+pairs, and checks both return the same structure.
+
+Run from the repo root, as a module so utils is importable (running the
+file directly fails on the import):
+
+    python -m benchmarks.bench_reduction_induction_json
+"""
+import math
+import time
+import numpy as np
+import pandas as pd
+from utils.utils import format_number_short, get_reduction_induction_json
+
+
+def get_reduction_induction_json_iterrows(df_stacked_bar, df_induced):
+    def safe_format_number(x):
+        if x is None or (isinstance(x, float) and math.isnan(x)):
+            return "0"
+        return format_number_short(x)
+
+    summary = []
+
+    for _, row in df_stacked_bar.iterrows():
+        sector = row["sector"]
+
+        sector_inductions = df_induced[df_induced["receiving_sector"] == sector]
+        inductions_list = []
+        for _, ind in sector_inductions.iterrows():
+            if ind["induced_emissions"] is not None and not math.isnan(ind["induced_emissions"]):
+                inductions_list.append({
+                    "inducing_sector": ind["inducing_sector"],
+                    "induced_emissions": ind["induced_emissions"],
+                    "formatted": safe_format_number(ind["induced_emissions"])
+                })
+
+        asset_reductions = row.get("emissions_reduced_at_asset", 0) or 0
+        reduction_potential = row.get("emissions_reduction_potential", 0) or 0
+        static_emissions = row.get("static_emissions_q", 0) or 0
+
+        asset_reductions_fmt = safe_format_number(asset_reductions)
+        reduction_potential_fmt = safe_format_number(reduction_potential)
+        static_emissions_fmt = safe_format_number(static_emissions)
+
+        total_inductions = sum(
+            ind["induced_emissions"] for ind in inductions_list if ind["induced_emissions"] is not None
+        )
+        total_inductions_fmt = safe_format_number(total_inductions)
+        total_inductions_color = "red" if total_inductions >= 0 else "green"
+
+        hover_lines = [f"<b>{sector}</b>"]
+        hover_lines.append("&nbsp;")
+        hover_lines.append(
+            f"<span style='color:green; font-size:13px; font-weight:bold'>&nbsp;{asset_reductions_fmt}</span>&nbsp;&nbsp;&nbsp;<span style='font-size:13px; font-weight:bold'>Asset Reductions</span>"
+        )
+        hover_lines.append("&nbsp;")
+
+        if inductions_list:
+            hover_lines.append(
+                f"<span style='color:{total_inductions_color}; font-size:13px; font-weight:bold'>{total_inductions_fmt}</span> "
+                f"<span style='font-size:13px; font-weight:bold'>&nbsp;&nbsp;Net Inductions:</span>"
+            )
+            for ind in inductions_list:
+                val = ind["induced_emissions"]
+                color = "red" if val >= 0 else "green"
+                hover_lines.append(
+                    f"&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;(<span style='color:{color}'>{ind['formatted']}</span>) <i>{ind['inducing_sector']}</i>"
+                )
+        else:
+            hover_lines.append(
+                "<span style='color:green; font-size:13px; font-weight:bold'>&nbsp;0&nbsp;&nbsp;</span> "
+                "<span style='font-size:13px; font-weight:bold'>Net Inductions</span>"
+            )
+
+        hover_lines.append("────────────────────")
+        hover_lines.append(
+            f"<span style='color:green; font-size:14px; font-weight:bold'>✅ {reduction_potential_fmt} Net Reduction Opportunity</span>"
+        )
+
+        summary.append({
+            "sector": sector,
+            "asset_reductions": asset_reductions,
+            "asset_reductions_formatted": asset_reductions_fmt,
+            "reduction_potential": reduction_potential,
+            "reduction_potential_formatted": reduction_potential_fmt,
+            "static_emissions": static_emissions,
+            "static_emissions_formatted": static_emissions_fmt,
+            "inductions": inductions_list,
+            "hover_text": "<br>".join(hover_lines)
+        })
+
+    return summary
+
+
+def make_frames(n_sectors=250, n_inducing=200, seed=0):
+
+    rng = np.random.default_rng(seed)
+    sectors = [f"subsector-{i:03d}" for i in range(n_sectors)]
+    inducing = [f"subsector-{i:03d}" for i in range(n_inducing)]
+
+    # magnitudes from tens to billions so every format branch is hit
+    def emissions(size):
+        return rng.choice([-1, 1], size) * 10 ** rng.uniform(1, 10, size)
+
+    df_stacked_bar = pd.DataFrame({
+        "sector": sectors,
+        "static_emissions_q": np.abs(emissions(n_sectors)),
+        "emissions_reduction_potential": np.abs(emissions(n_sectors)),
+        "emissions_reduced_at_asset": np.abs(emissions(n_sectors)),
+    })
+
+    pairs = pd.MultiIndex.from_product([sectors, inducing], names=["receiving_sector", "inducing_sector"])
+    df_induced = pairs.to_frame(index=False).sample(frac=0.3, random_state=seed).reset_index(drop=True)
+    df_induced["induced_emissions"] = emissions(len(df_induced))
+    df_induced.loc[df_induced.sample(frac=0.05, random_state=seed).index, "induced_emissions"] = np.nan
+
+    return df_stacked_bar, df_induced
+
+
+def best_of(fn, *args, repeat=3):
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+
+def main():
+
+    df_stacked_bar, df_induced = make_frames()
+    print(f"{len(df_stacked_bar)} receiving sectors, {len(df_induced):,} induction rows")
+
+    old_time, old = best_of(get_reduction_induction_json_iterrows, df_stacked_bar, df_induced)
+    new_time, new = best_of(get_reduction_induction_json, df_stacked_bar, df_induced)
+
+    assert old == new, "grouped builder differs from the iterrows version"
+
+    print(f"iterrows: {old_time * 1000:,.1f} ms")
+    print(f"grouped:  {new_time * 1000:,.1f} ms ({old_time / new_time:,.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,26 @@ CONFIG = {
     "asset_emissions_country_subsector_path": "data/asset_emissions/country_subsector_level/*.parquet",
     "country_subsector_stats_path": "data/statistics/country_subsector_emissions_statistics/*.parquet",
     "country_subsector_totals_path": "data/statistics/country_subsector_emissions_totals/*.parquet",
+    "monthly_cube_path": "data/asset_emissions/monthly_cube/*.parquet",
     "gadm_1_statistics_path": "data/statistics/gadm_1_emissions_statistics/*.parquet",
+    "gadm_1_statistics_store_path": "data/statistics/gadm_1_emissions_statistics_store/*.parquet",
     "percentile_path": "data/percentile_moer/ct_percentile_40sectors_moer_stat_industrial_20250824.parquet",
-    "annual_asset_path": "data/asset_emissions/asset_level_2024/*.parquet",
+    "annual_asset_path": "data/asset_emissions/asset_level_2024/**/*.parquet",
+    "asset_induced_emissions_path": "data/asset_emissions/asset_induced_emissions/*.parquet",
+    "sector_reduction_rollup_path": "data/asset_emissions/sector_reduction_rollup/*.parquet",
+    "reduction_cube_path": "data/asset_emissions/reduction_cube/*.parquet",
     "city_path": "data/city_emissions/*.parquet",
     "gadm_0_path": "data/gadm_emissions/gadm_0/*.parquet",
     "gadm_1_path": "data/gadm_emissions/gadm_1/*.parquet",
     "gadm_2_path": "data/gadm_emissions/gadm_2/*.parquet",
     "asset_ownership_path": "data/ownership/*.parquet",
+    "ownership_fact_path": "data/ownership/ownership_fact/*.parquet",
+    "ownership_closure_path": "data/ownership/ownership_closure/*.parquet",
+    "ownership_rollup_path": "data/ownership/ownership_rollup/*.parquet",
     "demographic_path": "data/demographic/*.parquet",
+    "query_cache_max_mb": 256,
+    "postgres_pool_min": 1,
+    "postgres_pool_max": 8,
     "region_options": [
         'Global', 'EU', 'OECD', 'Non-OECD',
         'UNFCCC Annex', 'UNFCCC Non-Annex', 'G20',
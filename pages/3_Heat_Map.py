@@ -1,9 +1,7 @@
 import streamlit as st
 import base64
-import duckdb
 
-from config import CONFIG
-from utils.utils import get_release_version
+from utils.connection import get_release
 #from tabs.tab01_emissions_reduction_tab import show_emissions_reduction_plan
 #from tabs.tab02_abatement_curve_tab import show_abatement_curve
 from tabs.tab06_reduction_heatmap import show_reduction_heatmap
@@ -51,9 +49,6 @@ st.markdown(
 
 logo_base64 = get_base64_of_bin_file("Climate TRACE Logo.png")
 
-asset_path = CONFIG['asset_emissions_country_subsector_path']
-
-con = duckdb.connect()
 
 st.markdown(
         f"""
@@ -62,7 +57,7 @@ st.markdown(
             <h1 style="margin: 0; font-size: 2.8em;">Climate TRACE Heat Map (Beta)</h1>
         </div>
         <p style="margin-top: 2px; font-size: 1em; font-style: italic;">
-            The data in this dashboard is from Climate TRACE release <span style='color: red;'><strong>{get_release_version(con, asset_path)}</strong></span> (excluding forestry), covering 740 million assets globally.
+            The data in this dashboard is from Climate TRACE release <span style='color: red;'><strong>{get_release()}</strong></span> (excluding forestry), covering 740 million assets globally.
         </p>
         <p style="margin-top: 2px; font-size: 1em; font-style: italic;">
             This web application is for the internal use of Climate TRACE and its partners only. The data displayed may be revised, updated, rearranged, or deleted without prior communication to users, and is not warranted to be error free.
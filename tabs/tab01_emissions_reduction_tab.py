@@ -1,6 +1,5 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import duckdb
 import json
 import pandas as pd
 import numpy as np
@@ -12,6 +11,9 @@ from calendar import month_name
 import calendar
 from collections import defaultdict
 from config import CONFIG
+from utils.connection import get_connection, has_table, table_ref
+from utils.geography import get_country_map, geography_names
+from utils.query_cache import run_cached_query
 from utils.utils import *
 from utils.queries import *
 
@@ -35,23 +37,21 @@ def show_emissions_reduction_plan():
     )
 
     # configure data paths and region options for querying
-    annual_asset_path = CONFIG['annual_asset_path']
-    city_path = CONFIG['city_path']
-    gadm_0_path = CONFIG['gadm_0_path']
-    gadm_1_path = CONFIG['gadm_1_path']
-    gadm_2_path = CONFIG['gadm_2_path']
-    country_subsector_totals_path = CONFIG['country_subsector_totals_path']
-    percentile_path = CONFIG['percentile_path']
+    annual_asset_path = table_ref('annual_asset_path')
+    asset_induced_emissions_path = table_ref('asset_induced_emissions_path')
+    sector_reduction_rollup_path = table_ref('sector_reduction_rollup_path')
+    city_path = table_ref('city_path')
+    gadm_0_path = table_ref('gadm_0_path')
+    gadm_1_path = table_ref('gadm_1_path')
+    gadm_2_path = table_ref('gadm_2_path')
+    country_subsector_totals_path = table_ref('country_subsector_totals_path')
+    percentile_path = table_ref('percentile_path')
     region_options = CONFIG['region_options']
-    gadm_0_path = CONFIG['gadm_0_path']
+    gadm_0_path = table_ref('gadm_0_path')
 
-    con = duckdb.connect()
+    con = get_connection()
 
-    country_rows = con.execute(
-            f"SELECT DISTINCT country_name, iso3_country FROM '{gadm_0_path}' WHERE country_name IS NOT NULL order by country_name"
-        ).fetchall()
-
-    country_map = {row[0]: row[1] for row in country_rows}
+    country_map = get_country_map()
     unique_countries = list(country_map.keys())
 
     selected_year = 2024
@@ -117,14 +117,9 @@ def show_emissions_reduction_plan():
     if region_condition is not None:
         col = region_condition['column_name']
         val = region_condition['column_value']
-        if isinstance(val, list):
-            val_str = "(" + ", ".join(f"'{v}'" for v in val) + ")"
-        else:
-            val_str = f"('{val}')"
     else:
         col = None
         val = None
-        val_str = None
 
     country_selected_bool = selected_region != "Global"
 
@@ -140,11 +135,7 @@ def show_emissions_reduction_plan():
                 on_change=mark_ro_recompute
             )
         else:
-            state_province_options = ['-- Select State / Province --'] + sorted(
-                row[0] for row in con.execute(
-                    f"SELECT DISTINCT gadm_1_name FROM '{gadm_1_path}' WHERE {col} IN {val_str} and gadm_1_name is not null"
-                ).fetchall()
-            )
+            state_province_options = ['-- Select State / Province --'] + geography_names('gadm_1_name', col, val)
 
             selected_state_province = st.selectbox(
                 "State / Province",
@@ -169,26 +160,11 @@ def show_emissions_reduction_plan():
             )
         else:
             if selected_state_province and not selected_state_province.startswith("--"):
-                county_district_options = ['-- Select County / District --'] + sorted(
-                    row[0] for row in con.execute(
-                        f"SELECT DISTINCT gadm_2_name FROM '{gadm_2_path}' WHERE gadm_1_name = '{selected_state_province.replace("'", "''")}'"
-                    ).fetchall()
+                county_district_options = ['-- Select County / District --'] + geography_names(
+                    'gadm_2_name', 'gadm_1_name', selected_state_province
                 )
             elif col and val is not None:
-                # Convert val to string and escape any single quotes
-                if isinstance(val, list):
-                    sanitized_vals = [str(v).replace("'", "''") for v in val]
-                    val_str = "(" + ", ".join(f"'{v}'" for v in sanitized_vals) + ")"
-                    filter_clause = f"{col} IN {val_str}"
-                else:
-                    val_str = str(val).replace("'", "''")
-                    filter_clause = f"{col} = '{val_str}'"
-
-                county_district_options = ['-- Select County / District --'] + sorted(
-                    row[0] for row in con.execute(
-                        f"SELECT DISTINCT gadm_2_name FROM '{gadm_2_path}' WHERE {filter_clause}"
-                    ).fetchall()
-                )
+                county_district_options = ['-- Select County / District --'] + geography_names('gadm_2_name', col, val)
             else:
                 county_district_options = ['-- Select County / District --']
 
@@ -214,26 +190,7 @@ def show_emissions_reduction_plan():
                 on_change=mark_ro_recompute
             )
         else:
-            def duckdb_safe_val(v):
-                if isinstance(v, bool):
-                    return "TRUE" if v else "FALSE"
-                return f"'{str(v).replace("'", "''")}'"
-
-            if isinstance(val, list):
-                val_str = "(" + ", ".join([duckdb_safe_val(v) for v in val]) + ")"
-            else:
-                # Treat single value as a list of one
-                val_str = f"({duckdb_safe_val(val)})"
-
-            query = f"""
-                SELECT DISTINCT city_name 
-                FROM '{city_path}' 
-                WHERE {col} IN {val_str} AND city_name IS NOT NULL
-            """
-
-            city_options = ['-- Select City --'] + sorted(
-                row[0] for row in con.execute(query).fetchall()
-            )
+            city_options = ['-- Select City --'] + geography_names('city_name', col, val)
 
             selected_city = st.selectbox(
                 "City",
@@ -248,7 +205,9 @@ def show_emissions_reduction_plan():
         forestry_toggle = st.radio(
             "Forestry Data:",
             ["Exclude", "Include"],
-            horizontal=True
+            horizontal=True,
+            key="forestry_toggle_RO",
+            on_change=mark_ro_recompute
         )
 
         if forestry_toggle == "Exclude":
@@ -467,21 +426,99 @@ def show_emissions_reduction_plan():
         where_sql = f"WHERE year = {selected_year}"
     
 
-    query_country = build_country_sql(table, where_sql)
-    # print(query_country)
+    # --------- Recompute Gate ----------
+    # widgets that change the results flag needs_recompute_reduction_opportunities
+    # via on_change; the selection signature also catches widget state that
+    # Streamlit reset while the user was on another page
+    if use_ct_ers:
+        benchmark_selection = None
+    else:
+        benchmark_selection = (selected_benchmark, selected_percentile, selected_proportion)
 
-    df_pie = con.execute(query_country).df()
+    ro_selection = (table, where_sql, exclude_forestry, use_ct_ers, benchmark_selection)
+    ro_results = st.session_state.get("ro_results")
+
+    recompute = (
+        st.session_state.get("needs_recompute_reduction_opportunities", True)
+        or ro_results is None
+        or ro_results["selection"] != ro_selection
+    )
+
+    if recompute:
+        ro_results = {"selection": ro_selection}
+
+    # --------------------------- Visualize Sector Pie ---------------------------
+    if recompute:
+        query_country = build_country_sql(table, where_sql)
+        # print(query_country)
+
+        df_pie = run_cached_query(con, query_country)
     
-    if exclude_forestry:
-        df_pie = df_pie[df_pie['sector'] != 'forestry-and-land-use']
+        if exclude_forestry:
+            df_pie = df_pie[df_pie['sector'] != 'forestry-and-land-use']
     
-    df_pie["emissions_quantity"] = df_pie["country_emissions_quantity"]
+        df_pie["emissions_quantity"] = df_pie["country_emissions_quantity"]
 
-    total_emissions = format_number_short(df_pie["country_emissions_quantity"].sum())
-    total_emissions_text = (
-        f"1) &nbsp; <span style='color:red;'> {total_emissions}</span> tons of CO2 equivalent emissions, "
-        f"broken down into the following sectors:"
-    )
+        total_emissions = format_number_short(df_pie["country_emissions_quantity"].sum())
+        total_emissions_text = (
+            f"1) &nbsp; <span style='color:red;'> {total_emissions}</span> tons of CO2 equivalent emissions, "
+            f"broken down into the following sectors:"
+        )
+
+        sector_color_map = {
+            "agriculture": "#E8516C",                 # from --color-agriculture
+            "buildings": "#03A0E3",                   # from --color-buildings = --color-seablue
+            "fluorinated-gases": "#B6B4B4",           # from --color-fluorinated-gases
+            "forestry-and-land-use": "#779608",       # from --color-forestry-and-land-use
+            "fossil-fuel-operations": "#FF6F42",      # from --color-fossil-fuel-operations = --color-orange
+            "manufacturing": "#9554FF",               # from --color-manufacturing = --color-violet
+            "mineral-extraction": "#4380F5",          # from --color-mineral-extraction
+            "power": "#56979F",                       # from --color-power
+            "transportation": "#FBBA14",              # from --color-transportation = --color-yellow
+            "waste": "#BBD421"                        # from --color-waste = --color-lightgreen
+        }
+
+        df_pie["sector"] = df_pie["sector"].str.lower()
+        df_pie = df_pie[df_pie["sector"].isin(sector_color_map.keys())]
+
+        fig = px.pie(
+            df_pie,
+            values="emissions_quantity",
+            names="sector",
+            hole=0.2,
+            title="Emissions Allocation",
+            color="sector",
+            color_discrete_map=sector_color_map  
+        )
+
+        fig.update_traces(
+            text = df_pie.apply(
+                lambda row: f"{row['sector']}<br>{format_number_short(row['emissions_quantity'])} tCO₂e", axis=1
+            ),
+            textinfo="text+percent",
+            textposition="outside",
+            textfont_size=16,
+            pull=[0.02] * len(df_pie)
+        )
+
+        fig.update_layout(
+            title_font=dict(
+                size=22,
+                family="Arial",
+            ),
+            height=600,
+            width=800,
+            showlegend=True,
+            margin=dict(t=80, b=50, l=40, r=40)
+        )
+
+        ro_results["df_pie"] = df_pie
+        ro_results["total_emissions_text"] = total_emissions_text
+        ro_results["fig_pie"] = fig
+    else:
+        df_pie = ro_results["df_pie"]
+        total_emissions_text = ro_results["total_emissions_text"]
+        fig = ro_results["fig_pie"]
 
     st.markdown(
         f"""
@@ -492,54 +529,6 @@ def show_emissions_reduction_plan():
         unsafe_allow_html=True
     )
 
-    # --------------------------- Visualize Sector Pie ---------------------------
-    sector_color_map = {
-        "agriculture": "#E8516C",                 # from --color-agriculture
-        "buildings": "#03A0E3",                   # from --color-buildings = --color-seablue
-        "fluorinated-gases": "#B6B4B4",           # from --color-fluorinated-gases
-        "forestry-and-land-use": "#779608",       # from --color-forestry-and-land-use
-        "fossil-fuel-operations": "#FF6F42",      # from --color-fossil-fuel-operations = --color-orange
-        "manufacturing": "#9554FF",               # from --color-manufacturing = --color-violet
-        "mineral-extraction": "#4380F5",          # from --color-mineral-extraction
-        "power": "#56979F",                       # from --color-power
-        "transportation": "#FBBA14",              # from --color-transportation = --color-yellow
-        "waste": "#BBD421"                        # from --color-waste = --color-lightgreen
-    }
-
-    df_pie["sector"] = df_pie["sector"].str.lower()
-    df_pie = df_pie[df_pie["sector"].isin(sector_color_map.keys())]
-
-    fig = px.pie(
-        df_pie,
-        values="emissions_quantity",
-        names="sector",
-        hole=0.2,
-        title="Emissions Allocation",
-        color="sector",
-        color_discrete_map=sector_color_map  
-    )
-
-    fig.update_traces(
-        text = df_pie.apply(
-            lambda row: f"{row['sector']}<br>{format_number_short(row['emissions_quantity'])} tCO₂e", axis=1
-        ),
-        textinfo="text+percent",
-        textposition="outside",
-        textfont_size=16,
-        pull=[0.02] * len(df_pie)
-    )
-
-    fig.update_layout(
-        title_font=dict(
-            size=22,
-            family="Arial",
-        ),
-        height=600,
-        width=800,
-        showlegend=True,
-        margin=dict(t=80, b=50, l=40, r=40)
-    )
-
     # center the chart 
     left_spacer, center_col, right_spacer = st.columns([1, 6, 1])
     with center_col:
@@ -577,6 +566,7 @@ def show_emissions_reduction_plan():
     reduction_where_sql = f"WHERE {' AND '.join(reduction_where_clause)}" if reduction_where_clause else ""
 
     dropdown_join = ""
+    rollup_dropdown_join = None
     if selected_city and not selected_city.startswith("--") and country_selected_bool:
         dropdown_join = f""" 
             INNER JOIN (
@@ -587,6 +577,16 @@ def show_emissions_reduction_plan():
             ) c
                 on c.city_id = regexp_replace(ae.ghs_fua[1], '[{{}}]', '', 'g')
         """
+        # the rollup stores the cleaned ghs_fua id as city_id
+        rollup_dropdown_join = f""" 
+            INNER JOIN (
+                select distinct city_id
+                    , city_name 
+                from '{city_path}'
+                where city_name = '{selected_city_cleaned}'
+            ) c
+                on c.city_id = ae.city_id
+        """
     
     elif selected_county_district and not selected_county_district.startswith("--") and country_selected_bool:
         dropdown_join = f"""
@@ -627,6 +627,9 @@ def show_emissions_reduction_plan():
         else:
             reduction_where_sql = "WHERE most_granular is true "
 
+    if rollup_dropdown_join is None:
+        rollup_dropdown_join = dropdown_join
+
     st.markdown("<br>", unsafe_allow_html=True)
     st.markdown("### Sector Reduction Opportunities (Annual)")
 
@@ -646,236 +649,258 @@ def show_emissions_reduction_plan():
             "contributes positively to the system-wide outcome."
         )
 
-        query_sector_reductions = build_sector_reduction_sql(use_ct_ers=use_ct_ers,
-                                                             annual_asset_path=annual_asset_path,
-                                                             dropdown_join=dropdown_join,
-                                                             reduction_where_sql=reduction_where_sql,
-                                                            )
+    if recompute:
+        if use_ct_ers is True and has_table('sector_reduction_rollup_path'):
+            query_sector_reductions = build_sector_reduction_from_rollup_sql(rollup_path=sector_reduction_rollup_path,
+                                                                             dropdown_join=rollup_dropdown_join,
+                                                                             reduction_where_sql=reduction_where_sql
+                                                                            )
+
+            query_sector_inductions = build_sector_induction_from_rollup_sql(rollup_path=sector_reduction_rollup_path,
+                                                                             dropdown_join=rollup_dropdown_join,
+                                                                             reduction_where_sql=reduction_where_sql
+                                                                            )
+
+            df_induced = run_cached_query(con, query_sector_inductions)
+
+        elif use_ct_ers is True:
+            query_sector_reductions = build_sector_reduction_sql(use_ct_ers=use_ct_ers,
+                                                                 annual_asset_path=annual_asset_path,
+                                                                 dropdown_join=dropdown_join,
+                                                                 reduction_where_sql=reduction_where_sql,
+                                                                 induced_emissions_path=asset_induced_emissions_path
+                                                                )
         
-        query_sector_inductions = build_sector_induction_sql(annual_asset_path=annual_asset_path,
-                                                             dropdown_join=dropdown_join,
-                                                             reduction_where_sql=reduction_where_sql
-                                                            )
+            query_sector_inductions = build_sector_induction_sql(induced_emissions_path=asset_induced_emissions_path,
+                                                                 dropdown_join=dropdown_join,
+                                                                 reduction_where_sql=reduction_where_sql
+                                                                )
         
-        df_induced = con.execute(query_sector_inductions).df()
+            df_induced = run_cached_query(con, query_sector_inductions)
     
-    else:
-        query_sector_reductions = build_sector_reduction_sql(use_ct_ers=use_ct_ers,
-                                                             annual_asset_path=annual_asset_path,
-                                                             dropdown_join=dropdown_join,
-                                                             reduction_where_sql=reduction_where_sql,
-                                                             percentile_path=percentile_path,
-                                                             percentile_col=percentile_col,
-                                                             selected_proportion=selected_proportion,
-                                                             benchmark_join=benchmark_join                      
-                                                            )
+        else:
+            query_sector_reductions = build_sector_reduction_sql(use_ct_ers=use_ct_ers,
+                                                                 annual_asset_path=annual_asset_path,
+                                                                 dropdown_join=dropdown_join,
+                                                                 reduction_where_sql=reduction_where_sql,
+                                                                 percentile_path=percentile_path,
+                                                                 percentile_col=percentile_col,
+                                                                 selected_proportion=selected_proportion,
+                                                                 benchmark_join=benchmark_join                      
+                                                                )
     
 
-    df_stacked_bar = con.execute(query_sector_reductions).df()
+        df_stacked_bar = run_cached_query(con, query_sector_reductions)
 
-    if exclude_forestry:
-        df_stacked_bar = df_stacked_bar[df_stacked_bar['sector'] != 'forestry-and-land-use']
+        if exclude_forestry:
+            df_stacked_bar = df_stacked_bar[df_stacked_bar['sector'] != 'forestry-and-land-use']
 
-    # if use_ct_ers is True:
-    #     # df_stacked_bar.drop(df_stacked_bar[df_stacked_bar["sector"] == "fossil-fuel-operations"].index, inplace=True)
-    #     # print(df_stacked_bar)
-    #     pass
+        # if use_ct_ers is True:
+        #     # df_stacked_bar.drop(df_stacked_bar[df_stacked_bar["sector"] == "fossil-fuel-operations"].index, inplace=True)
+        #     # print(df_stacked_bar)
+        #     pass
 
-    if use_ct_ers:
+        if use_ct_ers:
         
-        df_stacked_bar = pd.merge(
-            df_pie[["sector","country_emissions_quantity"]],
-            df_stacked_bar[["sector",
-                            "emissions_reduction_potential",
-                            "emissions_reduced_at_asset", 
-                            "induced_emissions"]],
-            on="sector",
-            how="outer"
-        )
+            df_stacked_bar = pd.merge(
+                df_pie[["sector","country_emissions_quantity"]],
+                df_stacked_bar[["sector",
+                                "emissions_reduction_potential",
+                                "emissions_reduced_at_asset", 
+                                "induced_emissions"]],
+                on="sector",
+                how="outer"
+            )
 
 
-        # hover_texts = get_consequetial_hover_text(df_induced)
+            # hover_texts = get_consequetial_hover_text(df_induced)
 
-    else:
-        df_stacked_bar = pd.merge(
-            df_pie[["sector","country_emissions_quantity"]],
-            df_stacked_bar[["sector",
-                            "emissions_reduction_potential",
-                            ]],
-            on="sector",
-            how="outer"
-        )
+        else:
+            df_stacked_bar = pd.merge(
+                df_pie[["sector","country_emissions_quantity"]],
+                df_stacked_bar[["sector",
+                                "emissions_reduction_potential",
+                                ]],
+                on="sector",
+                how="outer"
+            )
 
-    df_stacked_bar["emissions_reduction_potential"] = df_stacked_bar["emissions_reduction_potential"].fillna(0)
+        df_stacked_bar["emissions_reduction_potential"] = df_stacked_bar["emissions_reduction_potential"].fillna(0)
 
-    # capping reduction potential at total emissions if it exceeds total emissions
-    df_stacked_bar["emissions_reduction_potential"] = np.where(
-        df_stacked_bar["emissions_reduction_potential"] > df_stacked_bar["country_emissions_quantity"],
-        df_stacked_bar["country_emissions_quantity"],
-        df_stacked_bar["emissions_reduction_potential"]
-    )
+        # capping reduction potential at total emissions if it exceeds total emissions
+        df_stacked_bar["emissions_reduction_potential"] = np.where(
+            df_stacked_bar["emissions_reduction_potential"] > df_stacked_bar["country_emissions_quantity"],
+            df_stacked_bar["country_emissions_quantity"],
+            df_stacked_bar["emissions_reduction_potential"]
+        )
 
-    df_stacked_bar['static_emissions_q'] = df_stacked_bar["country_emissions_quantity"] - df_stacked_bar["emissions_reduction_potential"]
+        df_stacked_bar['static_emissions_q'] = df_stacked_bar["country_emissions_quantity"] - df_stacked_bar["emissions_reduction_potential"]
 
-    df_stacked_bar["total"] = (
-        df_stacked_bar["static_emissions_q"] + df_stacked_bar["emissions_reduction_potential"]
-    )
+        df_stacked_bar["total"] = (
+            df_stacked_bar["static_emissions_q"] + df_stacked_bar["emissions_reduction_potential"]
+        )
     
-    df_stacked_bar = df_stacked_bar.sort_values("total", ascending=False)
+        df_stacked_bar = df_stacked_bar.sort_values("total", ascending=False)
 
-    df_stacked_bar["sector"] = pd.Categorical(
-        df_stacked_bar["sector"],
-        categories=df_stacked_bar["sector"],
-        ordered=True
-    )
+        df_stacked_bar["sector"] = pd.Categorical(
+            df_stacked_bar["sector"],
+            categories=df_stacked_bar["sector"],
+            ordered=True
+        )
 
-    df_stacked_bar["formatted_static"] = df_stacked_bar["static_emissions_q"].apply(format_number_short)
-    df_stacked_bar["formatted_avoided"] = df_stacked_bar["emissions_reduction_potential"].apply(format_number_short)
+        df_stacked_bar["formatted_static"] = df_stacked_bar["static_emissions_q"].apply(format_number_short)
+        df_stacked_bar["formatted_avoided"] = df_stacked_bar["emissions_reduction_potential"].apply(format_number_short)
 
-    if use_ct_ers:
-        df_stacked_bar["induced_emissions"] = df_stacked_bar["induced_emissions"].fillna(0)
-        df_stacked_bar["emissions_reduced_at_asset"] = df_stacked_bar["emissions_reduced_at_asset"].fillna(0)
+        if use_ct_ers:
+            df_stacked_bar["induced_emissions"] = df_stacked_bar["induced_emissions"].fillna(0)
+            df_stacked_bar["emissions_reduced_at_asset"] = df_stacked_bar["emissions_reduced_at_asset"].fillna(0)
 
-        consequential_json = get_reduction_induction_json(df_stacked_bar, df_induced)
-        # print(consequential_json)
+            consequential_json = get_reduction_induction_json(df_stacked_bar, df_induced)
+            # print(consequential_json)
     
-    if use_ct_ers:
-        df_stacked_bar["induced_emissions"] = (
-            df_stacked_bar["induced_emissions"]
-                .fillna(0)                           
-                .apply(format_number_short)          
-        )
-        df_stacked_bar["emissions_reduced_at_asset"] = (
-            df_stacked_bar["emissions_reduced_at_asset"]
-                .fillna(0)                           
-                .apply(format_number_short)          
-        )
+        if use_ct_ers:
+            df_stacked_bar["induced_emissions"] = (
+                df_stacked_bar["induced_emissions"]
+                    .fillna(0)                           
+                    .apply(format_number_short)          
+            )
+            df_stacked_bar["emissions_reduced_at_asset"] = (
+                df_stacked_bar["emissions_reduced_at_asset"]
+                    .fillna(0)                           
+                    .apply(format_number_short)          
+            )
 
-    # print(df_stacked_bar)
+        # print(df_stacked_bar)
 
-    fig = go.Figure()
+        fig = go.Figure()
 
-    if use_ct_ers:
+        if use_ct_ers:
     
-        sectors = [item["sector"] for item in consequential_json]
-        static_vals = [item["static_emissions"] for item in consequential_json]
-        reduction_vals = [item["reduction_potential"] for item in consequential_json]
-        hover_texts = [item["hover_text"] for item in consequential_json]
-
-        # gray static emissions bar
-        fig.add_bar(
-            name="Post-Reduction Emissions",
-            x=sectors,
-            y=static_vals,
-            marker_color="#707070",
-            customdata=[item["static_emissions_formatted"] for item in consequential_json],
-            hovertemplate="<b>%{x}</b><br>Post-Reduction Emissions: %{customdata} tCO₂e<extra></extra>"
-        )
+            sectors = [item["sector"] for item in consequential_json]
+            static_vals = [item["static_emissions"] for item in consequential_json]
+            reduction_vals = [item["reduction_potential"] for item in consequential_json]
+            hover_texts = [item["hover_text"] for item in consequential_json]
+
+            # gray static emissions bar
+            fig.add_bar(
+                name="Post-Reduction Emissions",
+                x=sectors,
+                y=static_vals,
+                marker_color="#707070",
+                customdata=[item["static_emissions_formatted"] for item in consequential_json],
+                hovertemplate="<b>%{x}</b><br>Post-Reduction Emissions: %{customdata} tCO₂e<extra></extra>"
+            )
 
-        # green reduction potential bar
-        fig.add_bar(
-            name="Reduction Potential (tCO₂e)",
-            x=sectors,
-            y=reduction_vals,
-            marker=dict(
-                color="rgba(46,139,87,0.8)",  
-                pattern=dict(
-                    shape="/", 
-                    fgcolor="rgba(46,139,87,0.7)",
-                    size=8,
-                    solidity=0.958
-                )
-            ),
-            customdata=hover_texts,
-            hovertemplate="%{customdata}<extra></extra>"  # rich HTML box
-        )
+            # green reduction potential bar
+            fig.add_bar(
+                name="Reduction Potential (tCO₂e)",
+                x=sectors,
+                y=reduction_vals,
+                marker=dict(
+                    color="rgba(46,139,87,0.8)",  
+                    pattern=dict(
+                        shape="/", 
+                        fgcolor="rgba(46,139,87,0.7)",
+                        size=8,
+                        solidity=0.958
+                    )
+                ),
+                customdata=hover_texts,
+                hovertemplate="%{customdata}<extra></extra>"  # rich HTML box
+            )
 
-    else:
-        fig.add_bar(
-            name='Post-Reduction Emissions',
-            x=df_stacked_bar["sector"],
-            y=df_stacked_bar["static_emissions_q"],
-            marker_color="#707070",
-            customdata=df_stacked_bar["formatted_static"],
-            hovertemplate='<b>%{x}</b><br>Post-Reduction Emissions: %{customdata} tCO₂e<extra></extra>'
-        )
+        else:
+            fig.add_bar(
+                name='Post-Reduction Emissions',
+                x=df_stacked_bar["sector"],
+                y=df_stacked_bar["static_emissions_q"],
+                marker_color="#707070",
+                customdata=df_stacked_bar["formatted_static"],
+                hovertemplate='<b>%{x}</b><br>Post-Reduction Emissions: %{customdata} tCO₂e<extra></extra>'
+            )
 
-        fig.add_bar(
-            name='Reduction Potential (tCO2e)',
-            x=df_stacked_bar["sector"],
-            y=df_stacked_bar["emissions_reduction_potential"],
-            marker=dict(
-                color="rgba(46,139,87,0.8)",  
-                pattern=dict(
-                    shape="/", 
-                    fgcolor="rgba(46,139,87,0.7)",
-                    size=8,
-                    solidity=0.958
+            fig.add_bar(
+                name='Reduction Potential (tCO2e)',
+                x=df_stacked_bar["sector"],
+                y=df_stacked_bar["emissions_reduction_potential"],
+                marker=dict(
+                    color="rgba(46,139,87,0.8)",  
+                    pattern=dict(
+                        shape="/", 
+                        fgcolor="rgba(46,139,87,0.7)",
+                        size=8,
+                        solidity=0.958
+                    )
+                ),
+                customdata=df_stacked_bar[[
+                    "formatted_avoided"
+                ]].values,
+                hovertemplate=(
+                    "<b>%{x}</b><br>"
+                    "Reduction Potential: %{customdata[0]} tCO₂e"
                 )
-            ),
-            customdata=df_stacked_bar[[
-                "formatted_avoided"
-            ]].values,
-            hovertemplate=(
-                "<b>%{x}</b><br>"
-                "Reduction Potential: %{customdata[0]} tCO₂e"
             )
-        )
 
 
-    fig.update_layout(
-        barmode='stack',
-        height=600,
-        margin=dict(t=30),
-
-        xaxis=dict(
-            type='category',
-            title=dict(
-                text="Sector",
-                font=dict(
-                    size=18,           # 👈 change x-axis title size here
-                    family="Sans-Serif",
+        fig.update_layout(
+            barmode='stack',
+            height=600,
+            margin=dict(t=30),
+
+            xaxis=dict(
+                type='category',
+                title=dict(
+                    text="Sector",
+                    font=dict(
+                        size=18,           # 👈 change x-axis title size here
+                        family="Sans-Serif",
+                    )
+                ),
+                tickfont=dict(
+                    size=13,              # 👈 tick labels size
+                    family="Sans-Serif Italic"
                 )
             ),
-            tickfont=dict(
-                size=13,              # 👈 tick labels size
-                family="Sans-Serif Italic"
-            )
-        ),
-
-        yaxis=dict(
-            title=dict(
-                text="Emissions (tCO2e)",
-                font=dict(
-                    size=18,          # 👈 change y-axis title size here
-                    family="Sans-Serif",
+
+            yaxis=dict(
+                title=dict(
+                    text="Emissions (tCO2e)",
+                    font=dict(
+                        size=18,          # 👈 change y-axis title size here
+                        family="Sans-Serif",
+                    )
+                ),
+                range=[0, df_stacked_bar["total"].max() * 1.15],
+                tickfont=dict(
+                    size=13,              # 👈 y tick labels size
+                    family="Sans-Serif"
                 )
-            ),
-            range=[0, df_stacked_bar["total"].max() * 1.15],
-            tickfont=dict(
-                size=13,              # 👈 y tick labels size
-                family="Sans-Serif"
             )
         )
-    )
 
-    fig.add_trace(
-        go.Bar(
-            x=df_stacked_bar["sector"],
-            y=[0] * len(df_stacked_bar),  # invisible base
-            text=[format_number_short(v) for v in df_stacked_bar["total"]],
-            textposition="outside",
-            textfont=dict(
-                size=14,             # increase size
-                family="Sans-Serif Italic" # makes it bold
-            ),
-            marker=dict(color="rgba(0,0,0,0)"),  # transparent bar
-            showlegend=False,
-            hoverinfo="skip",
-            cliponaxis=False,
-            name="Total"
+        fig.add_trace(
+            go.Bar(
+                x=df_stacked_bar["sector"],
+                y=[0] * len(df_stacked_bar),  # invisible base
+                text=[format_number_short(v) for v in df_stacked_bar["total"]],
+                textposition="outside",
+                textfont=dict(
+                    size=14,             # increase size
+                    family="Sans-Serif Italic" # makes it bold
+                ),
+                marker=dict(color="rgba(0,0,0,0)"),  # transparent bar
+                showlegend=False,
+                hoverinfo="skip",
+                cliponaxis=False,
+                name="Total"
+            )
         )
-    )
+
+        ro_results["df_stacked_bar"] = df_stacked_bar
+        ro_results["fig_sector_reductions"] = fig
+    else:
+        df_stacked_bar = ro_results["df_stacked_bar"]
+        fig = ro_results["fig_sector_reductions"]
 
     st.plotly_chart(fig, use_container_width=True, key="sector_reductions_chart")
 
@@ -899,128 +924,134 @@ def show_emissions_reduction_plan():
     st.markdown("<br>", unsafe_allow_html=True)
     st.markdown("<br>", unsafe_allow_html=True)
 
-    top_5_reduction_df = df_stacked_bar.sort_values(by="emissions_reduction_potential",ascending=False).head(5)
-    total_reduction_potential = top_5_reduction_df["emissions_reduction_potential"].sum()
+    if recompute:
+        top_5_reduction_df = df_stacked_bar.sort_values(by="emissions_reduction_potential",ascending=False).head(5)
+        total_reduction_potential = top_5_reduction_df["emissions_reduction_potential"].sum()
 
-    top_emitting_sectors_df = df_stacked_bar.sort_values(by="country_emissions_quantity",ascending=False).head(5)
-    total_emissions_top = top_emitting_sectors_df["country_emissions_quantity"].sum()
+        top_emitting_sectors_df = df_stacked_bar.sort_values(by="country_emissions_quantity",ascending=False).head(5)
+        total_emissions_top = top_emitting_sectors_df["country_emissions_quantity"].sum()
 
-    reduction_pct = int((total_reduction_potential / total_emissions_top) * 100)
+        reduction_pct = int((total_reduction_potential / total_emissions_top) * 100)
 
-    sentence_2_data = pd.merge(
-            top_emitting_sectors_df[["sector","country_emissions_quantity"]],
-            top_5_reduction_df[["sector","emissions_reduction_potential"]],
-            on="sector",
-            how="inner"
-        ).sort_values(by="emissions_reduction_potential", ascending=False)
+        sentence_2_data = pd.merge(
+                top_emitting_sectors_df[["sector","country_emissions_quantity"]],
+                top_5_reduction_df[["sector","emissions_reduction_potential"]],
+                on="sector",
+                how="inner"
+            ).sort_values(by="emissions_reduction_potential", ascending=False)
 
-    # Store both raw and formatted values
-    reductions_raw = sentence_2_data["emissions_reduction_potential"].tolist()
-    reductions_formatted = sentence_2_data["emissions_reduction_potential"].apply(format_number_short).tolist()
+        # Store both raw and formatted values
+        reductions_raw = sentence_2_data["emissions_reduction_potential"].tolist()
+        reductions_formatted = sentence_2_data["emissions_reduction_potential"].apply(format_number_short).tolist()
 
-    # get the sectors to display in the text
-    top_emitting_sectors_list = list(sentence_2_data["sector"])
+        # get the sectors to display in the text
+        top_emitting_sectors_list = list(sentence_2_data["sector"])
 
-    # prep for sentence 3
-    high_reduction_potential_low_emitter = []
-    for sector in top_5_reduction_df['sector']:
-        if sector not in top_emitting_sectors_list:
-            high_reduction_potential_low_emitter.append(sector)
+        # prep for sentence 3
+        high_reduction_potential_low_emitter = []
+        for sector in top_5_reduction_df['sector']:
+            if sector not in top_emitting_sectors_list:
+                high_reduction_potential_low_emitter.append(sector)
     
-    high_reduction_low_emitter_df = top_5_reduction_df[
-        top_5_reduction_df['sector'].isin(high_reduction_potential_low_emitter)
-    ]
+        high_reduction_low_emitter_df = top_5_reduction_df[
+            top_5_reduction_df['sector'].isin(high_reduction_potential_low_emitter)
+        ]
 
 
-    # ------- Sentence 2: format sector list as natural language ------
-    if len(top_emitting_sectors_list) > 1:
-        sectors_text = ", ".join(top_emitting_sectors_list[:-1]) + " and " + top_emitting_sectors_list[-1]
-    else:
-        sectors_text = top_emitting_sectors_list[0]
-
-    # Highlight formatted reductions in green (no commas highlighted)
-    formatted_reductions = [
-        f"<span style='color: green;'><strong>{r}</strong></span>" for r in reductions_formatted
-    ]
-    reductions_text = " , ".join(formatted_reductions)
-
-    # Final sentence
-    sentence_2 = f"The top emitting sectors, including {sectors_text}, have opportunities to reduce CO2e emissions by {reductions_text} metric tons, respectively."
-
-    # ------------------ Building Sentence 3 ------------------
-    hr_le_sectors = list(high_reduction_low_emitter_df["sector"])
-    if not hr_le_sectors:
-        s3_sector_text = ""
-    elif len(hr_le_sectors) == 1:
-        s3_sector_text = hr_le_sectors[0]
-    else:
-        s3_sector_text = ", ".join(hr_le_sectors[:-1]) + " and " + hr_le_sectors[-1]
-
-    # Format reduction values as green-highlighted numbers (no decimals, commas OK)
-    sentence_3_formatted_reductions = [
-        f"<span style='color: green;'><strong>{format_number_short(val)}</strong></span>"
-        for val in high_reduction_low_emitter_df["emissions_reduction_potential"]
-    ]
-
-    # Join reductions with proper punctuation
-    sentence_3_formatted_reductions = [
-        f"<span style='color: green;'><strong>{format_number_short(val)}</strong></span>"
-        for val in high_reduction_low_emitter_df["emissions_reduction_potential"]
-    ]
-
-    if not sentence_3_formatted_reductions:
-        sentence_3_text = ""
-    elif len(sentence_3_formatted_reductions) == 1:
-        sentence_3_text = sentence_3_formatted_reductions[0]
-    else:
-        sentence_3_text = ", ".join(sentence_3_formatted_reductions[:-1]) + " and " + sentence_3_formatted_reductions[-1]
+        # ------- Sentence 2: format sector list as natural language ------
+        if len(top_emitting_sectors_list) > 1:
+            sectors_text = ", ".join(top_emitting_sectors_list[:-1]) + " and " + top_emitting_sectors_list[-1]
+        else:
+            sectors_text = top_emitting_sectors_list[0]
 
-    if not sentence_3_formatted_reductions:
-        sentence_3 = ""
-    else:
-        sentence_3 = f"While the {s3_sector_text} sector{'s' if len(hr_le_sectors) > 1 else ''} {'are' if len(hr_le_sectors) > 1 else 'is'} not among the top emitting sectors, {'they' if len(hr_le_sectors) > 1 else 'it'} rank{'s' if len(hr_le_sectors) == 1 else ''} top 5 for emissions reduction opportunities with {sentence_3_text}  metric tons."
+        # Highlight formatted reductions in green (no commas highlighted)
+        formatted_reductions = [
+            f"<span style='color: green;'><strong>{r}</strong></span>" for r in reductions_formatted
+        ]
+        reductions_text = " , ".join(formatted_reductions)
 
+        # Final sentence
+        sentence_2 = f"The top emitting sectors, including {sectors_text}, have opportunities to reduce CO2e emissions by {reductions_text} metric tons, respectively."
 
-    # ----- Building Sentence 4 -------
-    include_sectors = ", ".join(f"'{s.lower()}'" for s in top_emitting_sectors_list)
+        # ------------------ Building Sentence 3 ------------------
+        hr_le_sectors = list(high_reduction_low_emitter_df["sector"])
+        if not hr_le_sectors:
+            s3_sector_text = ""
+        elif len(hr_le_sectors) == 1:
+            s3_sector_text = hr_le_sectors[0]
+        else:
+            s3_sector_text = ", ".join(hr_le_sectors[:-1]) + " and " + hr_le_sectors[-1]
 
-    sentence_4_sql = build_sentence_4_sql(table, where_sql, include_sectors)
+        # Format reduction values as green-highlighted numbers (no decimals, commas OK)
+        sentence_3_formatted_reductions = [
+            f"<span style='color: green;'><strong>{format_number_short(val)}</strong></span>"
+            for val in high_reduction_low_emitter_df["emissions_reduction_potential"]
+        ]
 
-    sentence_4_query = con.execute(sentence_4_sql).df()
+        # Join reductions with proper punctuation
+        sentence_3_formatted_reductions = [
+            f"<span style='color: green;'><strong>{format_number_short(val)}</strong></span>"
+            for val in high_reduction_low_emitter_df["emissions_reduction_potential"]
+        ]
 
-    sector_to_subsectors = defaultdict(list)
-    for _, row in sentence_4_query.iterrows():
-        sector_to_subsectors[row['sector']].append(row['subsector'])
+        if not sentence_3_formatted_reductions:
+            sentence_3_text = ""
+        elif len(sentence_3_formatted_reductions) == 1:
+            sentence_3_text = sentence_3_formatted_reductions[0]
+        else:
+            sentence_3_text = ", ".join(sentence_3_formatted_reductions[:-1]) + " and " + sentence_3_formatted_reductions[-1]
 
-    # Construct sentence segments
-    segments = []
-    for sector, subsectors in sector_to_subsectors.items():
-        if len(subsectors) > 1:
-            subsector_text = ", ".join(subsectors[:-1]) + " and " + subsectors[-1]
+        if not sentence_3_formatted_reductions:
+            sentence_3 = ""
         else:
-            subsector_text = subsectors[0]
-        segments.append(f"in the {sector} sector, high-emitting subsectors include {subsector_text}")
+            sentence_3 = f"While the {s3_sector_text} sector{'s' if len(hr_le_sectors) > 1 else ''} {'are' if len(hr_le_sectors) > 1 else 'is'} not among the top emitting sectors, {'they' if len(hr_le_sectors) > 1 else 'it'} rank{'s' if len(hr_le_sectors) == 1 else ''} top 5 for emissions reduction opportunities with {sentence_3_text}  metric tons."
+
+
+        # ----- Building Sentence 4 -------
+        include_sectors = ", ".join(f"'{s.lower()}'" for s in top_emitting_sectors_list)
 
-    # Final sentence
-    sentence_4 = "Additionally, " + "; ".join(segments) + "."
+        sentence_4_sql = build_sentence_4_sql(table, where_sql, include_sectors)
 
-    # quick formatting for the first sentence
-    highlight_green_1 = f"<span style='color: green;'><strong>{format_number_short(total_reduction_potential)} (-{reduction_pct:.0f}%)</strong></span>"
+        sentence_4_query = run_cached_query(con, sentence_4_sql)
+
+        sector_to_subsectors = defaultdict(list)
+        for _, row in sentence_4_query.iterrows():
+            sector_to_subsectors[row['sector']].append(row['subsector'])
+
+        # Construct sentence segments
+        segments = []
+        for sector, subsectors in sector_to_subsectors.items():
+            if len(subsectors) > 1:
+                subsector_text = ", ".join(subsectors[:-1]) + " and " + subsectors[-1]
+            else:
+                subsector_text = subsectors[0]
+            segments.append(f"in the {sector} sector, high-emitting subsectors include {subsector_text}")
+
+        # Final sentence
+        sentence_4 = "Additionally, " + "; ".join(segments) + "."
+
+        # quick formatting for the first sentence
+        highlight_green_1 = f"<span style='color: green;'><strong>{format_number_short(total_reduction_potential)} (-{reduction_pct:.0f}%)</strong></span>"
     
-    if sentence_3:
-        sentence_3_and_4 = f"""{sentence_3} 
+        if sentence_3:
+            sentence_3_and_4 = f"""{sentence_3} 
 
-                               {sentence_4}"""
-    else:
-        sentence_3_and_4 = sentence_4
+                                   {sentence_4}"""
+        else:
+            sentence_3_and_4 = sentence_4
 
-    reduction_text = f"""
-        Using Climate TRACE emissions data, CO2e emissions in {display_region_text if display_region_text != 'Global' else 'the world'} could be reduced by {highlight_green_1} metric tons across 5 sectors of high emissions reduction opportunities.
+        reduction_text = f"""
+            Using Climate TRACE emissions data, CO2e emissions in {display_region_text if display_region_text != 'Global' else 'the world'} could be reduced by {highlight_green_1} metric tons across 5 sectors of high emissions reduction opportunities.
 
-        {sentence_2}
+            {sentence_2}
+
+            {sentence_3_and_4}
+        """
+
+        ro_results["reduction_text"] = reduction_text
+    else:
+        reduction_text = ro_results["reduction_text"]
 
-        {sentence_3_and_4}
-    """
 
     st.markdown(f"""
         ### A possible {display_region_text if display_region_text != 'Global' else 'Global'} Emissions Reduction Plan
@@ -1064,16 +1095,8 @@ def show_emissions_reduction_plan():
             sorting_options, 
             horizontal=True,
             key="asset_sorting_preference_RO",
-            help=asset_sorting_help,
-            on_change=mark_ro_recompute
+            help=asset_sorting_help
         )
-
-        asset_table_sql = build_asset_reduction_sql(use_ct_ers=use_ct_ers,
-                                                    annual_asset_path=annual_asset_path,
-                                                    dropdown_join=dropdown_join,
-                                                    reduction_where_sql=reduction_where_sql,
-                                                    sorting_preference=asset_sorting_preference,
-                                                    exclude_forestry=exclude_forestry)
     else:
         sorting_options = [
             "Asset Reduction Potential",
@@ -1085,67 +1108,86 @@ def show_emissions_reduction_plan():
             sorting_options,
             horizontal=True,
             key="asset_sorting_preference_RO",
-            help=asset_sorting_help,
-            on_change=mark_ro_recompute
+            help=asset_sorting_help
         )
 
-        asset_table_sql = build_asset_reduction_sql(use_ct_ers=use_ct_ers,
-                                                    percentile_col=percentile_col,
-                                                    selected_proportion=selected_proportion,
-                                                    annual_asset_path=annual_asset_path,
-                                                    percentile_path=percentile_path,
-                                                    benchmark_join=benchmark_join,
-                                                    dropdown_join=dropdown_join,
-                                                    reduction_where_sql=reduction_where_sql,
-                                                    sorting_preference=asset_sorting_preference,
-                                                    exclude_forestry=exclude_forestry
-                                                    )
-
-    asset_table_df = con.execute(asset_table_sql).df()
-
-    # print(asset_table_df)
-
-    asset_table_df['asset_url'] = asset_table_df.apply(make_asset_url, axis=1)
-    asset_table_df['country_url'] = asset_table_df.apply(make_country_url, axis=1)
+    # sorting only affects the asset table (and the download built from it)
+    recompute_assets = recompute or ro_results.get("asset_sorting_preference") != asset_sorting_preference
+
+    if recompute_assets:
+        if use_ct_ers is True:
+            asset_table_sql = build_asset_reduction_sql(use_ct_ers=use_ct_ers,
+                                                        annual_asset_path=annual_asset_path,
+                                                        dropdown_join=dropdown_join,
+                                                        reduction_where_sql=reduction_where_sql,
+                                                        sorting_preference=asset_sorting_preference,
+                                                        exclude_forestry=exclude_forestry)
+        else:
+            asset_table_sql = build_asset_reduction_sql(use_ct_ers=use_ct_ers,
+                                                        percentile_col=percentile_col,
+                                                        selected_proportion=selected_proportion,
+                                                        annual_asset_path=annual_asset_path,
+                                                        percentile_path=percentile_path,
+                                                        benchmark_join=benchmark_join,
+                                                        dropdown_join=dropdown_join,
+                                                        reduction_where_sql=reduction_where_sql,
+                                                        sorting_preference=asset_sorting_preference,
+                                                        exclude_forestry=exclude_forestry
+                                                        )
+
+        asset_table_df = run_cached_query(con, asset_table_sql)
+
+        # print(asset_table_df)
+
+        asset_table_df['asset_url'] = asset_table_df.apply(make_asset_url, axis=1)
+        asset_table_df['country_url'] = asset_table_df.apply(make_country_url, axis=1)
     
 
-    # Current (2024) Estimate
-    asset_table_df["2024 Emissions (tCO2e)"] = asset_table_df["emissions_quantity"].apply(lambda x: f"{round(x):,}")
-    asset_table_df["Asset Reduction Potential Per Year (tCO2e)"] = asset_table_df["emissions_reduction_potential"].fillna(0).apply(lambda x: f"{round(x):,}")
-
-    if use_ct_ers is True:
-        asset_table_df = asset_table_df[['asset_url',
-                                         'country_url',
-                                         'sector',
-                                         'subsector',
-                                         'asset_type',
-                                         'strategy_name',
-                                         '2024 Emissions (tCO2e)',
-                                         'Asset Reduction Potential Per Year (tCO2e)',
-                                         'total_emissions_reduced_per_year']]
+        # Current (2024) Estimate
+        asset_table_df["2024 Emissions (tCO2e)"] = asset_table_df["emissions_quantity"].apply(lambda x: f"{round(x):,}")
+        asset_table_df["Asset Reduction Potential Per Year (tCO2e)"] = asset_table_df["emissions_reduction_potential"].fillna(0).apply(lambda x: f"{round(x):,}")
+
+        if use_ct_ers is True:
+            asset_table_df = asset_table_df[['asset_url',
+                                             'country_url',
+                                             'sector',
+                                             'subsector',
+                                             'asset_type',
+                                             'strategy_name',
+                                             '2024 Emissions (tCO2e)',
+                                             'Asset Reduction Potential Per Year (tCO2e)',
+                                             'total_emissions_reduced_per_year']]
         
-        asset_table_df["Net Reduction Potential Per Year (tCO2e)"]  = asset_table_df["total_emissions_reduced_per_year"].apply(lambda x: f"{round(x):,}")
-        asset_table_df = asset_table_df.drop(columns=["total_emissions_reduced_per_year"])
-        styled_df = asset_table_df.style.applymap(
-        lambda val: "color: red", subset=["2024 Emissions (tCO2e)"]
-            ).applymap(
-                lambda val: "color: green", subset=["Asset Reduction Potential Per Year (tCO2e)",
-                                                    "Net Reduction Potential Per Year (tCO2e)"]
-            )
-    else:
-        asset_table_df = asset_table_df[['asset_url',
-                                         'country_url',
-                                         'sector',
-                                         'subsector',
-                                         'asset_type',
-                                         '2024 Emissions (tCO2e)',
-                                         'Asset Reduction Potential Per Year (tCO2e)']]
-        
-        styled_df = asset_table_df.style.applymap(
+            asset_table_df["Net Reduction Potential Per Year (tCO2e)"]  = asset_table_df["total_emissions_reduced_per_year"].apply(lambda x: f"{round(x):,}")
+            asset_table_df = asset_table_df.drop(columns=["total_emissions_reduced_per_year"])
+            styled_df = asset_table_df.style.applymap(
             lambda val: "color: red", subset=["2024 Emissions (tCO2e)"]
                 ).applymap(
-                    lambda val: "color: green", subset=["Asset Reduction Potential Per Year (tCO2e)"]
+                    lambda val: "color: green", subset=["Asset Reduction Potential Per Year (tCO2e)",
+                                                        "Net Reduction Potential Per Year (tCO2e)"]
                 )
+        else:
+            asset_table_df = asset_table_df[['asset_url',
+                                             'country_url',
+                                             'sector',
+                                             'subsector',
+                                             'asset_type',
+                                             '2024 Emissions (tCO2e)',
+                                             'Asset Reduction Potential Per Year (tCO2e)']]
+        
+            styled_df = asset_table_df.style.applymap(
+                lambda val: "color: red", subset=["2024 Emissions (tCO2e)"]
+                    ).applymap(
+                        lambda val: "color: green", subset=["Asset Reduction Potential Per Year (tCO2e)"]
+                    )
+
+
+        ro_results["asset_sorting_preference"] = asset_sorting_preference
+        ro_results["asset_table_df"] = asset_table_df
+        ro_results["styled_df"] = styled_df
+    else:
+        asset_table_df = ro_results["asset_table_df"]
+        styled_df = ro_results["styled_df"]
 
     
 
@@ -1164,41 +1206,47 @@ def show_emissions_reduction_plan():
     )
 
 
-    if not use_ct_ers:
-        subsector_download_sql = build_subsector_reduction_percentile_download(
-                                    annual_asset_path=annual_asset_path,
-                                    dropdown_join=dropdown_join,
-                                    reduction_where_sql=reduction_where_sql,
-                                    table=table,
-                                    where_sql=where_sql,
-                                    percentile_path=percentile_path,
-                                    percentile_col=percentile_col,
-                                    selected_proportion=selected_proportion,
-                                    benchmark_join=benchmark_join,
-                                    exclude_forestry=exclude_forestry
-                                )
+    if recompute_assets:
+        if not use_ct_ers:
+            subsector_download_sql = build_subsector_reduction_percentile_download(
+                                        annual_asset_path=annual_asset_path,
+                                        dropdown_join=dropdown_join,
+                                        reduction_where_sql=reduction_where_sql,
+                                        table=table,
+                                        where_sql=where_sql,
+                                        percentile_path=percentile_path,
+                                        percentile_col=percentile_col,
+                                        selected_proportion=selected_proportion,
+                                        benchmark_join=benchmark_join,
+                                        exclude_forestry=exclude_forestry
+                                    )
         
-        # print(subsector_download_sql)
+            # print(subsector_download_sql)
 
-        subsector_reduction_download_df = con.execute(subsector_download_sql).df()
+            subsector_reduction_download_df = run_cached_query(con, subsector_download_sql)
 
-    if not use_ct_ers:
-        dfs_for_excel = {
-            "Sector Emissions": df_pie,
-            "Sector Reduction Data": df_stacked_bar,
-            "Subsector Reduction Data": subsector_reduction_download_df,
-            "Asset Reduction Data": asset_table_df,
-        }
-    elif not df_pie.empty or not df_stacked_bar.empty or not asset_table_df.empty:
-        # Create dictionary of DataFrames to export
-        dfs_for_excel = {
-            "Sector Emissions": df_pie,
-            "Sector Reduction Data": df_stacked_bar,
-            "Asset Reduction Data": asset_table_df,
-        }
+        if not use_ct_ers:
+            dfs_for_excel = {
+                "Sector Emissions": df_pie,
+                "Sector Reduction Data": df_stacked_bar,
+                "Subsector Reduction Data": subsector_reduction_download_df,
+                "Asset Reduction Data": asset_table_df,
+            }
+        elif not df_pie.empty or not df_stacked_bar.empty or not asset_table_df.empty:
+            # Create dictionary of DataFrames to export
+            dfs_for_excel = {
+                "Sector Emissions": df_pie,
+                "Sector Reduction Data": df_stacked_bar,
+                "Asset Reduction Data": asset_table_df,
+            }
+
+        # Use the utility function to create the Excel file
+        benchmarking_excel_file = create_excel_file(dfs_for_excel)
+
+        ro_results["excel_file"] = benchmarking_excel_file
+    else:
+        benchmarking_excel_file = ro_results["excel_file"]
 
-    # Use the utility function to create the Excel file
-    benchmarking_excel_file = create_excel_file(dfs_for_excel)
 
     # Fill in the placeholder with the actual download button
     download_placeholder.download_button(
@@ -1209,6 +1257,9 @@ def show_emissions_reduction_plan():
         help="The downloaded data will represent your dropdown selections."
     )
 
-    con.close()
+
+    st.session_state["ro_results"] = ro_results
+    st.session_state["needs_recompute_reduction_opportunities"] = False
+
 
     # print(reduction_where_sql)
\ No newline at end of file
@@ -1,10 +1,13 @@
 import os, psutil, time, sys, traceback
 import streamlit as st
-import duckdb
 import re
 import pandas as pd
 import sys
 from config import CONFIG
+from utils.connection import get_connection, get_release, table_ref
+from utils.geography import get_country_map, geography_names
+from utils.query_cache import run_cached_query
+from utils.search import search_assets, typeahead_multiselect
 from utils.utils import *
 from utils.queries import *
 
@@ -32,14 +35,14 @@ def show_abatement_curve():
 
     ##### SET UP -------
     # set up data pathways
-    annual_asset_path = CONFIG['annual_asset_path']
-    gadm_0_path = CONFIG['gadm_0_path']
-    gadm_1_path = CONFIG['gadm_1_path']
-    gadm_2_path = CONFIG['gadm_2_path']
+    annual_asset_path = table_ref('annual_asset_path')
+    gadm_0_path = table_ref('gadm_0_path')
+    gadm_1_path = table_ref('gadm_1_path')
+    gadm_2_path = table_ref('gadm_2_path')
     region_options = CONFIG['region_options']
-    city_path = CONFIG['city_path']
+    city_path = table_ref('city_path')
 
-    con = duckdb.connect()
+    con = get_connection()
 
     ##### INTRO -------
     summary_text = (
@@ -60,11 +63,7 @@ def show_abatement_curve():
     ##### DROPDOWN FOR COUNTRY -------
     # add drop-down options for geography
 
-    country_rows = con.execute(
-            f"SELECT DISTINCT country_name, iso3_country FROM '{gadm_0_path}' WHERE country_name IS NOT NULL order by country_name"
-    ).fetchall()
-
-    country_map = {row[0]: row[1] for row in country_rows}
+    country_map = get_country_map()
     unique_countries = list(country_map.keys())
 
     geography_col, sector_program_col = st.columns(2)
@@ -84,10 +83,12 @@ def show_abatement_curve():
             )
 
             region_conditions = []
+            region_condition_list = []
 
             for i in selected_region:
                 cond = map_region_condition(i, country_map)
                 if cond is not None:
+                    region_condition_list.append(cond)
                     col = cond['column_name']
                     val = cond['column_value']
 
@@ -127,12 +128,11 @@ def show_abatement_curve():
                         on_change=mark_ac_recompute
                     )
                 else:
-                    state_province_options = sorted(
-                        row[0] for row in con.execute(
-                            f"SELECT DISTINCT gadm_1_corrected_name FROM '{gadm_1_path}' "
-                            f"WHERE ({region_filter_clause}) AND gadm_1_name IS NOT NULL"
-                        ).fetchall()
-                    )
+                    state_province_options = sorted({
+                        name
+                        for cond in region_condition_list
+                        for name in geography_names('gadm_1_corrected_name', cond['column_name'], cond['column_value'])
+                    })
 
                     selected_state_province = st.multiselect(
                         "State / Province",
@@ -152,17 +152,8 @@ def show_abatement_curve():
                         on_change=mark_ac_recompute
                     )
                 else:
-
-                    sanitized_vals = [str(v).replace("'", "''") for v in selected_state_province]
-                    val_str = "(" + ", ".join(f"'{v}'" for v in sanitized_vals) + ")"
-
-                    query = (
-                        f"SELECT DISTINCT gadm_2_corrected_name FROM '{gadm_2_path}' "
-                        f"WHERE gadm_1_corrected_name IN {val_str} AND gadm_2_name IS NOT NULL"
-                    )
-
-                    county_district_options = sorted(
-                        row[0] for row in con.execute(query).fetchall()
+                    county_district_options = geography_names(
+                        'gadm_2_corrected_name', 'gadm_1_corrected_name', list(selected_state_province)
                     )
 
                     selected_county_district = st.multiselect(
@@ -184,28 +175,7 @@ def show_abatement_curve():
                         on_change=mark_ac_recompute
                     )
                 else:
-                    def duckdb_safe_val(v):
-                        if isinstance(v, bool):
-                            return "TRUE" if v else "FALSE"
-                        return f"'{str(v).replace("'", "''")}'"
-
-
-                    if isinstance(val, list):
-                        val_str = "(" + ", ".join([duckdb_safe_val(v) for v in val]) + ")"
-                    else:
-                        val_str = f"({duckdb_safe_val(val)})"
-
-
-                    query = f"""
-                        SELECT DISTINCT city_name 
-                        FROM '{city_path}' 
-                        WHERE {col} IN {val_str} AND city_name IS NOT NULL
-                    """
-
-
-                    city_options = sorted(
-                        row[0] for row in con.execute(query).fetchall()
-                    )
+                    city_options = geography_names('city_name', col, val)
 
 
                     selected_city = st.multiselect(
@@ -327,7 +297,7 @@ def show_abatement_curve():
     query_df_assets = find_sector_assets_sql(annual_asset_path, gadm_0_path, gadm_1_path, gadm_2_path, city_path, selected_subsector, selected_year, asset_geography_filters_clause)
 
     print("Getting asset data")
-    df_assets = con.execute(query_df_assets).df()
+    df_assets = run_cached_query(con, query_df_assets)
 
     if not df_assets.empty:
         df_assets =  relabel_regions(df_assets)
@@ -337,7 +307,7 @@ def show_abatement_curve():
         # totals for ers, emissions, reduction, assets, countries
 
         query_totals = summarize_totals_sql(annual_asset_path, gadm_0_path, gadm_1_path, gadm_2_path, city_path, selected_subsector, selected_year, asset_geography_filters_clause)
-        df_totals = con.execute(query_totals).df()
+        df_totals = run_cached_query(con, query_totals)
         total_ers = df_totals['total_ers'][0]
         total_subsectors = df_totals['total_subsectors'][0]
         total_assets = df_totals['total_assets'][0]
@@ -351,11 +321,11 @@ def show_abatement_curve():
         total_countries = df_totals['total_countries'][0]
 
         query_reductions = summarize_reductions_sql(annual_asset_path, gadm_0_path, gadm_1_path, gadm_2_path, city_path, selected_subsector, selected_year, asset_geography_filters_clause)
-        df_reductions = con.execute(query_reductions).df()
+        df_reductions = run_cached_query(con, query_reductions)
         total_reductions = df_reductions['total_reductions'][0]
 
         query_emissions = summarize_emissions_sql(total_path, selected_subsector, selected_year, total_geography_filters_clause)
-        df_emissions = con.execute(query_emissions).df()
+        df_emissions = run_cached_query(con, query_emissions)
         total_emissions = df_emissions['emissions_quantity'].sum()
 
         print("✅ Aggregated totals...", flush=True)
@@ -471,14 +441,45 @@ def show_abatement_curve():
         if "selected_assets" not in st.session_state:
             st.session_state.selected_assets = []
 
-        asset_options = df_assets[selected_list].unique()
+        if selected_group == 'asset':
+            # too many assets to list them all in the browser; search the ones
+            # on the curve instead
+            asset_options = set(df_assets[selected_list].unique())
+
+            selected_assets = typeahead_multiselect(
+                highlight_text + " to highlight in curve",
+                search=lambda query, limit: search_assets(query, limit, allowed=asset_options),
+                key="selected_assets"
+            )
+        else:
+            asset_options = df_assets[selected_list].unique()
+
+            selected_assets = st.multiselect(
+                highlight_text + " to highlight in curve",
+                options=asset_options,
+                default=st.session_state.selected_assets,
+                key = "selected_assets"
+            )
 
-        selected_assets = st.multiselect(
-            highlight_text + " to highlight in curve",
-            options=asset_options,
-            default=st.session_state.selected_assets,
-            key = "selected_assets"
-        )
+        # plotly zoom events don't reach the server, so the visible x-range is
+        # picked here and the curve is sent at the resolution that range needs
+        if selected_group == 'asset':
+            x_range_pct = st.slider(
+                "Visible range (% of x-axis)",
+                min_value=0.0,
+                max_value=100.0,
+                value=(0.0, 100.0),
+                step=0.5,
+                key="ac_x_range")
+        else:
+            x_range_pct = (0.0, 100.0)
+        x_range = None if x_range_pct == (0.0, 100.0) else (x_range_pct[0] / 100, x_range_pct[1] / 100)
+
+        # bucketed levels of detail are kept per selection and rebuilt when it changes
+        lod_key = (get_release(), query_df_assets, selected_group, selected_color, selected_x, selected_y)
+        if st.session_state.get("ac_lod_key") != lod_key:
+            st.session_state["ac_lod_key"] = lod_key
+            st.session_state["ac_lod_cache"] = {}
 
         st.markdown("<br>", unsafe_allow_html=True)
 
@@ -544,7 +545,7 @@ def show_abatement_curve():
         #         selected_strategy_list = None
         #     )
         #     df_assets = pd.concat([df_assets, renewables_df])
-        fig, df_csv = plot_abatement_curve(df_assets, selected_group, selected_color, dict_color, dict_lines, selected_list, selected_assets, selected_x, selected_y, selected_threshold, fill=True)
+        fig, df_csv = plot_abatement_curve(df_assets, selected_group, selected_color, dict_color, dict_lines, selected_list, selected_assets, selected_x, selected_y, selected_threshold, fill=True, x_range=x_range, lod_cache=st.session_state["ac_lod_cache"])
         print("✅ Plot generated", flush=True)
 
         title_col, download_col = st.columns([6, 1])
@@ -578,7 +579,7 @@ def show_abatement_curve():
 
         # create a table to summarize ers for sector
         query_ers = summarize_ers_sql(annual_asset_path, gadm_0_path, gadm_1_path, gadm_2_path, city_path, selected_subsector, selected_year, asset_geography_filters_clause)
-        ers_table = con.execute(query_ers).df()
+        ers_table = run_cached_query(con, query_ers)
         csv_ers = ers_table.to_csv(index=False).encode('utf-8')
 
         st.download_button(
@@ -601,7 +602,7 @@ def show_abatement_curve():
 
         # create a table with all assets + ERS info
         query_table = create_table_assets_sql(annual_asset_path, gadm_0_path, gadm_1_path, gadm_2_path, city_path, selected_subsector, selected_year, asset_geography_filters_clause)
-        df_table = con.execute(query_table).df()
+        df_table = run_cached_query(con, query_table)
 
         if selected_program == 'Emissions Reduction Solutions':
             df_table = df_table.sort_values("asset_difficulty_score", ascending=True).reset_index()
@@ -661,7 +662,6 @@ def show_abatement_curve():
         )
         print("✅ Final table rendered", flush=True)
 
-        con.close()
     else:
         summary_text = (
             "No assets found in your selected <b>geography</b> and <b>subsector(s)</b><br>"
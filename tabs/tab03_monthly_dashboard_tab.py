@@ -1,7 +1,6 @@
 # UPDATE 4: MAKE PARQUET CONVERSION SCRIPT DELETE UNDERSCORE DATE AND MAKE STATIC FILE PATH
 
 import streamlit as st
-import duckdb
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -11,6 +10,10 @@ from calendar import month_name
 import calendar
 from utils.utils import format_dropdown_options, map_region_condition, format_number_short, create_excel_file, bordered_metric
 from config import CONFIG
+from utils.gadm_1_stats import get_gadm_1_stats, gadm_1_states, gadm_1_statistics
+from utils.geography import get_country_map
+from utils.monthly_cube import get_monthly_cube, monthly_asset_series, monthly_sector_totals
+from utils.monthly_stats import get_monthly_stats, monthly_stats_by_country, monthly_stats_subsectors
 
 
 
@@ -32,38 +35,21 @@ def show_monthly_dashboard():
         unsafe_allow_html=True
     )
 
-    # configure data paths (querying) and region options (dropdown selection)
-    asset_path = CONFIG['asset_emissions_country_subsector_path']
-    country_subsector_stats_path = CONFIG['country_subsector_stats_path']
-    country_subsector_totals_path = CONFIG['country_subsector_totals_path']
+    # configure region options (dropdown selection)
     region_options = [r for r in CONFIG['region_options'] if r != 'G20']
-    gadm_0_path = CONFIG['gadm_0_path']
 
-    con = duckdb.connect()
-
-    max_date = con.execute(f"""SELECT MAX(MAKE_DATE(year, month, 1)) AS max_date
-            FROM '{country_subsector_totals_path}'
-            WHERE country_name IS NOT NULL
-    """).fetchone()[0]
-
-    earliest_year = (max_date.year) - 3
+    # monthly series come from the precomputed cube, one block per region and gas
+    max_date = get_monthly_cube()['max_month']
 
     st.markdown("<br>", unsafe_allow_html=True)
 
-    country_rows = con.execute(
-            f"SELECT DISTINCT country_name, iso3_country FROM '{gadm_0_path}' WHERE country_name IS NOT NULL order by country_name"
-        ).fetchall()
-
-    country_map = {row[0]: row[1] for row in country_rows}
+    country_map = get_country_map()
     unique_countries = list(country_map.keys())
 
-    df_stats_all = con.execute(f"""
-        SELECT * 
-        FROM '{country_subsector_stats_path}'
-        where gas in ('co2e_100yr','ch4')
-    """).df()
+    # statistics are loaded once per release; filters and aggregations below run in DuckDB
+    monthly_stats = get_monthly_stats()
 
-    raw_sectors = sorted(df_stats_all['sector'].dropna().unique().tolist())
+    raw_sectors = monthly_stats['sectors']
 
     def format_sector_label(sector):
         return ' '.join([w.capitalize() if w.lower() != 'and' else 'and' for w in sector.replace('-', ' ').split()])
@@ -80,27 +66,38 @@ def show_monthly_dashboard():
         selected_scope = st.selectbox("Region/Country", region_options + unique_countries, key="selected_scope")
         region_condition = map_region_condition(selected_scope, country_map)
 
+        # states/provinces are only offered below a single country
+        state_options = {}
+        if region_condition and region_condition['column_name'] == 'iso3_country':
+            state_options = gadm_1_states(region_condition['column_value'])
+
+        # the state dropdown sits below the sector one, so read its value ahead
+        selected_state = st.session_state.get("state_selector")
+        if selected_state not in state_options:
+            selected_state = None
+
     with sector_dropdown:
-        selected_sector_label = st.selectbox("Sector", sector_labels, key="sector_selector")
+        # state statistics cover all sectors, so sector filters are off for a state
+        selected_sector_label = st.selectbox("Sector", sector_labels, key="sector_selector", disabled=selected_state is not None)
         selected_sector_raw = sector_map.get(selected_sector_label)
 
     with gas_drodpdown:
         selected_gas = st.selectbox("Gas", ["co2e_100yr", "ch4"], key="gas_selector")
-        df_stats_all = df_stats_all[df_stats_all['gas'] == selected_gas]
 
     # Filter subsectors based on selected sector
-    if selected_sector_raw:
-        subsector_subset = df_stats_all[df_stats_all['sector'] == selected_sector_raw]
-    else:
-        subsector_subset = df_stats_all
-
-    raw_subsectors = sorted(subsector_subset['subsector'].dropna().unique().tolist())
+    raw_subsectors = monthly_stats_subsectors(selected_gas, selected_sector_raw)
     subsector_labels, subsector_map = format_dropdown_options(raw_subsectors)
 
     # --- ROW 2 ---
     state_province_dropdown, subsector_dropdown, current_month_dropdown = st.columns(3)
     with state_province_dropdown:
-        st.selectbox("State/Province", ["🚧 Coming Soon 🚧"], disabled=True, key="state_selector")
+        st.selectbox(
+            "State/Province",
+            [None, *state_options],
+            format_func=lambda gadm_id: "All" if gadm_id is None else state_options[gadm_id],
+            disabled=not state_options,
+            key="state_selector"
+        )
 
     with subsector_dropdown:
         # Reset subsector if sector changed
@@ -114,6 +111,7 @@ def show_monthly_dashboard():
         selected_subsector_label = st.multiselect(
             "Subsector",
             subsector_labels,
+            disabled=selected_state is not None,
             key="selected_subsector_label"
         )
 
@@ -144,127 +142,42 @@ def show_monthly_dashboard():
 
     st.markdown("<br>", unsafe_allow_html=True)
 
-    # Emissions columns from parquet
-    df_stats_all = df_stats_all[df_stats_all['country_name'].notna()].copy()
-    emissions_columns = [col for col in df_stats_all.columns if col.startswith("emissions_quantity_")]
-    emissions_columns_sorted = sorted(emissions_columns, reverse=True)
-    emissions_column_latest = emissions_columns_sorted[0]
-    emissions_column_prev = emissions_columns_sorted[1]
-
-    country_name_map_asset = {
-        "United States": "United States of America"
-    }
-    asset_scope = country_name_map_asset.get(selected_scope, selected_scope)
-
-    # Build query for asset-level time series
-    where_clauses = [f"gas = '{selected_gas}'"]
-
-    # Sector/Subsector filters
-    if selected_sector_raw:
-        where_clauses.append(f"sector = '{selected_sector_raw}'")
-    if selected_subsector_raw:
-        if len(selected_subsector_raw) == 1:
-            where_clauses.append(f"original_inventory_sector = '{selected_subsector_raw[0]}'")
-        else:
-            formatted_subsectors = ",".join([f"'{sub}'" for sub in selected_subsector_raw])
-            where_clauses.append(f"original_inventory_sector IN ({formatted_subsectors})")
-
-
-
-    if region_condition:
-        col = region_condition['column_name']
-        val = region_condition['column_value']
-
-        # Special handling if it's actually a country filter
-        if col == "country_name" and isinstance(val, list) and set(val) == {"United States", "United States of America"}:
-            where_clauses.append("country_name IN ('United States', 'United States of America')")
-        else:
-            val_str = f"'{val}'" if isinstance(val, str) else str(val).upper()
-            where_clauses.append(f"{col} = {val_str}")
-
-
-    query = f"""
-        SELECT 
-            strftime(start_time, '%Y-%m') AS year_month,
-            --CASE WHEN BOOL_OR(activity_is_temporal) THEN SUM(activity) ELSE AVG(activity) END AS activity,
-            SUM(activity) activity,
-            SUM(emissions_quantity) AS emissions_quantity
-        FROM '{asset_path}'
-        WHERE {' AND '.join(where_clauses)}
-            and original_inventory_sector not in ('forest-land-clearing',
-                                                    'forest-land-degradation',
-                                                    'forest-land-fires',
-                                                    'net-forest-land',
-                                                    'net-shrubgrass',
-                                                    'net-wetland',
-                                                    'removals',
-                                                    'shrubgrass-fires',
-                                                    'water-reservoirs',
-                                                    'wetland-fires')
-        GROUP BY year_month
-        ORDER BY year_month
-    """
-    # print(query)
-
-    monthly_df = con.execute(query).df()
-    monthly_df["year_month"] = pd.to_datetime(monthly_df["year_month"])
-    if not monthly_df.empty:
-        monthly_df["mean_emissions_factor"] = monthly_df["emissions_quantity"] / monthly_df["activity"]
-
-    # Filter stats for table view
-    if selected_sector_raw:
-        df_stats_all = df_stats_all[df_stats_all['sector'] == selected_sector_raw]
-    
-    df_stats = df_stats_all[df_stats_all['country_name'].notna()].copy()
-    
-    df_stats['country_name'] = df_stats['country_name'].replace({
-        'United States of America': 'United States',
-        'Russian Federation': 'Russia'
-    })
+    if selected_state:
+        selected_sector_label, selected_sector_raw = "All", None
+        selected_subsector_label, selected_subsector_raw = [], []
+        selected_region_label = f"{state_options[selected_state]}, {selected_scope}"
 
-    if selected_scope != 'Global':
-        if region_condition:
-            col = region_condition['column_name']
-            val = region_condition['column_value']
-            if isinstance(val, (list, tuple, set)):
-                df_stats = df_stats[df_stats[col].isin(val)]
-            else:
-                df_stats = df_stats[df_stats[col] == val]
-        else:
-            df_stats = df_stats[df_stats['country_name'] == selected_scope]
+        # one row per gas, read from the state's row groups only
+        gadm_1_stats = get_gadm_1_stats()
+        emissions_column_latest = gadm_1_stats['latest_column']
+        emissions_column_prev = gadm_1_stats['prev_column']
+        df_stats_filtered = gadm_1_statistics(selected_state, selected_gas)
 
-    # Determine if we're selecting everything ("All") or specific subsectors
-    if not selected_subsector_raw or "All" in selected_subsector_label:
-        # "All" selected or no subsector selected → use the full df_stats
-        df_stats_filtered = df_stats.copy()
     else:
-        # Specific subsectors selected → filter to those
-        df_stats_filtered = df_stats[df_stats['subsector'].isin(selected_subsector_raw)]
+        selected_region_label = selected_scope
+
+        # Emissions columns from parquet
+        emissions_column_latest = monthly_stats['latest_column']
+        emissions_column_prev = monthly_stats['prev_column']
+
+        # asset-level time series
+        monthly_df = monthly_asset_series(region_condition, selected_gas, selected_sector_raw, selected_subsector_raw)
+        monthly_df["year_month"] = pd.to_datetime(monthly_df["year_month"])
+        if not monthly_df.empty:
+            monthly_df["mean_emissions_factor"] = monthly_df["emissions_quantity"] / monthly_df["activity"]
+
+        # Stats table view: one row per country, with the emission-weighted slope
+        # and MoM/YoY changes aggregated in DuckDB
+        if not selected_subsector_raw or "All" in selected_subsector_label:
+            stats_subsectors = None
+        else:
+            stats_subsectors = selected_subsector_raw
 
-    # Additional processing regardless of subsector filtering
-    if 'emissions_slope_36_months_t_per_month' in df_stats_filtered.columns:
-        df_stats_filtered['slope_times_emissions'] = (
-            df_stats_filtered['emissions_slope_36_months_t_per_month'] * df_stats_filtered[emissions_column_latest]
-        )
-        slopes = df_stats_filtered.groupby('country_name').agg({
-            'slope_times_emissions': 'sum',
-            emissions_column_latest: 'sum'
-        }).reset_index()
-        slopes['emissions_slope_36_months_t_per_month'] = slopes['slope_times_emissions'] / slopes[emissions_column_latest]
-        df_stats_agg = df_stats_filtered.groupby('country_name').agg({
-            emissions_column_latest: 'sum',
-            emissions_column_prev: 'sum',
-            'mom_change': 'sum',
-            'month_yoy_change': 'sum'
-        }).reset_index()
-        df_stats_agg['mom_percent_change'] = (df_stats_agg['mom_change'] / df_stats_agg[emissions_column_prev]) * 100
-        df_stats_agg['month_yoy_percent_change'] = (
-            df_stats_agg['month_yoy_change'] / (df_stats_agg[emissions_column_latest] - df_stats_agg['month_yoy_change'])
-        ) * 100
-        df_stats_filtered = df_stats_agg.merge(
-            slopes[['country_name', 'emissions_slope_36_months_t_per_month']],
-            on='country_name',
-            how='left'
+        df_stats_filtered = monthly_stats_by_country(
+            selected_gas,
+            sector=selected_sector_raw,
+            subsectors=stats_subsectors,
+            region_condition=region_condition
         )
 
 
@@ -335,7 +248,7 @@ def show_monthly_dashboard():
 
     st.markdown(
         f"<div style='font-size: 1.1em; line-height: 1.6em; margin: 16px 0;'>"
-        f"In {latest_month}, {selected_scope}{sector_text}{subsector_text} emissions were "
+        f"In {latest_month}, {selected_region_label}{sector_text}{subsector_text} emissions were "
         f"<span style='font-weight: bold; font-style: italic; text-decoration: underline;'>{emissions_value:,.0f}</span> {gas_unit}. "
         f"This represents {mom_text} compared to the previous month. This also represents {yoy_text} compared to the same month last year."
         f"</div>",
@@ -351,7 +264,7 @@ def show_monthly_dashboard():
     col1, col2, col3, col4, col5 = st.columns(5)
 
     with col1:
-        bordered_metric("Selected Region", selected_scope)
+        bordered_metric("Selected Region", selected_region_label)
 
     with col2:
         if selected_subsector_label:
@@ -388,49 +301,22 @@ def show_monthly_dashboard():
     st.markdown("<br>", unsafe_allow_html=True)
     st.markdown("<br>", unsafe_allow_html=True)
 
+    if selected_state:
+        show_state_trends(
+            df_stats_filtered,
+            selected_region_label,
+            gas_unit,
+            emissions_column_latest,
+            emissions_column_prev,
+            gadm_1_stats['years'],
+            download_placeholder
+        )
+        return
+
     # ------------------------------------ Monthly Subsector Stacked Bar -----------------------------------------
     # st.subheader("Annual Emissions by Sector")
 
-    # Optional name normalization for country dropdown
-    country_name_map = {
-        "United States of America": "United States",
-        #"Russia": "Russian Federation"
-    }
-    raw_country = country_name_map.get(selected_scope, selected_scope)
-
-    # Start building the query
-    query = f"""
-        SELECT 
-            MAKE_DATE(year, month, 1) AS year_month,
-            sector,
-            SUM(emissions_quantity) AS emissions_quantity
-        FROM '{country_subsector_totals_path}'
-        WHERE gas = '{selected_gas}'
-            AND year >= {earliest_year}
-            and country_name is not null
-    """
-
-    # Apply region or country filter
-    if selected_scope in region_options and region_condition:
-        query += f" AND {region_condition['column_name']} = '{region_condition['column_value']}'"
-    elif selected_scope != "Global":
-        query += f" AND country_name = '{raw_country}'"
-
-    # Add optional sector/subsector filters
-    if selected_sector_raw:
-        query += f" AND sector = '{selected_sector_raw}'"
-    if selected_subsector_raw:
-        if len(selected_subsector_raw) == 1:
-            query += f" AND subsector = '{selected_subsector_raw[0]}'"
-        else:
-            formatted_subsectors = ",".join([f"'{sub}'" for sub in selected_subsector_raw])
-            query += f" AND subsector IN ({formatted_subsectors})"
-
-    # Finalize the query
-    query += " GROUP BY year_month, sector ORDER BY year_month, sector"
-
-    # Run the query
-    df_monthly = con.execute(query).df()
+    df_monthly = monthly_sector_totals(region_condition, selected_gas, selected_sector_raw, selected_subsector_raw)
 
     # Convert year_month to string for better display
     df_monthly["year_month"] = pd.to_datetime(df_monthly["year_month"])
@@ -517,50 +403,18 @@ def show_monthly_dashboard():
     # Plotting
     st.subheader(f"Emissions Over Time ({gas_unit}) - {selected_scope} | {selected_subsector_label}")
 
-    subsector_condition = ""
-    if selected_subsector_raw:
-        if len(selected_subsector_raw) == 1:
-            subsector_condition = f"AND subsector = '{selected_subsector_raw[0]}'"
-        elif len(selected_subsector_raw) > 1:
-            formatted_subsectors = ",".join([f"'{sub}'" for sub in selected_subsector_raw])
-            subsector_condition = f"AND subsector IN ({formatted_subsectors})"
-
-    region_clause = (
-        f"AND {region_condition['column_name']} IN ('United States', 'United States of America')"
-            if region_condition and isinstance(region_condition['column_value'], list)
-        else f"AND {region_condition['column_name']} = '{region_condition['column_value']}'"
-            if region_condition
-        else ''
-    )
-
-    query_country = f"""
-        WITH latest_month AS (
-            SELECT MAX(MAKE_DATE(year, month, 1)) AS max_date
-                , date_trunc('year', MAX(MAKE_DATE(year, month, 1))) - INTERVAL '3 years' AS cutoff_date
-            FROM '{country_subsector_totals_path}'
-            WHERE gas = 'co2e_100yr'
-            AND country_name IS NOT NULL
-        )
-        SELECT 
-            MAKE_DATE(year, month, 1) AS year_month,
-            SUM(emissions_quantity) AS country_emissions_quantity
-        FROM '{country_subsector_totals_path}', latest_month
-        WHERE gas = '{selected_gas}'
-            AND country_name IS NOT NULL
-            AND MAKE_DATE(year, month, 1) >= cutoff_date
-            {subsector_condition}
-            {'AND sector = \'%s\'' % selected_sector_raw if selected_sector_raw else ''}
-            {region_clause}
-        GROUP BY year_month
-        ORDER BY year_month
-    """
-
     # --------------- Emissions Line Charts ---------------
-    country_df = con.execute(query_country).df()
+    country_df = (
+        df_monthly.groupby('year_month', as_index=False)['emissions_quantity'].sum(min_count=1)
+        .rename(columns={'emissions_quantity': 'country_emissions_quantity'})
+    )
 
     if not country_df.empty:
         country_df['year_month'] = pd.to_datetime(country_df['year_month'])
 
+    # quarter lines follow the totals series, which can be empty
+    quarter_starts = []
+
     # Check which charts should be shown
     show_activity_and_ef = selected_subsector_raw and not monthly_df.empty
 
@@ -636,26 +490,40 @@ def show_monthly_dashboard():
             row=3, col=1
         )
 
-    for q_start in quarter_starts:
-            # Just once — this applies to all subplots when x-axis is shared
-            fig_combined.add_vline(
-                x=q_start,
-                line_width=1,
-                line_dash='dash',
-                line_color='gray'
+    # Quarter lines on every row and one label above row 1, added in one
+    # layout update (add_vline/add_annotation revalidate every existing shape
+    # on each call)
+    axis_suffixes = ['' if row == 1 else str(row) for row in range(1, num_rows + 1)]
+    fig_combined.update_layout(
+        shapes=[
+            dict(
+                type='line',
+                x0=q_start, x1=q_start,
+                xref=f"x{suffix}",
+                y0=0, y1=1,
+                yref=f"y{suffix} domain",
+                line=dict(width=1, dash='dash', color='gray')
             )
-
-            # Add label only once (above row 1)
-            fig_combined.add_annotation(
-                x=q_start,
-                y=1.01,
-                xref="x",
-                yref="paper",
-                text=f"Q{((q_start.month - 1) // 3 + 1)} {q_start.year}",
-                showarrow=False,
-                font=dict(size=9),
-                align="center"
+            for q_start in quarter_starts
+            for suffix in axis_suffixes
+        ],
+        annotations=[
+            *fig_combined.layout.annotations,
+            *(
+                dict(
+                    x=q_start,
+                    y=1.01,
+                    xref="x",
+                    yref="paper",
+                    text=f"Q{((q_start.month - 1) // 3 + 1)} {q_start.year}",
+                    showarrow=False,
+                    font=dict(size=9),
+                    align="center"
+                )
+                for q_start in quarter_starts
             )
+        ]
+    )
 
     # Layout adjustments
     fig_combined.update_layout(
@@ -786,5 +654,103 @@ def show_monthly_dashboard():
             help="The downloaded data will represent your dropdown selections."
         )
 
-    con.close()
 
+
+
+'''
+This renders the rest of Monthly Trends for a state/province from its gadm_1
+statistics (state_df, the row for the selected gas): annual emissions, the
+MoM/YoY table and year-to-date emissions by year. The state statistics have
+no monthly series or sector split, so annual and year-to-date totals stand
+in for the monthly charts.
+'''
+def show_state_trends(state_df, state_label, gas_unit, emissions_column_latest, emissions_column_prev, years, download_placeholder):
+
+    if state_df.empty:
+        st.markdown(
+            """
+            <div style='border: 1px solid #ccc; height: 300px; opacity: 0.5; display: flex; align-items: center; justify-content: center;'>
+                <h4>No data available for the selected state/province</h4>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+        return
+
+    row = state_df.iloc[0]
+    latest_year = int(emissions_column_latest[-6:-2])
+    latest_month_abbr = calendar.month_abbr[int(emissions_column_latest[-2:])]
+
+    annual_df = pd.DataFrame({
+        'year': [f"{year} (YTD)" if year == latest_year else str(year) for year in years],
+        'total_emissions': [row.get(f"{year}_total_emissions") for year in years],
+        'year_to_date_emissions': [row.get(f"year_to_date_{year}_emissions") for year in years],
+    })
+
+    # ----------------------- Annual Emissions -----------------------
+    st.subheader(f"Annual Emissions ({gas_unit}) - {state_label}")
+
+    fig_annual = px.bar(
+        annual_df,
+        x="year",
+        y="total_emissions",
+        text=[format_number_short(v) for v in annual_df["total_emissions"]],
+        labels={"total_emissions": f"Emissions ({gas_unit})", "year": "Year"}
+    )
+    fig_annual.update_traces(textposition="outside", cliponaxis=False)
+    fig_annual.update_layout(xaxis=dict(type="category"), margin=dict(t=50, b=30))
+
+    st.plotly_chart(fig_annual, use_container_width=True)
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # ----------------------- MoM / YoY Table -----------------------
+    st.subheader("Month-over-Month and Year-over-Year Change")
+
+    rename_map = {
+        'gadm_name': 'State/Province',
+        emissions_column_latest: 'Emissions ' + emissions_column_latest[-6:-2] + '-' + emissions_column_latest[-2:],
+        emissions_column_prev: 'Emissions ' + emissions_column_prev[-6:-2] + '-' + emissions_column_prev[-2:],
+        'emissions_slope_36_months_t_per_month': 'Average Monthly Change (3 Year)'
+    }
+    change_cols = ['mom_change', 'mom_percent_change', 'month_yoy_percent_change', rename_map['emissions_slope_36_months_t_per_month']]
+
+    styled_df = (
+        state_df[['gadm_name', emissions_column_prev, emissions_column_latest, 'mom_change',
+                  'mom_percent_change', 'month_yoy_percent_change', 'emissions_slope_36_months_t_per_month']]
+        .rename(columns=rename_map)
+        .style.format({
+            rename_map[emissions_column_prev]: "{:,.0f}",
+            rename_map[emissions_column_latest]: "{:,.0f}",
+            'mom_change': "{:,.0f}",
+            'mom_percent_change': "{:.1f}%",
+            'month_yoy_percent_change': "{:.1f}%",
+            rename_map['emissions_slope_36_months_t_per_month']: "{:,.0f}"
+        })
+        .map(lambda val: f'color: {"green" if val < 0 else "red"}', subset=change_cols)
+    )
+
+    st.dataframe(styled_df, use_container_width=True, hide_index=True)
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # ----------------------- Year-to-Date by Year -----------------------
+    st.subheader(f"Year-to-Date Emissions by Year (Jan–{latest_month_abbr})")
+
+    fig_ytd = px.bar(
+        annual_df,
+        x="year",
+        y="year_to_date_emissions",
+        labels={"year_to_date_emissions": f"Cumulative Emissions ({gas_unit})", "year": "Year"}
+    )
+    fig_ytd.update_layout(xaxis=dict(type="category"), margin=dict(t=50, b=30))
+
+    st.plotly_chart(fig_ytd, use_container_width=True)
+
+    download_placeholder.download_button(
+        label="   ⬇   Download Data   ",
+        data=create_excel_file({"Annual Emissions": annual_df, "Stats Data": state_df}),
+        file_name="climate_trace_dashboard_data.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        help="The downloaded data will represent your dropdown selections."
+    )
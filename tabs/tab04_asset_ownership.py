@@ -1,11 +1,14 @@
 import streamlit as st
-import duckdb
 import re
 import pandas as pd
 import geopandas as gpd
 import numpy as np
 import plotly.express as px
 from config import CONFIG
+from utils.connection import get_connection, has_table, table_ref
+from utils.ownership import owner_countries, owner_descendants, owner_rollup
+from utils.search import search_owners, typeahead_multiselect
+from utils.query_cache import run_cached_query
 from utils.utils import *
 from utils.queries import *
 
@@ -28,63 +31,16 @@ def show_ownership_module():
     )
 
     ##### SET UP -------
-    con = duckdb.connect()
-    annual_asset_path = CONFIG['annual_asset_path']
-    gadm_0_path = CONFIG['gadm_0_path']
-    ownership_path = CONFIG['asset_ownership_path']
+    con = get_connection()
     
-    ##### IMPORT DATA -------
-    
-    # import ownership + emissions data
-    query_df_ownership = get_ownership_sql(annual_asset_path, ownership_path)
-    df_ownership = con.execute(query_df_ownership).df()
-    query_ct_emissions = get_gadm_emissions_sql(gadm_0_path)
-    df_gadm_emissions = con.execute(query_ct_emissions).df()
-
-    # calculate country-level and gadm-level emissions factors
-    df_gadm_emissions = df_gadm_emissions[(df_gadm_emissions['activity'].notna()) & (df_gadm_emissions['emissions_quantity'].notna())]
-    df_global_emissions = df_gadm_emissions.groupby(['subsector']).agg(activity=('activity', 'sum'), emissions_quantity=('emissions_quantity', 'sum')).reset_index()
-    df_global_emissions['ef_global'] = np.where(df_global_emissions['activity'] != 0, df_global_emissions['emissions_quantity'] / df_global_emissions['activity'], np.nan)
-    df_global_emissions['ef_global'] = np.where(df_global_emissions['ef_global'] == 0, np.nan, df_global_emissions['ef_global'])
-    df_global_emissions = df_global_emissions[['subsector', 'ef_global']]
-    df_gadm_emissions['ef_country'] = np.where(df_gadm_emissions['activity'] != 0, df_gadm_emissions['emissions_quantity'] / df_gadm_emissions['activity'], np.nan)
-    df_gadm_emissions['ef_country'] = np.where(np.isclose(df_gadm_emissions['ef_country'], 0, atol=1e-6), np.nan, df_gadm_emissions['ef_country'])
-    df_gadm_emissions = df_gadm_emissions[['iso3_country', 'subsector', 'ef_country']]
-
-    # format + clean ownership data
-    df_ownership['parent_entity_id'] = df_ownership['parent_entity_id'].fillna('')
-    df_ownership['parent_name'] = df_ownership['parent_name'].str.strip()
-    df_ownership['parent_name'] = df_ownership['parent_name'].replace('unknown', '').fillna('')
-    df_ownership['parent_lei'] = np.where(((df_ownership['parent_lei'] == 'not applicable') & (df_ownership['parent_entity_type'] == 'unknown entity')) |
-                                        (df_ownership['parent_lei'] == 'not found'), '', df_ownership['parent_lei'])
-    df_ownership['immediate_source_owner'] = df_ownership['immediate_source_owner'].replace('unknown', '').fillna('')
-    
-    # create keys to search by parent, immediate source, and source operator
-    df_ownership['parent'] = np.where(df_ownership['parent_lei'] != '', 
-                                      df_ownership['parent_entity_id'] + ': ' + df_ownership['parent_name'] + ' (' + df_ownership['parent_lei'] + ')',
-                                      df_ownership['parent_entity_id'] + ': ' + df_ownership['parent_name'])
-    df_ownership['parent'] = np.where(df_ownership['parent'] == ': ', 'Unknown parent', df_ownership['parent'])
-    df_ownership['immediate source'] = df_ownership['immediate_source_owner_entity_id'] + ': ' + df_ownership['immediate_source_owner']
-    df_ownership['immediate source'] = np.where(df_ownership['immediate source'] == ': ', 'Unknown immediate source', df_ownership['immediate source'])
-    df_ownership['source operator'] = df_ownership['source_operator_id'] + ': ' + df_ownership['source_operator']
-    df_ownership['source operator'] = np.where(df_ownership['source operator'] == ': ', 'Unknown source operator', df_ownership['source operator'])
-    
-    # calculate ownership emissions factors
-    df_ownership['activity'] = df_ownership['activity'].astype(float)
-    df_ownership['ef_asset'] = df_ownership['emissions_quantity'].div(df_ownership['activity'].where(df_ownership['activity'] != 0, np.nan))
-
     ##### DROPDOWN MENU: KEYS FOR SEARCHING -------
 
-    ownership_list = {'parent': df_ownership['parent'].drop_duplicates().sort_values().tolist(),
-                      'immediate source': df_ownership['immediate source'].drop_duplicates().sort_values().tolist(),
-                      'source operator': df_ownership['source operator'].drop_duplicates().sort_values().tolist()}
-
     # by default, show all assets
     selected_key_default = 'parent'
 
     key_col = st.columns(1)
     with key_col[0]:
-        key_options = ownership_list.keys()
+        key_options = OWNER_TYPE_COLUMNS.keys()
         selected_key_user= st.selectbox(
             "Select owner type",
             options=key_options)
@@ -94,53 +50,60 @@ def show_ownership_module():
     else:
         selected_key = selected_key_user
 
-    owners_options = [
-        owner
-        for owner in ownership_list[selected_key]]
-
-    # select relevant owners
-    selected_owners_default = owners_options
+    key_column = OWNER_TYPE_COLUMNS[selected_key]
 
+    # select relevant owners, searched by name, entity ID or LEI rather than
+    # sending every owner of this type to the browser
     with st.expander("Select owner"):
-        selected_owners_user = st.multiselect(
+        selected_owners_user = typeahead_multiselect(
             "Owner Entity ID: Owner Name (Owner LEI, if applicable)",
-            options=owners_options,
-            default=[]
+            search=lambda query, limit: search_owners(selected_key, query, limit),
+            key=f"ownership_owners_{selected_key}"
         )
 
         # select relevant locations
-        loc_options = df_ownership[df_ownership[selected_key].isin(selected_owners_user)]['iso3_country'].drop_duplicates().sort_values()
+        loc_options = owner_countries(selected_key, selected_owners_user) if selected_owners_user else []
         selected_location_user = st.multiselect(
             "Locations",
             options=loc_options,
             default=loc_options
         )
 
-    # filter based on selection
+    # roll up the selection from the precomputed per-owner totals
     if not selected_owners_user:
-        selected_owners = selected_owners_default
-        df_selected = df_ownership.sort_values('emissions_quantity', ascending=False).reset_index().copy()
+        selected_owners = []
+        selected_locations = None
+        rollup = owner_rollup(selected_key)
     else:
         selected_owners = selected_owners_user
-        df_selected = df_ownership[(df_ownership[selected_key].isin(selected_owners)) & (df_ownership['iso3_country'].isin(selected_location_user))].copy()
-        df_selected = df_selected.sort_values('emissions_quantity', ascending=False).reset_index()
+        selected_locations = selected_location_user
+        rollup = owner_rollup(selected_key, selected_owners, selected_locations)
     
     ##### SUMMARY INFO -------
     st.markdown("### Ownership Analysis")
     st.markdown(
     f"""
     <div style="text-align:left; font-size:24px; margin-top:5px;">
-        <b>Emissions (t CO2e):</b> {df_selected.drop_duplicates('asset_id')['emissions_quantity'].sum():,.0f} <br> 
-        <b>Sectors:</b> {df_selected['subsector'].nunique()} <br> 
-        <b>Assets:</b> {df_selected['asset_id'].nunique():,.0f} <br> 
+        <b>Emissions (t CO2e, by ownership share):</b> {rollup['emissions_quantity']:,.0f} <br> 
+        <b>Sectors:</b> {rollup['subsectors']} <br> 
+        <b>Assets:</b> {rollup['assets']:,.0f} <br> 
     </div>
     """,
     unsafe_allow_html=True)
 
+    # owners further down the chain, e.g. the operators a parent holds assets through
+    if selected_owners_user:
+        descendants = owner_descendants(selected_key, selected_owners_user)
+        if descendants:
+            st.caption("Held through " + ", ".join(
+                f"{len(owners):,} {owner_type}{'s' if len(owners) != 1 else ''}"
+                for owner_type, owners in descendants.items()
+            ))
+
     ##### CREATE ASSET MAP -------
 
     # get country information
-    df_map = df_selected.groupby(['iso3_country']).agg(num_assets=('asset_id', 'size')).reset_index()
+    df_map = rollup['by_country'][['iso3_country', 'asset_count']].rename(columns={'asset_count': 'num_assets'})
     
     # get asset information --- REPLACE WITH REAL ASSETS
     asset_data = {
@@ -179,8 +142,8 @@ def show_ownership_module():
     # create pie chart based off sector breakdown
     with sector_col:
         fig_pie = px.pie(
-            df_selected,
-            values='emissions_quantity',
+            rollup['by_subsector'],
+            values='share_emissions_quantity',
             names='subsector',
             title='Sector View<br><i>Emissions in CO2e</i>',
             color_discrete_sequence=px.colors.qualitative.Prism
@@ -189,7 +152,7 @@ def show_ownership_module():
 
     # create bar chart based off country breakdown
     with country_col:
-        bar_data = df_selected.groupby('iso3_country', as_index=False)['emissions_quantity'].sum()
+        bar_data = rollup['by_country'][['iso3_country', 'share_emissions_quantity']].rename(columns={'share_emissions_quantity': 'emissions_quantity'})
         # add row for sum of all countries
         total_row = pd.DataFrame({"iso3_country": ['Total'], "emissions_quantity": [bar_data['emissions_quantity'].sum()]})
         bar_data = pd.concat([bar_data, total_row])
@@ -219,8 +182,18 @@ def show_ownership_module():
     unsafe_allow_html=True)
 
     # create table
-    df_table = df_selected[['asset_id', 'asset_name', 'subsector', 'asset_type', 'iso3_country', 'activity_units', 'activity', 'emissions_quantity', 'ef_asset']].drop_duplicates().head(1000)
-    df_table = df_table.merge(df_gadm_emissions, how='left', on=['iso3_country', 'subsector']).merge(df_global_emissions, how='left', on=['subsector'])
+    if has_table('ownership_fact_path'):
+        query_df_table = get_owner_assets_sql(table_ref('ownership_fact_path'), key_column, selected_owners_user, selected_locations)
+        df_table = run_cached_query(con, query_df_table)
+    else:
+        # no refresh output, build the fact rows from the source tables
+        query_df_ownership = get_ownership_fact_sql(table_ref('annual_asset_path'),
+                                                    table_ref('asset_ownership_path'),
+                                                    table_ref('gadm_0_path'))
+        df_ownership = run_cached_query(con, query_df_ownership)
+        if selected_owners_user:
+            df_ownership = df_ownership[(df_ownership[key_column].isin(selected_owners)) & (df_ownership['iso3_country'].isin(selected_locations))]
+        df_table = df_ownership[['asset_id', 'asset_name', 'subsector', 'asset_type', 'iso3_country', 'activity_units', 'activity', 'emissions_quantity', 'ef_asset', 'ef_country', 'ef_global']].drop_duplicates().head(1000)
     st.dataframe(
         df_table,
         use_container_width=True,
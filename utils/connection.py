@@ -0,0 +1,151 @@
+import glob
+import duckdb
+import streamlit as st
+from config import CONFIG
+from utils.utils import get_release_version
+
+
+# CONFIG path key -> name of the view registered on the shared database.
+# Query builders in utils/queries.py keep receiving these as their "*_path"
+# arguments; DuckDB resolves FROM 'asset_annual' against the catalog before
+# falling back to a file scan, so the generated SQL does not change.
+TABLES = {
+    'asset_emissions_country_subsector_path': 'asset_emissions_country_subsector',
+    'country_subsector_stats_path': 'country_subsector_stats',
+    'country_subsector_totals_path': 'country_subsector_totals',
+    'monthly_cube_path': 'monthly_cube',
+    'gadm_1_statistics_path': 'gadm_1_statistics',
+    'gadm_1_statistics_store_path': 'gadm_1_statistics_store',
+    'percentile_path': 'percentile',
+    'annual_asset_path': 'asset_annual',
+    'asset_induced_emissions_path': 'asset_induced_emissions',
+    'sector_reduction_rollup_path': 'sector_reduction_rollup',
+    'reduction_cube_path': 'reduction_cube',
+    'city_path': 'city',
+    'gadm_0_path': 'gadm_0',
+    'gadm_1_path': 'gadm_1',
+    'gadm_2_path': 'gadm_2',
+    'asset_ownership_path': 'asset_ownership',
+    'ownership_fact_path': 'ownership_fact',
+    'ownership_closure_path': 'ownership_closure',
+    'ownership_rollup_path': 'ownership_rollup',
+    'demographic_path': 'demographic',
+}
+
+# datasets written by utils.refresh.write_partitioned_dataset (sector=/subsector=
+# folders). DuckDB detects the layout on its own, but being explicit guarantees
+# the partition columns exist and filters on them prune whole folders.
+HIVE_PARTITIONED = {'annual_asset_path'}
+
+
+'''
+This opens the single in-memory DuckDB database shared by every session in
+the process and registers a view for each CONFIG path that has data on disk.
+The object cache keeps parquet footers in memory, so repeated scans of the
+same files skip glob expansion and metadata reads.
+
+Returns: database connection (do not close)
+Type: duckdb.DuckDBPyConnection
+'''
+@st.cache_resource(show_spinner=False)
+def get_database():
+
+    con = duckdb.connect()
+    con.execute("SET enable_object_cache = true")
+
+    for config_key, view_name in TABLES.items():
+        path = CONFIG[config_key]
+
+        # views bind at creation time, so skip datasets that aren't on disk yet
+        if not glob.glob(path, recursive=True):
+            print(f"⚠️ No files found for {config_key} ({path}), view '{view_name}' not registered", flush=True)
+            continue
+
+        if config_key in HIVE_PARTITIONED:
+            source = f"read_parquet('{path}', hive_partitioning = true)"
+        else:
+            source = f"'{path}'"
+
+        con.execute(f"CREATE OR REPLACE VIEW {view_name} AS SELECT * FROM {source}")
+
+    return con
+
+
+'''
+This lists the views registered on the shared database.
+
+Returns: view names
+Type: set
+'''
+@st.cache_resource(show_spinner=False)
+def registered_tables():
+
+    rows = get_database().cursor().execute(
+        "SELECT view_name FROM duckdb_views() WHERE NOT internal"
+    ).fetchall()
+
+    return {row[0] for row in rows}
+
+
+'''
+This hands out the DuckDB cursor for the current Streamlit session. Cursors
+share the process-wide database (and its views and caches) but keep their own
+transaction state, so sessions can query concurrently.
+
+Returns: session cursor (do not close)
+Type: duckdb.DuckDBPyConnection
+'''
+def get_connection():
+
+    cursor = st.session_state.get('duckdb_cursor')
+
+    if cursor is None:
+        cursor = get_database().cursor()
+        st.session_state['duckdb_cursor'] = cursor
+
+    return cursor
+
+
+'''
+This returns the name to put in a FROM clause for a CONFIG path: the
+registered view when one exists, otherwise the raw parquet glob.
+
+Returns: table reference
+Type: string
+'''
+def table_ref(config_key):
+
+    if has_table(config_key):
+        return TABLES[config_key]
+
+    return CONFIG[config_key]
+
+
+'''
+This reports whether the dataset behind a CONFIG path was found at startup,
+for callers that read a derived table when available and fall back to the
+source data otherwise.
+
+Returns: whether the view is registered
+Type: bool
+'''
+def has_table(config_key):
+
+    return TABLES[config_key] in registered_tables()
+
+
+'''
+This reads the Climate TRACE release of the loaded data once per process.
+The parquet files are baked into the deployed image, so the release cannot
+change underneath a running server.
+
+Returns: release version
+Type: string
+'''
+@st.cache_resource(show_spinner=False)
+def get_release():
+
+    try:
+        return get_release_version(get_database().cursor(), table_ref('asset_emissions_country_subsector_path'))
+    except duckdb.Error:
+        return 'unknown'
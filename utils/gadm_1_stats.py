@@ -0,0 +1,115 @@
+import glob
+import re
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+from config import CONFIG
+from utils.connection import get_database, get_release, has_table, table_ref
+
+
+'''
+This indexes the gadm_1 statistics once per data release: the gadm_id
+min/max of every parquet row group, read from the file footers, and the
+states of each country for the State/Province dropdown. The refresh writes
+the statistics sorted by gadm_id in small row groups, so a state lookup
+reads one or two row groups; without that store the source files are
+indexed the same way, just less selectively. Country-level rows (gadm_id is
+the iso3 code) are not listed as states, and state names that repeat within
+a country get their gadm_id appended.
+
+Returns: gadm_1 statistics index
+Type: dict
+'''
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_gadm_1_stats(release):
+
+    config_key = 'gadm_1_statistics_store_path' if has_table('gadm_1_statistics_store_path') else 'gadm_1_statistics_path'
+
+    row_groups = []
+    for path in sorted(glob.glob(CONFIG[config_key])):
+        metadata = pq.ParquetFile(path).metadata
+        gadm_id_column = metadata.schema.names.index('gadm_id')
+
+        for i in range(metadata.num_row_groups):
+            stats = metadata.row_group(i).column(gadm_id_column).statistics
+            if stats is not None and stats.has_min_max:
+                row_groups.append((stats.min, stats.max, path, metadata, i))
+            else:
+                row_groups.append((None, None, path, metadata, i))
+
+    columns = row_groups[0][3].schema.names if row_groups else []
+
+    con = get_database().cursor()
+
+    try:
+        states = con.execute(f"""
+            SELECT DISTINCT iso3_country, gadm_id, gadm_name
+            FROM '{table_ref(config_key)}'
+            WHERE gadm_id <> iso3_country
+            ORDER BY iso3_country, gadm_name, gadm_id
+        """).df()
+
+    finally:
+        con.close()
+
+    duplicated = states.duplicated(['iso3_country', 'gadm_name'], keep=False)
+    states['label'] = states['gadm_name'].where(~duplicated, states['gadm_name'] + ' (' + states['gadm_id'] + ')')
+
+    years = sorted(int(m.group(1)) for c in columns if (m := re.fullmatch(r'(\d{4})_total_emissions', c)))
+    emissions_columns = sorted((c for c in columns if c.startswith('emissions_quantity_')), reverse=True)
+
+    return {
+        'release': release,
+        'row_groups': row_groups,
+        'states': {iso3: dict(zip(rows['gadm_id'], rows['label'])) for iso3, rows in states.groupby('iso3_country')},
+        'latest_column': emissions_columns[0] if emissions_columns else None,
+        'prev_column': emissions_columns[1] if len(emissions_columns) > 1 else None,
+        'years': years,
+    }
+
+
+def get_gadm_1_stats():
+
+    return load_gadm_1_stats(get_release())
+
+
+'''
+This lists the states/provinces of a country with statistics.
+
+Returns: gadm_id -> dropdown label, in label order
+Type: dict
+'''
+def gadm_1_states(iso3_country):
+
+    return get_gadm_1_stats()['states'].get(iso3_country, {})
+
+
+'''
+This returns the statistics rows of one state (one per gas, or just gas),
+reading only the row groups whose gadm_id range covers it.
+
+Returns: statistics rows
+Type: pd.DataFrame
+'''
+def gadm_1_statistics(gadm_id, gas=None):
+
+    index = get_gadm_1_stats()
+
+    groups = {}
+    for low, high, path, metadata, i in index['row_groups']:
+        if low is None or low <= gadm_id <= high:
+            groups.setdefault(path, (metadata, []))[1].append(i)
+
+    frames = [
+        pq.ParquetFile(path, metadata=metadata).read_row_groups(row_group_ids).to_pandas()
+        for path, (metadata, row_group_ids) in groups.items()
+    ]
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    df = df[df['gadm_id'] == gadm_id]
+    if gas is not None:
+        df = df[df['gas'] == gas]
+
+    return df.drop(columns=[c for c in df.columns if c.startswith('Unnamed:')]).reset_index(drop=True)
@@ -0,0 +1,126 @@
+import streamlit as st
+from utils.connection import get_database, get_release, table_ref
+
+
+# columns map_region_condition can return, i.e. what the Region/Country
+# dropdowns filter the gadm and city tables on
+REGION_COLUMNS = [
+    'iso3_country',
+    'continent',
+    'eu',
+    'oecd',
+    'unfccc_annex',
+    'developed_un',
+    'em_finance',
+    'g20',
+]
+
+
+def _python_value(value):
+
+    # numpy scalars -> python, so np.True_ and True land on the same key
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _names_by(df, name_col, key_cols):
+
+    index = {}
+    df = df[df[name_col].notna()]
+
+    for key_col in key_cols:
+        for value, names in df.groupby(key_col)[name_col]:
+            index[(key_col, _python_value(value))] = sorted(names.unique())
+
+    return index
+
+
+'''
+This loads the geography dimensions behind the cascading dropdowns once per
+data release: the country name -> iso3 map, plus sorted gadm_1, gadm_2 and
+city names indexed by (column, value) for every region column and, for
+gadm_2, by parent gadm_1.
+
+Returns: geography index
+Type: dict
+'''
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_geography(release):
+
+    con = get_database().cursor()
+    regions = ", ".join(REGION_COLUMNS)
+
+    country_rows = con.execute(f"""
+        SELECT DISTINCT country_name, iso3_country
+        FROM '{table_ref('gadm_0_path')}'
+        WHERE country_name IS NOT NULL
+        ORDER BY country_name
+    """).fetchall()
+
+    df_gadm_1 = con.execute(f"""
+        SELECT DISTINCT gadm_1_name, gadm_1_corrected_name, {regions}
+        FROM '{table_ref('gadm_1_path')}'
+        WHERE gadm_1_name IS NOT NULL
+    """).df()
+
+    df_gadm_2 = con.execute(f"""
+        SELECT DISTINCT gadm_2_name, gadm_2_corrected_name, gadm_1_name, gadm_1_corrected_name, {regions}
+        FROM '{table_ref('gadm_2_path')}'
+        WHERE gadm_2_name IS NOT NULL
+    """).df()
+
+    df_city = con.execute(f"""
+        SELECT DISTINCT city_name, {regions}
+        FROM '{table_ref('city_path')}'
+        WHERE city_name IS NOT NULL
+    """).df()
+
+    return {
+        'release': release,
+        'country_map': {row[0]: row[1] for row in country_rows},
+        'gadm_1_name': _names_by(df_gadm_1, 'gadm_1_name', REGION_COLUMNS),
+        'gadm_1_corrected_name': _names_by(df_gadm_1, 'gadm_1_corrected_name', REGION_COLUMNS),
+        'gadm_2_name': _names_by(df_gadm_2, 'gadm_2_name', REGION_COLUMNS + ['gadm_1_name']),
+        'gadm_2_corrected_name': _names_by(df_gadm_2, 'gadm_2_corrected_name', ['gadm_1_corrected_name']),
+        'city_name': _names_by(df_city, 'city_name', REGION_COLUMNS),
+    }
+
+
+def get_geography():
+
+    return load_geography(get_release())
+
+
+'''
+This returns the country name -> iso3 map used by the Region/Country
+dropdowns, ordered by country name.
+
+Returns: country_map
+Type: dict
+'''
+def get_country_map():
+
+    return get_geography()['country_map']
+
+
+'''
+This looks up the names a dropdown should offer: name_col values (e.g.
+'gadm_1_name', 'city_name') where column equals value, or any of value when a
+list is passed. Stands in for SELECT DISTINCT name_col ... WHERE column IN
+(...) against the parquet files.
+
+Returns: sorted names
+Type: list
+'''
+def geography_names(name_col, column, value):
+
+    index = get_geography()[name_col]
+    values = value if isinstance(value, list) else [value]
+
+    if len(values) == 1:
+        return list(index.get((column, values[0]), []))
+
+    names = set()
+    for v in values:
+        names.update(index.get((column, v), []))
+
+    return sorted(names)
@@ -1,8 +1,6 @@
 import streamlit as st
 import base64
-import duckdb
-from config import CONFIG
-from utils.utils import get_release_version
+from utils.connection import get_release
 
 def render_static_header():
     def get_base64_logo():
@@ -10,9 +8,7 @@ def render_static_header():
             return base64.b64encode(f.read()).decode()
 
     logo_base64 = get_base64_logo()
-    con = duckdb.connect()
-    asset_path = CONFIG["asset_path"]
-    release_version = get_release_version(con,asset_path)
+    release_version = get_release()
 
     st.markdown(
         f"""
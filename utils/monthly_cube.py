@@ -0,0 +1,138 @@
+import pandas as pd
+import streamlit as st
+from utils.connection import get_database, get_release, has_table, table_ref
+from utils.queries import get_monthly_cube_sql
+
+
+'''
+This loads the Monthly Trends cube once per data release, sorted so each
+(region column, region value, gas) block is one contiguous slice, plus the
+latest month of the totals and the first month the totals charts show
+(January, three years before the latest month). Without the refresh output
+the cube is built from the country subsector data.
+
+Returns: monthly cube index
+Type: dict
+'''
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_monthly_cube(release):
+
+    con = get_database().cursor()
+
+    try:
+        if has_table('monthly_cube_path'):
+            sql = f"""
+                SELECT * FROM '{table_ref('monthly_cube_path')}'
+                ORDER BY region_column, region_value, gas, sector NULLS FIRST, subsector NULLS FIRST, month
+            """
+        else:
+            sql = get_monthly_cube_sql(table_ref('asset_emissions_country_subsector_path'), table_ref('country_subsector_totals_path'))
+
+        df = con.execute(sql).df()
+
+    finally:
+        con.close()
+
+    df['month'] = pd.to_datetime(df['month'])
+
+    blocks = {
+        key: (positions[0], positions[-1] + 1)
+        for key, positions in df.groupby(['region_column', 'region_value', 'gas'], sort=False).indices.items()
+    }
+
+    max_month = df.loc[(df['region_column'] == 'global') & (df['total_rows'] > 0), 'month'].max()
+
+    return {
+        'release': release,
+        'cube': df,
+        'blocks': blocks,
+        'max_month': max_month,
+        'start_month': pd.Timestamp(year=max_month.year - 3, month=1, day=1) if pd.notna(max_month) else max_month,
+    }
+
+
+def get_monthly_cube():
+
+    return load_monthly_cube(get_release())
+
+
+def _region_key(region_condition):
+
+    if not region_condition:
+        return ('global', 'Global')
+
+    value = region_condition['column_value']
+    if isinstance(value, bool):
+        value = str(value).lower()
+
+    return (region_condition['column_name'], value)
+
+
+'''
+This returns the cube rows for one region (from map_region_condition, None
+for Global) and gas, narrowed to sector and subsectors. With subsectors the
+subsector rows are returned; otherwise the sector rollup of sector, or of
+every sector when sector is None (by_sector) or the all-sector rollup.
+
+Returns: cube rows
+Type: pd.DataFrame
+'''
+def monthly_cube_rows(region_condition, gas, sector=None, subsectors=None, by_sector=False):
+
+    cube = get_monthly_cube()
+    start, stop = cube['blocks'].get((*_region_key(region_condition), gas), (0, 0))
+    rows = cube['cube'].iloc[start:stop]
+
+    if subsectors:
+        rows = rows[rows['subsector'].isin(subsectors)]
+        if sector:
+            rows = rows[rows['sector'] == sector]
+    elif sector:
+        rows = rows[(rows['sector'] == sector) & rows['subsector'].isna()]
+    elif by_sector:
+        rows = rows[rows['sector'].notna() & rows['subsector'].isna()]
+    else:
+        rows = rows[rows['sector'].isna()]
+
+    return rows
+
+
+'''
+This returns the monthly asset series (activity and emissions summed over
+the selected subsectors) for the Emissions Over Time chart.
+
+Returns: year_month, activity and emissions_quantity per month
+Type: pd.DataFrame
+'''
+def monthly_asset_series(region_condition, gas, sector=None, subsectors=None):
+
+    rows = monthly_cube_rows(region_condition, gas, sector, subsectors)
+    rows = rows[rows['asset_rows'] > 0]
+
+    series = rows.groupby('month')[['asset_activity', 'asset_emissions_quantity']].sum(min_count=1)
+
+    return series.reset_index().rename(columns={
+        'month': 'year_month',
+        'asset_activity': 'activity',
+        'asset_emissions_quantity': 'emissions_quantity',
+    })
+
+
+'''
+This returns monthly emissions by sector from the country subsector totals,
+from the cube's start month on, for the stacked bar and the cumulative
+charts.
+
+Returns: year_month, sector and emissions_quantity per month and sector
+Type: pd.DataFrame
+'''
+def monthly_sector_totals(region_condition, gas, sector=None, subsectors=None):
+
+    cube = get_monthly_cube()
+
+    rows = monthly_cube_rows(region_condition, gas, sector, subsectors, by_sector=True)
+    rows = rows[(rows['total_rows'] > 0) & (rows['month'] >= cube['start_month'])]
+
+    totals = rows.groupby(['month', 'sector'])[['emissions_quantity']].sum(min_count=1)
+
+    return totals.reset_index().rename(columns={'month': 'year_month'})
@@ -0,0 +1,94 @@
+import re
+import streamlit as st
+from utils.connection import get_connection, get_database, get_release, table_ref
+from utils.geography import REGION_COLUMNS
+from utils.queries import get_monthly_stats_base_sql, get_monthly_stats_by_country_sql
+from utils.query_cache import run_cached_query
+
+
+STATS_GASES = ['co2e_100yr', 'ch4']
+
+
+'''
+This copies the columns of the country-subsector statistics that Monthly
+Trends uses into a table on the shared database, once per data release, so
+every dropdown change aggregates a small in-memory table instead of
+rereading the statistics file. The latest and previous month columns are
+the two newest emissions_quantity_YYYYMM columns.
+
+Returns: table name, latest/previous month columns and the sectors
+Type: dict
+'''
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_monthly_stats(release):
+
+    con = get_database().cursor()
+    source = table_ref('country_subsector_stats_path')
+    table = 'monthly_stats_' + re.sub(r'\W', '_', release)
+
+    try:
+        columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM '{source}'").fetchall()]
+        emissions_columns = sorted((c for c in columns if c.startswith('emissions_quantity_')), reverse=True)
+        latest_column, prev_column = emissions_columns[:2]
+
+        con.execute(f"""
+            CREATE OR REPLACE TABLE {table} AS
+            {get_monthly_stats_base_sql(source, [c for c in REGION_COLUMNS if c in columns], latest_column,
+                                        prev_column, STATS_GASES, 'emissions_slope_36_months_t_per_month' in columns)}
+        """)
+
+        sectors = [row[0] for row in con.execute(f"""
+            SELECT DISTINCT sector FROM {table} WHERE sector IS NOT NULL ORDER BY sector
+        """).fetchall()]
+
+    finally:
+        con.close()
+
+    return {
+        'table': table,
+        'latest_column': latest_column,
+        'prev_column': prev_column,
+        'sectors': sectors,
+    }
+
+
+def get_monthly_stats():
+
+    return load_monthly_stats(get_release())
+
+
+'''
+This lists the subsectors with statistics for gas, within sector if given.
+
+Returns: sorted subsectors
+Type: list
+'''
+def monthly_stats_subsectors(gas, sector=None):
+
+    stats = get_monthly_stats()
+    sector_filter = f"AND sector = '{sector}'" if sector else ""
+
+    df = run_cached_query(get_connection(), f"""
+        SELECT DISTINCT subsector
+        FROM {stats['table']}
+        WHERE gas = '{gas}' {sector_filter} AND subsector IS NOT NULL
+        ORDER BY subsector
+    """)
+
+    return df['subsector'].tolist()
+
+
+'''
+This returns the Monthly Trends country table for the selection, aggregated
+in DuckDB (see get_monthly_stats_by_country_sql).
+
+Returns: one row per country
+Type: pd.DataFrame
+'''
+def monthly_stats_by_country(gas, sector=None, subsectors=None, region_condition=None):
+
+    stats = get_monthly_stats()
+    sql = get_monthly_stats_by_country_sql(stats['table'], stats['latest_column'], stats['prev_column'],
+                                           gas, sector, subsectors, region_condition)
+
+    return run_cached_query(get_connection(), sql)
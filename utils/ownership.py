@@ -0,0 +1,194 @@
+import numpy as np
+import streamlit as st
+from utils.connection import get_database, get_release, has_table, table_ref
+from utils.queries import (
+    OWNER_TYPE_COLUMNS,
+    get_ownership_assets_sql,
+    get_ownership_closure_sql,
+    get_ownership_fact_sql,
+    get_ownership_rollup_sql,
+)
+
+
+def _owner_spans(df, owner_col):
+
+    # rows are sorted by owner, so each owner's rows are one contiguous slice
+    owners, starts, counts = np.unique(df[owner_col].to_numpy(), return_index=True, return_counts=True)
+
+    return {owner: (start, start + count) for owner, start, count in zip(owners, starts, counts)}
+
+
+def _split_by_type(df, type_col, owner_col):
+
+    tables = {}
+
+    for owner_type in OWNER_TYPE_COLUMNS:
+        rows = df[df[type_col] == owner_type].drop(columns=type_col).reset_index(drop=True)
+        tables[owner_type] = {'rows': rows, 'spans': _owner_spans(rows, owner_col)}
+
+    return tables
+
+
+def _distinct_assets(rows):
+
+    # an asset has one country and subsector, so counting after the dedupe counts distinct assets
+    assets = rows.drop_duplicates('asset_id')
+
+    return {
+        'assets': len(assets),
+        'emissions_quantity': assets['emissions_quantity'].sum(),
+        'by_subsector': assets.groupby(['sector', 'subsector']).size(),
+        'by_country': assets.groupby('iso3_country').size(),
+    }
+
+
+'''
+This loads the ownership rollup, closure and owner assets tables once per
+data release, split by owner type, with the row span of every owner so
+lookups slice instead of filtering, and the distinct asset totals of every
+owner type. Without the refresh output the tables are built from the
+ownership fact SQL over the source data.
+
+Returns: ownership index
+Type: dict
+'''
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_ownership(release):
+
+    con = get_database().cursor()
+
+    try:
+        if has_table('ownership_fact_path'):
+            fact_source = table_ref('ownership_fact_path')
+        else:
+            con.execute(f"""
+                CREATE TEMP TABLE ownership_fact_source AS
+                {get_ownership_fact_sql(table_ref('annual_asset_path'), table_ref('asset_ownership_path'), table_ref('gadm_0_path'))}
+            """)
+            fact_source = 'ownership_fact_source'
+
+        if has_table('ownership_rollup_path') and has_table('ownership_closure_path'):
+            rollup_source = table_ref('ownership_rollup_path')
+            closure_source = table_ref('ownership_closure_path')
+            df_rollup = con.execute(f"SELECT * FROM '{rollup_source}' ORDER BY owner_type, owner").df()
+            df_closure = con.execute(f"SELECT * FROM '{closure_source}' ORDER BY ancestor_type, ancestor, depth, descendant").df()
+
+        else:
+            df_rollup = con.execute(get_ownership_rollup_sql(fact_source)).df()
+            df_closure = con.execute(get_ownership_closure_sql(fact_source)).df()
+
+        df_assets = con.execute(get_ownership_assets_sql(fact_source)).df()
+
+    finally:
+        con.close()
+
+    assets = _split_by_type(df_assets, 'owner_type', 'owner')
+    for table in assets.values():
+        table['totals'] = _distinct_assets(table['rows'])
+
+    return {
+        'release': release,
+        'rollup': _split_by_type(df_rollup, 'owner_type', 'owner'),
+        'closure': _split_by_type(df_closure, 'ancestor_type', 'ancestor'),
+        'assets': assets,
+    }
+
+
+def get_ownership():
+
+    return load_ownership(get_release())
+
+
+def _owner_rows(table, owners):
+
+    rows = table['rows']
+
+    if not owners:
+        return rows
+
+    spans = [table['spans'][owner] for owner in dict.fromkeys(owners) if owner in table['spans']]
+    if not spans:
+        return rows.iloc[0:0]
+
+    positions = np.concatenate([np.arange(start, stop) for start, stop in spans])
+
+    return rows.iloc[positions]
+
+
+'''
+This lists the countries with assets held by any of owners (every owner of
+owner_type when owners is empty).
+
+Returns: sorted iso3 codes
+Type: list
+'''
+def owner_countries(owner_type, owners=None):
+
+    rows = _owner_rows(get_ownership()['rollup'][owner_type], owners)
+
+    return sorted(rows['iso3_country'].dropna().unique())
+
+
+'''
+This rolls up the selected owners of one owner type (all of them when owners
+is empty), optionally limited to countries. Emissions and activity are
+weighted by ownership share, so an asset held by two selected owners counts
+once for each, at each one's share. Asset counts and
+asset_emissions_quantity (the unweighted total) count every asset once,
+however many selected owners hold it.
+
+Returns: totals plus by_subsector and by_country frames
+Type: dict
+'''
+def owner_rollup(owner_type, owners=None, countries=None):
+
+    index = get_ownership()
+    rows = _owner_rows(index['rollup'][owner_type], owners)
+
+    if not owners and countries is None:
+        assets = index['assets'][owner_type]['totals']
+    else:
+        asset_rows = _owner_rows(index['assets'][owner_type], owners)
+        if countries is not None:
+            rows = rows[rows['iso3_country'].isin(countries)]
+            asset_rows = asset_rows[asset_rows['iso3_country'].isin(countries)]
+        assets = _distinct_assets(asset_rows)
+
+    measures = ['emissions_quantity', 'share_emissions_quantity', 'share_activity']
+
+    by_subsector = rows.groupby(['sector', 'subsector'], as_index=False)[measures].sum()
+    by_subsector.insert(2, 'asset_count', assets['by_subsector'].reindex(
+        by_subsector.set_index(['sector', 'subsector']).index, fill_value=0
+    ).to_numpy())
+
+    by_country = rows.groupby('iso3_country', as_index=False)[measures].sum()
+    by_country.insert(1, 'asset_count', by_country['iso3_country'].map(assets['by_country']).fillna(0).astype(int))
+
+    return {
+        'emissions_quantity': rows['share_emissions_quantity'].sum(),
+        'asset_emissions_quantity': assets['emissions_quantity'],
+        'activity': rows['share_activity'].sum(),
+        'assets': assets['assets'],
+        'subsectors': rows['subsector'].nunique(),
+        'by_subsector': by_subsector,
+        'by_country': by_country,
+    }
+
+
+'''
+This returns the owners below the selected owners in the ownership chain,
+per owner type (e.g. the immediate source owners and source operators
+under a parent).
+
+Returns: owner type -> sorted owners
+Type: dict
+'''
+def owner_descendants(owner_type, owners):
+
+    rows = _owner_rows(get_ownership()['closure'][owner_type], owners)
+    rows = rows[rows['depth'] > 0]
+
+    return {
+        descendant_type: sorted(descendants.unique())
+        for descendant_type, descendants in rows.groupby('descendant_type')['descendant']
+    }
@@ -35,7 +35,8 @@ def build_country_sql(table, where_sql):
 '''
 This builds SQL for the stacked bar chart Reduction Opportunities tab. This will
 dynamically pull in the correct data depending on the selected reduction method,
-which could be "Climate TRACE Solutions" or "Percentile Benchmarking"
+which could be "Climate TRACE Solutions" or "Percentile Benchmarking". Climate
+TRACE Solutions also needs induced_emissions_path (asset_induced_emissions).
 
 Returns: sector_reduction_sql_string
 
@@ -48,81 +49,28 @@ def build_sector_reduction_sql(use_ct_ers,
                                 percentile_path=None,
                                 percentile_col=None,
                                 selected_proportion=None,
-                                benchmark_join=None
+                                benchmark_join=None,
+                                induced_emissions_path=None
                             ):
     
     if use_ct_ers is True:
         sector_reduction_sql_string = f'''
-            WITH sector_mapping as (
-                SELECT distinct sector
-                    , subsector
-
-                FROM '{annual_asset_path}'
-            ),
-            
-            induced as (
+            WITH induced as (
                 SELECT sector
-                    , sum(induced_emissions) as induced_emissions
+                    , sum(induced_emissions) AS induced_emissions
 
                 FROM (
-                        SELECT
-                            sector,
-                            sum(induced_emissions) AS induced_emissions
-                        FROM (
-                            SELECT distinct asset_id
-                                , sector_mapping.sector
-                                , induced_sector_1 AS induced_subsector
-                                , induced_sector_1_induced_emissions AS induced_emissions
-                            FROM '{annual_asset_path}' ae
-                            INNER JOIN sector_mapping
-                                on sector_mapping.subsector = ae.induced_sector_1
-                            {dropdown_join}
-
-                            {reduction_where_sql}
-                        )  
-
-                        group by sector
-                        
-                        UNION ALL
-                            
-                        SELECT
-                            sector,
-                            sum(induced_emissions) AS induced_emissions
-                        FROM (
-                            SELECT distinct asset_id
-                                , sector_mapping.sector
-                                , induced_sector_2 AS induced_subsector
-                                , induced_sector_2_induced_emissions AS induced_emissions
-                            FROM '{annual_asset_path}' ae
-                            INNER JOIN sector_mapping
-                                on sector_mapping.subsector = ae.induced_sector_2
-                            {dropdown_join}
-
-                            {reduction_where_sql}
-                        )  
-
-                        group by sector
-                            
-                        UNION ALL
-                            
-                        SELECT
-                            sector,
-                            sum(induced_emissions) AS induced_emissions
-                        FROM (
-                            SELECT distinct asset_id
-                                , sector_mapping.sector
-                                , induced_sector_3 AS induced_subsector
-                                , induced_sector_3_induced_emissions AS induced_emissions
-                            FROM '{annual_asset_path}' ae
-                            INNER JOIN sector_mapping
-                                on sector_mapping.subsector = cast(ae.induced_sector_3 as varchar)
-                            {dropdown_join}
-
-                            {reduction_where_sql}
-                        )  
-
-                        group by sector
-                    )
+                    SELECT DISTINCT ae.asset_id
+                        , ae.receiving_sector AS sector
+                        , ae.receiving_subsector
+                        , ae.induced_slot
+                        , ae.induced_emissions
+
+                    FROM '{induced_emissions_path}' ae
+                    {dropdown_join}
+
+                    {reduction_where_sql}
+                ) induced_asset
 
                 GROUP BY sector
             ),
@@ -272,81 +220,194 @@ def build_sector_reduction_sql(use_ct_ers,
     return sector_reduction_sql_string
 
 
-def build_sector_induction_sql(annual_asset_path,
+'''
+This builds SQL for the consequential reduction breakdown on the Reduction
+Opportunities tab: emissions each inducing sector adds to (or avoids in) each
+receiving sector, counting each asset's largest induction once.
+
+Returns: sector_induction_sql_string
+
+Type: string (SQL)
+'''
+def build_sector_induction_sql(induced_emissions_path,
                                 dropdown_join,
                                 reduction_where_sql
                             ):
 
     sector_induction_sql_string = f'''
-        WITH sector_mapping AS (
-            SELECT DISTINCT sector, subsector
-            FROM '{annual_asset_path}'
-        ),
-
-        induced_raw AS (
+        WITH induced_annual_per_asset AS (
             SELECT
                 ae.asset_id,
-                ae.sector AS inducing_sector,
-                sm.sector  AS receiving_sector,
-                ae.induced_sector_1_induced_emissions AS induced_emissions
-            FROM '{annual_asset_path}' ae
-            INNER JOIN sector_mapping sm 
-                ON sm.subsector = ae.induced_sector_1
+                ae.inducing_sector,
+                ae.receiving_sector,
+                MAX(ae.induced_emissions) AS induced_emissions_annual
+            
+            FROM '{induced_emissions_path}' ae
             {dropdown_join}
 
             {reduction_where_sql}
-
-            UNION ALL
             
-            SELECT
-                ae.asset_id,
-                ae.sector,
-                sm.sector,
-                ae.induced_sector_2_induced_emissions
-            FROM '{annual_asset_path}' ae
-            INNER JOIN sector_mapping sm 
-                ON sm.subsector = ae.induced_sector_2
-            {dropdown_join}
+            GROUP BY ae.asset_id
+                , ae.inducing_sector
+                , ae.receiving_sector
+        )
 
-            {reduction_where_sql}
+        SELECT
+            receiving_sector,
+            inducing_sector,        
+            SUM(induced_emissions_annual) AS induced_emissions
+        
+        FROM induced_annual_per_asset
+        
+        GROUP BY inducing_sector, 
+            receiving_sector
 
-            UNION ALL
+        ORDER BY receiving_sector
+    '''
+
+    return sector_induction_sql_string
+
+
+def append_where(where_sql, condition):
+
+    if where_sql:
+        return f"{where_sql} AND {condition}"
+
+    return f"WHERE {condition}"
+
+
+'''
+This builds the Climate TRACE Solutions stacked bar SQL against the sector
+reduction rollup written during the data refresh instead of the asset table.
+Output columns match build_sector_reduction_sql(use_ct_ers=True). The rollup
+carries the same filter columns as the asset table (alias ae) except that the
+city dropdown joins on ae.city_id rather than ae.ghs_fua. An asset can have
+rows in several grain cells, so each asset is counted once after filtering,
+as in the asset-level query.
+
+Returns: sector_reduction_sql_string
+
+Type: string (SQL)
+'''
+def build_sector_reduction_from_rollup_sql(rollup_path,
+                                            dropdown_join,
+                                            reduction_where_sql
+                                        ):
+
+    sector_reduction_sql_string = f'''
+        WITH induced AS (
+            SELECT sector
+                , sum(induced_emissions) AS induced_emissions
+
+            FROM (
+                SELECT DISTINCT ae.asset_id
+                    , ae.receiving_sector AS sector
+                    , ae.receiving_subsector
+                    , ae.induced_slot
+                    , ae.induced_emissions
+
+                FROM '{rollup_path}' ae
+                {dropdown_join}
+
+                {append_where(reduction_where_sql, "ae.receiving_sector IS NOT NULL")}
+            ) induced_asset
+
+            GROUP BY sector
+        ),
+
+        asset_reductions AS (
+            SELECT sector
+                , sum(emissions_quantity) emissions_quantity
+                , sum(emissions_reduced_at_asset) emissions_reduced_at_asset
+
+            FROM (
+                SELECT ae.asset_id
+                    , ae.sector
+                    , ae.subsector
+                    , sum(ae.emissions_quantity) emissions_quantity
+                    , ae.emissions_reduced_at_asset
+
+                FROM '{rollup_path}' ae
+                {dropdown_join}
+
+                {append_where(reduction_where_sql, "ae.receiving_sector IS NULL")}
+
+                GROUP BY ae.asset_id
+                    , ae.sector
+                    , ae.subsector
+                    , ae.emissions_reduced_at_asset
+            ) asset
+
+            GROUP BY sector
+        )
+
+        SELECT 
+            COALESCE(ar.sector, induced.sector) AS sector,
+            ar.emissions_quantity,
+            induced.induced_emissions,
+            ar.emissions_reduced_at_asset,
+            
+            CASE 
+                WHEN COALESCE(induced.induced_emissions, 0) > COALESCE(ar.emissions_reduced_at_asset, 0)
+                THEN COALESCE(induced.induced_emissions, 0) - COALESCE(ar.emissions_reduced_at_asset, 0)
+                ELSE 0 
+            END AS induced_emissions,
             
+            CASE 
+                WHEN COALESCE(induced.induced_emissions, 0) < COALESCE(ar.emissions_reduced_at_asset, 0)
+                THEN COALESCE(ar.emissions_reduced_at_asset, 0) - COALESCE(induced.induced_emissions, 0)
+                ELSE 0 
+            END AS emissions_reduction_potential
+
+        FROM asset_reductions ar
+        FULL OUTER JOIN induced
+            on induced.sector = ar.sector
+    '''
+
+    return sector_reduction_sql_string
+
+
+'''
+This builds the consequential reduction breakdown SQL against the sector
+reduction rollup. Output columns match build_sector_induction_sql; each
+asset's largest induction into a receiving sector counts once after
+filtering.
+
+Returns: sector_induction_sql_string
+
+Type: string (SQL)
+'''
+def build_sector_induction_from_rollup_sql(rollup_path,
+                                            dropdown_join,
+                                            reduction_where_sql
+                                        ):
+
+    sector_induction_sql_string = f'''
+        WITH induced_annual_per_asset AS (
             SELECT
                 ae.asset_id,
-                ae.sector,
-                sm.sector,
-                ae.induced_sector_3_induced_emissions 
-            FROM '{annual_asset_path}' ae
-            INNER JOIN sector_mapping sm 
-                ON sm.subsector = CAST(ae.induced_sector_3 AS VARCHAR)
+                ae.sector AS inducing_sector,
+                ae.receiving_sector,
+                MAX(ae.induced_emissions) AS induced_emissions_annual
+
+            FROM '{rollup_path}' ae
             {dropdown_join}
 
-            {reduction_where_sql}
-        ),
+            {append_where(reduction_where_sql, "ae.receiving_sector IS NOT NULL")}
 
-        induced_annual_per_asset AS (
-            SELECT
-                asset_id,
-                inducing_sector,
-                receiving_sector,
-                MAX(induced_emissions) AS induced_emissions_annual
-            
-            FROM induced_raw
-            
-            GROUP BY asset_id
-                , inducing_sector
-                , receiving_sector
+            GROUP BY ae.asset_id
+                , ae.sector
+                , ae.receiving_sector
         )
 
         SELECT
             receiving_sector,
-            inducing_sector,        
+            inducing_sector,
             SUM(induced_emissions_annual) AS induced_emissions
-        
+
         FROM induced_annual_per_asset
-        
-        GROUP BY inducing_sector, 
+
+        GROUP BY inducing_sector,
             receiving_sector
 
         ORDER BY receiving_sector
@@ -1059,176 +1120,105 @@ def create_table_assets_sql(annual_asset_path, gadm_0_path, gadm_1_path, gadm_2_
 
 
 
-def create_heatmap_sql(country_selected_bool,
-                       state_selected_bool,
-                       g20_bool,
-                       region_condition,
-                       selected_state_province,
-                       annual_asset_path,
-                       gadm_1_path=None,
-                       gadm_2_path=None):
-    
-    # agriculture
-    # buildings
-    # fluorinated-gases
-    # fossil-fuel-operations
-    # manufacturing
-    # mineral-extraction
-    # power
-    # transportation
-    # waste
-    # forestry-and-land-use
-
-    if state_selected_bool:
-        iso3_country = region_condition['column_value']
-
-        sector_total_join = f'''
-            INNER JOIN (
-                SELECT distinct gadm_2_id gadm_id
-
-                FROM '{gadm_2_path}'
-
-                where iso3_country = '{iso3_country}'
-                    and gadm_1_corrected_name = '{selected_state_province}'
-            ) gadm_2
-                on a.gadm_2 = gadm_2.gadm_id
-        '''
-
-        table_join = f'''
-            INNER JOIN (
-                SELECT distinct gadm_2_id gadm_id
-                    , gadm_2_corrected_name gadm_2_name
-
-                FROM '{gadm_2_path}'
-
-                where iso3_country = '{iso3_country}'
-                    and gadm_1_corrected_name = '{selected_state_province}'
-            ) gadm_2
-                on a.gadm_2 = gadm_2.gadm_id
-        '''
-
-        field = 'gadm_2.gadm_2_name '
-    
-    elif country_selected_bool:
-        iso3_country = region_condition['column_value']
-
-        sector_total_join = f'''
-            INNER JOIN (
-                SELECT distinct gadm_id
-
-                FROM '{gadm_1_path}'
-
-                where iso3_country = '{iso3_country}'
-            ) gadm_1
-                on a.gadm_1 = gadm_1.gadm_id
-        '''
-
-        table_join = f'''
-            INNER JOIN (
-                SELECT distinct gadm_id
-                    , gadm_1_corrected_name gadm_1_name
-
-                FROM '{gadm_1_path}'
-
-                where iso3_country = '{iso3_country}'
-            ) gadm_1
-                on a.gadm_1 = gadm_1.gadm_id
-        '''
-
-        field = 'gadm_1.gadm_1_name '
-
-    elif g20_bool:
-        sector_total_join = f'''
-            WHERE a.g20 = true
-        '''
-
-        table_join = f'''
-            WHERE a.g20 = true
-        '''
-
-        field = "country_name "
-    
-    else:
-        sector_total_join = ""
-        table_join = ""
-        field = "country_name "
-
-
-    sector_summary = f'''
-        select cast('Total' as string) as Region
-            , sum(case when a.sector = 'agriculture' then a.total_emissions_reduced_per_year else 0 end) as agriculture
-            , sum(case when a.sector = 'buildings' then a.total_emissions_reduced_per_year else 0 end) as buildings
-            , sum(case when a.sector = 'fluorinated-gases' then a.total_emissions_reduced_per_year else 0 end) as fluorinated_gases
-            , sum(case when a.sector = 'fossil-fuel-operations' then a.total_emissions_reduced_per_year else 0 end) as fossil_fuel_operations
-            , sum(case when a.sector = 'manufacturing' then a.total_emissions_reduced_per_year else 0 end) as manufacturing
-            , sum(case when a.sector = 'mineral-extraction' then a.total_emissions_reduced_per_year else 0 end) as mineral_extraction
-            , sum(case when a.sector = 'power' then a.total_emissions_reduced_per_year else 0 end) as power
-            , sum(case when a.sector = 'transportation' then a.total_emissions_reduced_per_year else 0 end) as transportation
-            , sum(case when a.sector = 'waste' then a.total_emissions_reduced_per_year else 0 end) as waste
-            , sum(case when a.sector <> 'forestry-and-land-use' then a.total_emissions_reduced_per_year else 0 end) as total_exc_forestry
-            , sum(case when a.sector = 'forestry-and-land-use' then a.total_emissions_reduced_per_year else 0 end) forestry_and_land_use
-            , sum(a.total_emissions_reduced_per_year) total_reduction_potential
-            , count(distinct a.asset_id) asset_count
-
-        from (
-            select distinct a.asset_id
-                , a.gadm_1
-                , a.gadm_2
-                , a.sector
-                , a.total_emissions_reduced_per_year
-                , a.most_granular
-            
-            from '{annual_asset_path}' a
-            {sector_total_join}
-        ) a
-
-        where most_granular is true
-        
-    '''
+'''
+This builds SQL for the reduction cube behind the Heat Map: reduction
+potential and asset count of the most granular assets, at (geography level,
+geography, sector) grain. Levels are 'country' (with the g20 flag), 'gadm_1'
+and 'gadm_2', using the corrected GADM names; gadm_2 rows also carry their
+state name. Every heat map table is a slice of this pivoted by sector.
+
+Returns: reduction cube SQL
+Type: str
+'''
+def get_reduction_cube_sql(annual_asset_path, gadm_1_path, gadm_2_path):
 
-    table_summary = f'''
-        select {field} as Region
-            , sum(case when sector = 'agriculture' then total_emissions_reduced_per_year else 0 end) as agriculture
-            , sum(case when sector = 'buildings' then total_emissions_reduced_per_year else 0 end) as buildings
-            , sum(case when sector = 'fluorinated-gases' then total_emissions_reduced_per_year else 0 end) as fluorinated_gases
-            , sum(case when sector = 'fossil-fuel-operations' then total_emissions_reduced_per_year else 0 end) as fossil_fuel_operations
-            , sum(case when sector = 'manufacturing' then total_emissions_reduced_per_year else 0 end) as manufacturing
-            , sum(case when sector = 'mineral-extraction' then total_emissions_reduced_per_year else 0 end) as mineral_extraction
-            , sum(case when sector = 'power' then total_emissions_reduced_per_year else 0 end) as power
-            , sum(case when sector = 'transportation' then total_emissions_reduced_per_year else 0 end) as transportation
-            , sum(case when sector = 'waste' then total_emissions_reduced_per_year else 0 end) as waste
-            , sum(case when sector <> 'forestry-and-land-use' then total_emissions_reduced_per_year else 0 end) as total_exc_forestry
-            , sum(case when sector = 'forestry-and-land-use' then total_emissions_reduced_per_year else 0 end) forestry_and_land_use
-            , sum(total_emissions_reduced_per_year) total_reduction_potential
-            , count(distinct asset_id) asset_count
-
-        from (
-            select distinct asset_id
+    reduction_cube_sql = f'''
+        WITH assets AS (
+            SELECT DISTINCT asset_id
+                , iso3_country
+                , country_name
+                , g20
                 , gadm_1
                 , gadm_2
-                , g20
                 , sector
-                , country_name
                 , total_emissions_reduced_per_year
-            
-            from '{annual_asset_path}'
 
-            where most_granular is true
-        ) a
+            FROM '{annual_asset_path}'
 
-        {table_join}
+            WHERE most_granular IS TRUE
+        ),
 
-        group by {field}
+        states AS (
+            SELECT DISTINCT gadm_id
+                , gadm_1_corrected_name
+                , iso3_country
 
-        order by total_reduction_potential desc
-        '''
+            FROM '{gadm_1_path}'
+        ),
+
+        counties AS (
+            SELECT DISTINCT gadm_2_id
+                , gadm_2_corrected_name
+                , gadm_1_corrected_name
+                , iso3_country
 
-    heatmap_sql = {
-        "sector_summary": sector_summary,
-        "table_summary": table_summary
-    }
+            FROM '{gadm_2_path}'
+        )
+
+        SELECT 'country' AS geography_level
+            , a.iso3_country
+            , CAST(NULL AS VARCHAR) AS gadm_1_name
+            , a.iso3_country AS geography_id
+            , a.country_name AS geography_name
+            , a.g20
+            , a.sector
+            , SUM(a.total_emissions_reduced_per_year) AS total_emissions_reduced_per_year
+            , COUNT(DISTINCT a.asset_id) AS asset_count
+
+        FROM assets a
+
+        GROUP BY ALL
+
+        UNION ALL
+
+        SELECT 'gadm_1' AS geography_level
+            , g.iso3_country
+            , CAST(NULL AS VARCHAR) AS gadm_1_name
+            , g.gadm_id AS geography_id
+            , g.gadm_1_corrected_name AS geography_name
+            , CAST(NULL AS BOOLEAN) AS g20
+            , a.sector
+            , SUM(a.total_emissions_reduced_per_year) AS total_emissions_reduced_per_year
+            , COUNT(DISTINCT a.asset_id) AS asset_count
+
+        FROM assets a
+        INNER JOIN states g
+            ON a.gadm_1 = g.gadm_id
+
+        GROUP BY ALL
+
+        UNION ALL
+
+        SELECT 'gadm_2' AS geography_level
+            , g.iso3_country
+            , g.gadm_1_corrected_name AS gadm_1_name
+            , g.gadm_2_id AS geography_id
+            , g.gadm_2_corrected_name AS geography_name
+            , CAST(NULL AS BOOLEAN) AS g20
+            , a.sector
+            , SUM(a.total_emissions_reduced_per_year) AS total_emissions_reduced_per_year
+            , COUNT(DISTINCT a.asset_id) AS asset_count
+
+        FROM assets a
+        INNER JOIN counties g
+            ON a.gadm_2 = g.gadm_2_id
+
+        GROUP BY ALL
+
+        ORDER BY geography_level, iso3_country, gadm_1_name, geography_id, sector
+    '''
 
-    return heatmap_sql
+    return reduction_cube_sql
 
 '''
 This is ad-hoc for Ting to download subsector reductions by country by given percentile
@@ -1381,84 +1371,579 @@ def build_subsector_reduction_percentile_download(
     
     return subsector_reduction_sql_string
 
-def get_ownership_sql(annual_asset_path, ownership_path):
-    query_ownership_sql = f'''
+# owner type shown in the Ownership page dropdown -> ownership fact column
+OWNER_TYPE_COLUMNS = {
+    'parent': 'parent',
+    'immediate source': 'immediate_source',
+    'source operator': 'source_operator',
+}
+
+
+'''
+This builds SQL for the ownership fact table written during the data refresh:
+one row per asset and ownership record with 2024 asset emissions, the owner
+keys the Ownership page searches by, and asset, country and global emissions
+factors. Names are cleaned after grouping on the raw ownership columns, so a
+row here is a row the page used to build in pandas. Country and global
+factors come from gadm_0 (2024, co2e_100yr), with factors of zero treated as
+missing. Rows are sorted by emissions, largest first.
+
+Returns: ownership_fact_sql
+
+Type: string (SQL)
+'''
+def get_ownership_fact_sql(annual_asset_path, ownership_path, gadm_0_path):
+
+    ownership_fact_sql = f'''
+    WITH asset_owners AS (
+        SELECT
+            ao.asset_id,
+            ae.asset_name,
+            ae.asset_type,
+            ae.sector,
+            ae.subsector,
+            ae.iso3_country,
+            ao.parent_name,
+            ao.parent_entity_id,
+            ao.parent_entity_type,
+            ao.parent_lei,
+            ao.immediate_source_owner,
+            ao.immediate_source_owner_entity_id,
+            ao.source_operator,
+            ao.source_operator_id,
+            ao.overall_share_percent,
+            SUM(ae.emissions_quantity) AS emissions_quantity,
+            CAST(SUM(ae.activity) AS DOUBLE) AS activity,
+            ae.activity_units
+        FROM '{ownership_path}' ao
+        LEFT JOIN '{annual_asset_path}' ae
+            ON ao.asset_id = ae.asset_id
+        WHERE
+            ae.year = 2024
+            AND ae.reduction_q_type = 'asset'
+        GROUP BY
+            ao.asset_id,
+            ae.asset_name,
+            ae.asset_type,
+            ae.sector,
+            ae.subsector,
+            ae.lat_lon,
+            ae.iso3_country,
+            ae.gadm_1,
+            ae.gadm_2,
+            ao.parent_name,
+            ao.parent_entity_id,
+            ao.parent_entity_type,
+            ao.parent_lei,
+            ao.parent_registration_country,
+            ao.parent_headquarter_country,
+            ao.immediate_source_owner,
+            ao.immediate_source_owner_entity_id,
+            ao.source_operator,
+            ao.source_operator_id,
+            ao.overall_share_percent,
+            ae.activity_units
+    ),
+
+    cleaned AS (
+        SELECT *
+            REPLACE (
+                coalesce(parent_entity_id, '') AS parent_entity_id,
+                coalesce(nullif(regexp_replace(parent_name, '^\\s+|\\s+$', '', 'g'), 'unknown'), '') AS parent_name,
+                CASE
+                    WHEN (parent_lei = 'not applicable' AND parent_entity_type = 'unknown entity')
+                        OR parent_lei = 'not found' THEN ''
+                    ELSE parent_lei
+                END AS parent_lei,
+                coalesce(nullif(immediate_source_owner, 'unknown'), '') AS immediate_source_owner
+            )
+        FROM asset_owners
+    ),
+
+    -- || returns NULL if any part is NULL, so missing IDs, names and LEIs
+    -- are blanked first and every row gets a key (or an 'Unknown ...' label)
+    keyed AS (
+        SELECT *,
+            CASE
+                WHEN coalesce(parent_lei, '') <> '' THEN parent_entity_id || ': ' || parent_name || ' (' || parent_lei || ')'
+                ELSE parent_entity_id || ': ' || parent_name
+            END AS parent_key,
+            coalesce(immediate_source_owner_entity_id, '') || ': ' || immediate_source_owner AS immediate_source_key,
+            coalesce(source_operator_id, '') || ': ' || coalesce(source_operator, '') AS source_operator_key
+        FROM cleaned
+    ),
+
+    gadm_emissions AS (
+        SELECT
+            iso3_country,
+            subsector,
+            SUM(asset_activity) AS activity,
+            SUM(asset_emissions) AS emissions_quantity
+        FROM '{gadm_0_path}'
+        WHERE
+            year = 2024
+            AND gas = 'co2e_100yr'
+        GROUP BY
+            iso3_country,
+            subsector
+        HAVING SUM(asset_activity) IS NOT NULL
+            AND SUM(asset_emissions) IS NOT NULL
+    ),
+
+    country_ef AS (
+        SELECT iso3_country,
+            subsector,
+            CASE WHEN activity != 0 THEN emissions_quantity / activity END AS ef_country
+        FROM gadm_emissions
+    ),
+
+    global_ef AS (
+        SELECT subsector,
+            CASE WHEN SUM(activity) != 0 THEN SUM(emissions_quantity) / SUM(activity) END AS ef_global
+        FROM gadm_emissions
+        GROUP BY subsector
+    )
+
     SELECT
-        ao.asset_id,
-        ae.asset_name,
-        ae.asset_type,
-        ae.sector,
-        ae.subsector,
-        ae.lat_lon,
-        ae.iso3_country,
-        ae.gadm_1,
-        ae.gadm_2,
-        ao.parent_name,
-        ao.parent_entity_id,
-        ao.parent_entity_type,
-        ao.parent_lei,
-        ao.parent_registration_country,
-        ao.parent_headquarter_country,
-        ao.immediate_source_owner,
-        ao.immediate_source_owner_entity_id,
-        ao.source_operator,
-        ao.source_operator_id,
-        ao.overall_share_percent,
-        SUM(ae.emissions_quantity) AS emissions_quantity,
-        SUM(ae.activity) AS activity,
-        ae.activity_units
-    FROM '{ownership_path}' ao
-    LEFT JOIN '{annual_asset_path}' ae
-        ON ao.asset_id = ae.asset_id
-    WHERE
-        ae.year = 2024
-        AND ae.reduction_q_type = 'asset'
-    GROUP BY
-        ao.asset_id,
-        ae.asset_name,
-        ae.asset_type,
-        ae.sector,
-        ae.subsector,
-        ae.lat_lon,
-        ae.iso3_country,
-        ae.gadm_1,
-        ae.gadm_2,
-        ao.parent_name,
-        ao.parent_entity_id,
-        ao.parent_entity_type,
-        ao.parent_lei,
-        ao.parent_registration_country,
-        ao.parent_headquarter_country,
-        ao.immediate_source_owner,
-        ao.immediate_source_owner_entity_id,
-        ao.source_operator,
-        ao.source_operator_id,
-        ao.overall_share_percent,
-        ae.activity_units
+        k.asset_id,
+        k.asset_name,
+        k.asset_type,
+        k.sector,
+        k.subsector,
+        k.iso3_country,
+        CASE WHEN k.parent_key = ': ' THEN 'Unknown parent' ELSE k.parent_key END AS parent,
+        CASE WHEN k.immediate_source_key = ': ' THEN 'Unknown immediate source' ELSE k.immediate_source_key END AS immediate_source,
+        CASE WHEN k.source_operator_key = ': ' THEN 'Unknown source operator' ELSE k.source_operator_key END AS source_operator,
+        k.overall_share_percent,
+        k.activity_units,
+        k.activity,
+        k.emissions_quantity,
+        k.emissions_quantity / nullif(k.activity, 0) AS ef_asset,
+        CASE WHEN abs(c.ef_country) <= 1e-6 THEN NULL ELSE c.ef_country END AS ef_country,
+        nullif(g.ef_global, 0) AS ef_global
+    FROM keyed k
+    LEFT JOIN country_ef c
+        ON c.iso3_country = k.iso3_country
+        AND c.subsector = k.subsector
+    LEFT JOIN global_ef g
+        ON g.subsector = k.subsector
     ORDER BY
-        ae.sector,
-        ae.subsector,
-        ae.iso3_country,
-        ao.asset_id;
+        k.emissions_quantity DESC NULLS LAST,
+        k.asset_id
     '''
-    return query_ownership_sql
 
-def get_gadm_emissions_sql(gadm_0_path):
-    query_ct_emissions = f'''
-    SELECT
-        ge.iso3_country,
-        ge.subsector,
-        SUM(ge.asset_activity) AS activity,
-        SUM(ge.asset_emissions) AS emissions_quantity,
-    FROM '{gadm_0_path}' ge
-    WHERE
-        ge.year = 2024
-        AND ge.gas = 'co2e_100yr'
-    GROUP BY
-        ge.iso3_country,
-        ge.subsector
-    ORDER BY
-        ge.iso3_country,
-        ge.subsector;
+    return ownership_fact_sql
+
+
+'''
+This builds SQL for the ownership closure table written during the data
+refresh: every (ancestor, descendant) pair in the parent -> immediate source
+-> source operator chain seen in the ownership fact table, including each
+owner paired with itself at depth 0.
+
+Returns: ownership_closure_sql
+
+Type: string (SQL)
+'''
+def get_ownership_closure_sql(ownership_fact_path):
+
+    levels = list(OWNER_TYPE_COLUMNS.items())
+
+    pairs = "\n\n        UNION ALL\n".join(
+        f'''
+        SELECT '{ancestor_type}' AS ancestor_type,
+            {ancestor_column} AS ancestor,
+            '{descendant_type}' AS descendant_type,
+            {descendant_column} AS descendant,
+            {depth} AS depth
+        FROM '{ownership_fact_path}\''''
+        for i, (ancestor_type, ancestor_column) in enumerate(levels)
+        for depth, (descendant_type, descendant_column) in enumerate(levels[i:])
+    )
+
+    ownership_closure_sql = f'''
+        SELECT DISTINCT *
+        FROM ({pairs}
+        )
+        WHERE ancestor IS NOT NULL
+            AND descendant IS NOT NULL
+        ORDER BY ancestor_type, ancestor, depth, descendant
     '''
-    return query_ct_emissions
+
+    return ownership_closure_sql
+
+
+'''
+This builds SQL for the ownership rollup written during the data refresh:
+per owner (at every owner type), sector, subsector and country, the number
+of assets, their emissions, and emissions and activity weighted by the
+owner's overall_share_percent. An owner's shares in one asset are added up
+across its ownership records and capped at 100%; records without a share
+don't count toward the weighted totals. Rows are sorted by owner so each
+owner's rows are contiguous.
+
+Returns: ownership_rollup_sql
+
+Type: string (SQL)
+'''
+def get_ownership_rollup_sql(ownership_fact_path):
+
+    owner_rows = "\n\n            UNION ALL\n".join(
+        f'''
+            SELECT '{owner_type}' AS owner_type, {column} AS owner, *
+            FROM '{ownership_fact_path}\''''
+        for owner_type, column in OWNER_TYPE_COLUMNS.items()
+    )
+
+    ownership_rollup_sql = f'''
+        WITH owner_assets AS (
+            SELECT owner_type,
+                owner,
+                asset_id,
+                sector,
+                subsector,
+                iso3_country,
+                MAX(emissions_quantity) AS emissions_quantity,
+                MAX(activity) AS activity,
+                -- not LEAST(), which skips NULLs and would count a missing share as 100%
+                CASE WHEN SUM(overall_share_percent) > 100 THEN 100
+                    ELSE SUM(overall_share_percent)
+                END / 100.0 AS share
+            FROM ({owner_rows}
+            )
+            GROUP BY owner_type, owner, asset_id, sector, subsector, iso3_country
+        )
+
+        SELECT owner_type,
+            owner,
+            sector,
+            subsector,
+            iso3_country,
+            COUNT(*) AS asset_count,
+            SUM(emissions_quantity) AS emissions_quantity,
+            SUM(emissions_quantity * share) AS share_emissions_quantity,
+            SUM(activity * share) AS share_activity
+        FROM owner_assets
+        GROUP BY owner_type, owner, sector, subsector, iso3_country
+        ORDER BY owner_type, owner, sector, subsector, iso3_country
+    '''
+
+    return ownership_rollup_sql
+
+
+'''
+This builds SQL for the distinct assets of every owner (at every owner
+type): one row per owner and asset with the asset's unweighted emissions,
+sorted by owner. Asset counts and asset emissions are taken from these rows
+so an asset held by several selected owners counts once.
+
+Returns: ownership_assets_sql
+
+Type: string (SQL)
+'''
+def get_ownership_assets_sql(ownership_fact_path):
+
+    owner_rows = "\n\n            UNION ALL\n".join(
+        f'''
+            SELECT '{owner_type}' AS owner_type, {column} AS owner, asset_id, sector, subsector, iso3_country, emissions_quantity
+            FROM '{ownership_fact_path}\''''
+        for owner_type, column in OWNER_TYPE_COLUMNS.items()
+    )
+
+    ownership_assets_sql = f'''
+        SELECT owner_type,
+            owner,
+            asset_id,
+            sector,
+            subsector,
+            iso3_country,
+            MAX(emissions_quantity) AS emissions_quantity
+        FROM ({owner_rows}
+        )
+        GROUP BY owner_type, owner, asset_id, sector, subsector, iso3_country
+        ORDER BY owner_type, owner, asset_id
+    '''
+
+    return ownership_assets_sql
+
+
+'''
+This builds SQL for the Ownership page's asset table: the highest-emitting
+rows of the ownership fact table for the selected owners (all owners when
+owners is empty) in the selected countries.
+
+Returns: owner_assets_sql
+
+Type: string (SQL)
+'''
+def get_owner_assets_sql(ownership_fact_path, key_column, owners, countries=None, limit=1000):
+
+    where = []
+
+    if owners:
+        owner_list = ", ".join("'" + str(o).replace("'", "''") + "'" for o in owners)
+        where.append(f"{key_column} IN ({owner_list})")
+
+    if countries is not None:
+        country_list = ", ".join("'" + str(c).replace("'", "''") + "'" for c in countries) or 'NULL'
+        where.append(f"iso3_country IN ({country_list})")
+
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    owner_assets_sql = f'''
+        SELECT DISTINCT asset_id,
+            asset_name,
+            subsector,
+            asset_type,
+            iso3_country,
+            activity_units,
+            activity,
+            emissions_quantity,
+            ef_asset,
+            ef_country,
+            ef_global
+        FROM '{ownership_fact_path}'
+        {where_sql}
+        ORDER BY emissions_quantity DESC NULLS LAST, asset_id
+        LIMIT {limit}
+    '''
+
+    return owner_assets_sql
+
+
+# countries whose Monthly Trends label differs from the statistics file
+STATS_COUNTRY_NAMES = {
+    'United States of America': 'United States',
+    'Russian Federation': 'Russia',
+}
+
+
+def _sql_literal(value):
+
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return str(value).upper()
+    if isinstance(value, (int, float)):
+        return str(value)
+
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+'''
+This builds SQL for the Monthly Trends statistics base table: the rows for
+gases, with country names relabelled for display and only the columns the
+page uses (region columns, sector, subsector, the latest and previous
+month's emissions, MoM/YoY changes and the 36 month slope). Missing the
+slope column yields NULL slopes.
+
+Returns: monthly_stats_base_sql
+
+Type: string (SQL)
+'''
+def get_monthly_stats_base_sql(stats_path, region_columns, latest_column, prev_column, gases, has_slope=True):
+
+    country_name_case = " ".join(
+        f"WHEN {_sql_literal(source)} THEN {_sql_literal(label)}" for source, label in STATS_COUNTRY_NAMES.items()
+    )
+    gas_list = ", ".join(_sql_literal(gas) for gas in gases)
+    slope = "emissions_slope_36_months_t_per_month" if has_slope else "CAST(NULL AS DOUBLE)"
+
+    monthly_stats_base_sql = f'''
+        SELECT CASE country_name {country_name_case} ELSE country_name END AS country_name,
+            {", ".join(region_columns)},
+            gas,
+            sector,
+            subsector,
+            {latest_column},
+            {prev_column},
+            mom_change,
+            month_yoy_change,
+            {slope} AS emissions_slope_36_months_t_per_month
+        FROM '{stats_path}'
+        WHERE gas IN ({gas_list})
+        ORDER BY gas, sector, subsector, country_name
+    '''
+
+    return monthly_stats_base_sql
+
+
+'''
+This builds SQL for the Monthly Trends country table from the statistics
+base table: latest and previous month emissions, MoM and YoY changes summed
+per country, their percent changes, and the 36 month slope weighted by
+latest month emissions. sector, subsectors and region_condition (from
+map_region_condition) are optional filters.
+
+Returns: monthly_stats_by_country_sql
+
+Type: string (SQL)
+'''
+def get_monthly_stats_by_country_sql(stats_table, latest_column, prev_column, gas, sector=None, subsectors=None, region_condition=None):
+
+    where = [f"gas = {_sql_literal(gas)}", "country_name IS NOT NULL"]
+
+    if sector:
+        where.append(f"sector = {_sql_literal(sector)}")
+
+    if subsectors:
+        where.append(f"subsector IN ({', '.join(_sql_literal(s) for s in subsectors)})")
+
+    if region_condition:
+        col = region_condition['column_name']
+        val = region_condition['column_value']
+        if isinstance(val, (list, tuple, set)):
+            where.append(f"{col} IN ({', '.join(_sql_literal(v) for v in val) or 'NULL'})")
+        else:
+            where.append(f"{col} = {_sql_literal(val)}")
+
+    monthly_stats_by_country_sql = f'''
+        WITH by_country AS (
+            SELECT country_name,
+                COALESCE(SUM({latest_column}), 0) AS {latest_column},
+                COALESCE(SUM({prev_column}), 0) AS {prev_column},
+                COALESCE(SUM(mom_change), 0) AS mom_change,
+                COALESCE(SUM(month_yoy_change), 0) AS month_yoy_change,
+                COALESCE(SUM(emissions_slope_36_months_t_per_month * {latest_column}), 0) AS slope_times_emissions
+            FROM {stats_table}
+            WHERE {' AND '.join(where)}
+            GROUP BY country_name
+        )
+
+        SELECT country_name,
+            {latest_column},
+            {prev_column},
+            mom_change,
+            month_yoy_change,
+            mom_change / {prev_column} * 100 AS mom_percent_change,
+            month_yoy_change / ({latest_column} - month_yoy_change) * 100 AS month_yoy_percent_change,
+            slope_times_emissions / {latest_column} AS emissions_slope_36_months_t_per_month
+        FROM by_country
+        ORDER BY country_name
+    '''
+
+    return monthly_stats_by_country_sql
+
+
+# gases offered on the Monthly Trends page
+MONTHLY_TRENDS_GASES = ['co2e_100yr', 'ch4']
+
+# land use subsectors left out of the Monthly Trends asset series
+MONTHLY_EXCLUDED_SUBSECTORS = [
+    'forest-land-clearing',
+    'forest-land-degradation',
+    'forest-land-fires',
+    'net-forest-land',
+    'net-shrubgrass',
+    'net-wetland',
+    'removals',
+    'shrubgrass-fires',
+    'water-reservoirs',
+    'wetland-fires',
+]
+
+# region dropdown column -> how its value is rendered in the monthly cube
+MONTHLY_CUBE_REGIONS = {
+    'iso3_country': 'iso3_country',
+    'continent': 'continent',
+    'eu': 'CAST(eu AS VARCHAR)',
+    'oecd': 'CAST(oecd AS VARCHAR)',
+    'unfccc_annex': 'CAST(unfccc_annex AS VARCHAR)',
+    'developed_un': 'CAST(developed_un AS VARCHAR)',
+    'em_finance': 'CAST(em_finance AS VARCHAR)',
+    'g20': 'CAST(g20 AS VARCHAR)',
+}
+
+
+'''
+This builds SQL for the Monthly Trends cube: monthly emissions per
+(region, gas, sector, subsector), with every region membership the Region/
+Country dropdown can pick (region_column 'global', each country's iso3, each
+continent and each region flag as 'true'/'false') precomputed as its own
+rows. Sector rows (subsector NULL) and all-sector rows (sector and
+subsector NULL) are rolled up too. asset_* measures come from the country
+subsector asset data (land use subsectors excluded, as the asset series
+does); emissions_quantity comes from the country subsector totals. The
+*_rows counts tell which source has a month.
+
+Returns: monthly_cube_sql
+
+Type: string (SQL)
+'''
+def get_monthly_cube_sql(asset_path, totals_path, gases=MONTHLY_TRENDS_GASES):
+
+    region_columns = ", ".join(MONTHLY_CUBE_REGIONS)
+    gas_list = ", ".join(f"'{gas}'" for gas in gases)
+    excluded_list = ", ".join(f"'{subsector}'" for subsector in MONTHLY_EXCLUDED_SUBSECTORS)
+    measures = "gas, sector, subsector, month, asset_activity, asset_emissions_quantity, asset_rows, emissions_quantity, total_rows"
+    memberships = "\n\n            UNION ALL\n\n".join(
+        [f"            SELECT 'global' AS region_column, 'Global' AS region_value, {measures} FROM months"]
+        + [f"            SELECT '{column}', {value}, {measures} FROM months" for column, value in MONTHLY_CUBE_REGIONS.items()]
+    )
+
+    monthly_cube_sql = f'''
+        WITH asset_months AS (
+            SELECT {region_columns},
+                gas,
+                sector,
+                original_inventory_sector AS subsector,
+                CAST(date_trunc('month', start_time) AS DATE) AS month,
+                SUM(activity) AS asset_activity,
+                SUM(emissions_quantity) AS asset_emissions_quantity,
+                COUNT(*) AS asset_rows
+            FROM '{asset_path}'
+            WHERE gas IN ({gas_list})
+                AND original_inventory_sector NOT IN ({excluded_list})
+            GROUP BY ALL
+        ),
+
+        total_months AS (
+            SELECT {region_columns},
+                gas,
+                sector,
+                subsector,
+                MAKE_DATE(year, month, 1) AS month,
+                SUM(emissions_quantity) AS emissions_quantity,
+                COUNT(*) AS total_rows
+            FROM '{totals_path}'
+            WHERE gas IN ({gas_list})
+                AND country_name IS NOT NULL
+            GROUP BY ALL
+        ),
+
+        months AS MATERIALIZED (
+            SELECT *
+            FROM asset_months
+            FULL OUTER JOIN total_months
+                USING ({region_columns}, gas, sector, subsector, month)
+        ),
+
+        memberships AS (
+{memberships}
+        )
+
+        SELECT region_column,
+            region_value,
+            gas,
+            sector,
+            subsector,
+            month,
+            SUM(asset_activity) AS asset_activity,
+            SUM(asset_emissions_quantity) AS asset_emissions_quantity,
+            CAST(COALESCE(SUM(asset_rows), 0) AS BIGINT) AS asset_rows,
+            SUM(emissions_quantity) AS emissions_quantity,
+            CAST(COALESCE(SUM(total_rows), 0) AS BIGINT) AS total_rows
+        FROM memberships
+        WHERE region_value IS NOT NULL
+        GROUP BY GROUPING SETS (
+            (region_column, region_value, gas, sector, subsector, month),
+            (region_column, region_value, gas, sector, month),
+            (region_column, region_value, gas, month)
+        )
+        -- NULL in sector/subsector marks a rollup, so detail rows without one are folded into the rollups only
+        HAVING NOT (GROUPING(subsector) = 0 AND subsector IS NULL)
+            AND NOT (GROUPING(sector) = 0 AND sector IS NULL)
+        ORDER BY region_column, region_value, gas, sector NULLS FIRST, subsector NULLS FIRST, month
+    '''
+
+    return monthly_cube_sql
@@ -0,0 +1,105 @@
+import re
+import threading
+from collections import OrderedDict
+from config import CONFIG
+from utils.connection import get_release
+
+
+# process-wide LRU of query results (key -> (frame, bytes)), shared by every session
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+_SQL_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+
+'''
+This normalizes SQL text for use as a cache key: runs of whitespace outside
+string literals collapse to a single space, so the same query rendered with
+different indentation maps to the same entry.
+
+Returns: normalized SQL
+Type: string
+'''
+def normalize_sql(sql):
+
+    parts = _SQL_LITERAL.split(sql)
+    parts = [part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts)]
+
+    return ''.join(parts).strip()
+
+
+def _max_bytes():
+
+    return int(CONFIG.get('query_cache_max_mb', 256) * 1024 * 1024)
+
+
+'''
+This runs a query through the shared result cache. Results are keyed on the
+normalized SQL plus the data release and evicted least-recently-used once the
+cache exceeds CONFIG['query_cache_max_mb']. Callers get their own copy of the
+frame, so mutating it can't corrupt the cached result.
+
+Returns: query result
+Type: pandas.DataFrame
+'''
+def run_cached_query(con, sql):
+
+    global _cache_bytes
+
+    key = (get_release(), normalize_sql(sql))
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            _cache_stats['hits'] += 1
+            return entry[0].copy()
+        _cache_stats['misses'] += 1
+
+    # run outside the lock so a slow scan doesn't block other sessions
+    df = con.execute(sql).df()
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    max_bytes = _max_bytes()
+
+    if size <= max_bytes:
+        with _cache_lock:
+            if key not in _cache:
+                _cache[key] = (df, size)
+                _cache_bytes += size
+
+            while _cache_bytes > max_bytes:
+                _, (_, evicted_size) = _cache.popitem(last=False)
+                _cache_bytes -= evicted_size
+                _cache_stats['evictions'] += 1
+
+    return df.copy()
+
+
+'''
+This reports hit/miss/eviction counters and current usage of the result cache.
+
+Returns: cache statistics
+Type: dict
+'''
+def query_cache_stats():
+
+    with _cache_lock:
+        lookups = _cache_stats['hits'] + _cache_stats['misses']
+        return {
+            **_cache_stats,
+            'hit_rate': _cache_stats['hits'] / lookups if lookups else 0.0,
+            'entries': len(_cache),
+            'bytes': _cache_bytes,
+            'max_bytes': _max_bytes(),
+        }
+
+
+def clear_query_cache():
+
+    global _cache_bytes
+
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
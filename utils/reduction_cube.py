@@ -0,0 +1,240 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from matplotlib.colors import LinearSegmentedColormap
+from utils.connection import get_database, get_release, has_table, table_ref
+from utils.queries import get_reduction_cube_sql
+
+
+FORESTRY_SECTOR = 'forestry-and-land-use'
+
+HEATMAP_CMAP = LinearSegmentedColormap.from_list(
+    "universal_orange",
+    [
+        (0.00, "#FFFFFF"),   # white
+        (0.50, "#F9A66C"),   # medium orange
+        (1.00, "#E07B3D"),   # **softer terracotta orange**
+    ]
+)
+
+
+def sector_column(sector):
+
+    return sector.replace('-', '_')
+
+
+'''
+This loads the reduction cube once per data release and splits it by what
+the Heat Map slices on: all countries, the states of each country and the
+counties of each state. Without the refresh output the cube is built from
+the asset and GADM data.
+
+Returns: reduction cube index
+Type: dict
+'''
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_reduction_cube(release):
+
+    con = get_database().cursor()
+
+    try:
+        if has_table('reduction_cube_path'):
+            sql = f"SELECT * FROM '{table_ref('reduction_cube_path')}'"
+        else:
+            sql = get_reduction_cube_sql(table_ref('annual_asset_path'), table_ref('gadm_1_path'), table_ref('gadm_2_path'))
+
+        df = con.execute(sql).df()
+
+    finally:
+        con.close()
+
+    levels = {level: rows.reset_index(drop=True) for level, rows in df.groupby('geography_level')}
+    empty = df.iloc[0:0]
+
+    # every sector in the release, so columns don't come and go between slices
+    sectors = sorted(s for s in df['sector'].dropna().unique() if s != FORESTRY_SECTOR)
+
+    return {
+        'release': release,
+        'sectors': sectors,
+        'country': levels.get('country', empty),
+        'gadm_1': {iso3: rows for iso3, rows in levels.get('gadm_1', empty).groupby('iso3_country')},
+        'gadm_2': {key: rows for key, rows in levels.get('gadm_2', empty).groupby(['iso3_country', 'gadm_1_name'])},
+        'empty': empty,
+    }
+
+
+def get_reduction_cube():
+
+    return load_reduction_cube(get_release())
+
+
+'''
+This returns the heat map sector columns, in display order.
+
+Returns: column names
+Type: list
+'''
+def reduction_sector_columns():
+
+    return [sector_column(sector) for sector in get_reduction_cube()['sectors']]
+
+
+'''
+This pivots cube rows to one row per region_col value (one 'Total' row when
+region_col is None): reduction potential per sector, then
+total_exc_forestry, forestry_and_land_use, total_reduction_potential and
+asset_count. Regions are sorted by total_reduction_potential, largest first.
+
+Returns: wide table with a Region column
+Type: pd.DataFrame
+'''
+def pivot_reduction_cube(rows, sectors, region_col=None):
+
+    values = rows['total_emissions_reduced_per_year']
+    regions = rows[region_col] if region_col else pd.Series('Total', index=rows.index)
+    sector = rows['sector']
+
+    def by_region(series, **kwargs):
+        return series.groupby(regions, dropna=False, sort=True).sum(**kwargs)
+
+    wide = (
+        values.groupby([regions, sector], dropna=False).sum()
+        .unstack(fill_value=0)
+        .reindex(columns=sectors, fill_value=0)
+    ) if len(rows) else pd.DataFrame(columns=sectors, dtype=float)
+
+    wide.columns = [sector_column(s) for s in sectors]
+    wide['total_exc_forestry'] = by_region(values.where(sector.notna() & (sector != FORESTRY_SECTOR), 0))
+    wide['forestry_and_land_use'] = by_region(values.where(sector == FORESTRY_SECTOR, 0))
+    wide['total_reduction_potential'] = by_region(values, min_count=1)
+    wide['asset_count'] = by_region(rows['asset_count'])
+
+    if region_col is None:
+        # a total over nothing is still one (empty) row
+        wide = wide.reindex(['Total'])
+        wide['asset_count'] = wide['asset_count'].fillna(0).astype('int64')
+    else:
+        wide = wide.sort_values('total_reduction_potential', ascending=False, na_position='last', kind='stable')
+
+    wide.index.name = 'Region'
+
+    return wide.reset_index()
+
+
+'''
+This returns the heat map tables for a selection: the 'Total' row and one
+row per country (Global, G20), per state (a country) or per county (a
+state). iso3_country and state come from the Country and State / Province
+dropdowns.
+
+Returns: (total table, region table)
+Type: tuple
+'''
+def reduction_heatmap_tables(g20=False, iso3_country=None, state=None):
+
+    cube = get_reduction_cube()
+
+    if state is not None:
+        rows = cube['gadm_2'].get((iso3_country, state), cube['empty'])
+    elif iso3_country is not None:
+        rows = cube['gadm_1'].get(iso3_country, cube['empty'])
+    else:
+        rows = cube['country']
+        if g20:
+            rows = rows[rows['g20'].fillna(False).astype(bool)]
+
+    sector_df = pivot_reduction_cube(rows, cube['sectors'])
+    table_df = pivot_reduction_cube(rows, cube['sectors'], region_col='geography_name')
+
+    return sector_df, table_df
+
+
+'''
+This builds the heat map cell styles for df in one pass. color_cols are
+scaled per column (across the row when df has a single row, which is also
+bolded) and coloured with HEATMAP_CMAP; values at or below low_thresh, and
+missing ones, stay white. bold bolds every cell. Colours are turned into CSS
+once per distinct colour rather than once per cell.
+
+Returns: CSS per cell, same shape as df
+Type: pd.DataFrame
+'''
+def heatmap_css(df, color_cols, low_thresh=0.05, bold=False):
+
+    block = df[color_cols].astype(float)
+    single_row = len(block) == 1
+
+    if single_row:
+        row = block.iloc[0]
+        vmin, vmax = row.min(), row.max()
+        scaled = (block - vmin) / ((vmax - vmin) or 1.0)
+    else:
+        mins, maxs = block.min(), block.max()
+        scaled = (block - mins) / (maxs - mins).replace(0, 1.0)
+
+    scaled = scaled.to_numpy()
+    paint = np.isfinite(scaled) & (scaled > low_thresh)
+
+    rgb = (HEATMAP_CMAP(np.where(paint, scaled, 0.0))[..., :3] * 255).astype(np.int64)
+    color_keys = np.where(paint, (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2], -1)
+    keys, inverse = np.unique(color_keys.ravel(), return_inverse=True)
+
+    suffix = " font-weight: bold;" if single_row or bold else ""
+    styles = np.array([
+        f"background-color: {'white' if key < 0 else f'rgb({key >> 16},{(key >> 8) & 255},{key & 255})'}; color: black;{suffix}"
+        for key in keys
+    ], dtype=object)
+
+    css = pd.DataFrame("font-weight: bold;" if bold else "", index=df.index, columns=df.columns)
+    css[color_cols] = styles[inverse].reshape(color_keys.shape)
+
+    return css
+
+
+'''
+This sizes columns shared by all frames to their longest value or header,
+in pixels.
+
+Returns: column -> width
+Type: dict
+'''
+def heatmap_column_widths(frames, font_char_width=6, padding=12):
+
+    columns = [c for c in frames[0].columns if all(c in df.columns for df in frames[1:])]
+
+    widths = {}
+    for col in columns:
+        values = np.concatenate([df[col].to_numpy() for df in frames])
+        longest = np.char.str_len(values.astype(str)).max(initial=0)
+        widths[col] = max(int(longest), len(str(col))) * font_char_width + padding
+
+    return widths
+
+
+'''
+This returns the heat map tables for a selection (see
+reduction_heatmap_tables) with their cell styles and column widths, cached
+per release and selection.
+
+Returns: sector_df, table_df, sector_css, table_css and column_widths
+Type: dict
+'''
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_heatmap_view(release, g20, iso3_country, state):
+
+    sector_df, table_df = reduction_heatmap_tables(g20, iso3_country, state)
+    color_cols = reduction_sector_columns()
+
+    return {
+        'sector_df': sector_df,
+        'table_df': table_df,
+        'sector_css': heatmap_css(sector_df, color_cols, bold=True),
+        'table_css': heatmap_css(table_df, color_cols),
+        'column_widths': heatmap_column_widths([sector_df, table_df]),
+    }
+
+
+def reduction_heatmap_view(g20=False, iso3_country=None, state=None):
+
+    return load_heatmap_view(get_release(), g20, iso3_country, state)
@@ -0,0 +1,721 @@
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shutil
+import time
+from pathlib import Path
+from utils.queries import (
+    get_ownership_closure_sql,
+    get_ownership_fact_sql,
+    get_ownership_rollup_sql,
+    get_monthly_cube_sql,
+    get_reduction_cube_sql,
+)
+from utils.run_sql import stream_sql
+
+
+# columns the Reduction Opportunities tab filters the asset table on; the
+# sector reduction rollup keeps one row per asset and combination of these.
+# The region flags are functionally dependent on iso3_country, so carrying
+# them doesn't add rows but lets the tab reuse its `ae.{col} = ...` filters.
+SECTOR_REDUCTION_ROLLUP_GRAIN = [
+    'sector',
+    'subsector',
+    'iso3_country',
+    'continent',
+    'eu',
+    'oecd',
+    'unfccc_annex',
+    'developed_un',
+    'em_finance',
+    'g20',
+    'gadm_1',
+    'gadm_2',
+    'city_id',
+    'most_granular',
+    'is_forestry',
+]
+
+
+# asset attributes carried on asset_induced_emissions so the tab's dropdown
+# joins and region filters (alias ae) apply to it unchanged
+ASSET_FILTER_COLUMNS = [
+    'iso3_country',
+    'continent',
+    'eu',
+    'oecd',
+    'unfccc_annex',
+    'developed_un',
+    'em_finance',
+    'g20',
+    'gadm_1',
+    'gadm_2',
+    'ghs_fua',
+    'most_granular',
+]
+
+
+'''
+This streams the results of a Postgres query into a parquet file. Arrow
+record batches of batch_rows rows come from utils.run_sql.stream_sql, which
+uses a pooled connection, and are appended to a ParquetWriter. At most one
+batch is held in memory, however large the result is. Progress is logged
+every log_every batches.
+
+Returns: number of rows written
+
+Type: int
+'''
+def export_query_to_parquet(dsn, query, output_file, batch_rows=50_000, log_every=10):
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    writer = None
+    total_rows = 0
+    total_bytes = 0
+    batch_count = 0
+    start = time.perf_counter()
+
+    def log_progress(prefix):
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(
+            f"{prefix} {total_rows:,} rows, {total_bytes / 1e6:,.1f} MB in {elapsed:,.0f}s "
+            f"({total_rows / elapsed:,.0f} rows/s, {total_bytes / 1e6 / elapsed:,.1f} MB/s)",
+            flush=True
+        )
+
+    try:
+        for batch in stream_sql(query, batch_rows=batch_rows, dsn=dsn):
+
+            if writer is None:
+                writer = pq.ParquetWriter(output_file, batch.schema)
+
+            if not batch.num_rows:
+                continue
+
+            writer.write_batch(batch)
+
+            batch_count += 1
+            total_rows += batch.num_rows
+            total_bytes += batch.nbytes
+            del batch
+
+            if batch_count % log_every == 0:
+                log_progress("  -")
+
+    finally:
+        if writer is not None:
+            writer.close()
+
+    log_progress(f"✅ {output_file}:")
+
+    return total_rows
+
+
+# other* columns data_add_moer coerces to numbers before the MOER formulas
+MOER_NUMERIC_COLUMNS = ['other1', 'other2', 'other3', 'other4', 'other5', 'other7', 'other9']
+
+
+'''
+This builds SQL for the MOER enrichment of the annual asset table, the
+set-based version of utils.utils.data_add_moer(df, cond={'moer': True}). It
+adds ef_moer (lbs/MWh -> t/MWh) from the MOER file, matched on asset_id and
+subsector, and the eq_12/ef_12/eq_12_moer/ef_12_moer columns. Those are
+recomputed for electricity-generation, iron-and-steel and cement and passed
+through for every other subsector. NaN results are written as NULL, like
+pandas did when it saved the frame.
+
+Returns: asset_moer_sql
+
+Type: string (SQL)
+'''
+def build_asset_moer_sql(annual_asset_path, moer_path):
+
+    numeric_columns = ", ".join(f"TRY_CAST(a.{c} AS DOUBLE) AS {c}" for c in MOER_NUMERIC_COLUMNS)
+
+    def nan_to_null(expression):
+        return f"CASE WHEN isnan({expression}) THEN NULL ELSE {expression} END"
+
+    asset_moer_sql = f'''
+        WITH moer AS (
+            SELECT CAST(asset_id AS VARCHAR) AS asset_id
+                , original_inventory_sector
+                , moer_avg * 0.4536 / 1000 AS ef_moer
+            FROM '{moer_path}'
+        ),
+
+        assets AS (
+            SELECT a.* REPLACE (CAST(a.asset_id AS VARCHAR) AS asset_id, {numeric_columns})
+                , m.ef_moer
+            FROM '{annual_asset_path}' a
+            LEFT JOIN moer m
+                ON m.asset_id = CAST(a.asset_id AS VARCHAR)
+                AND m.original_inventory_sector = a.subsector
+        ),
+
+        eq AS (
+            SELECT *
+                , CASE
+                    WHEN subsector IN ('iron-and-steel', 'cement') THEN other2
+                    ELSE emissions_quantity
+                END AS eq_12
+                , CASE
+                    WHEN subsector IN ('iron-and-steel', 'cement') THEN other1
+                    ELSE average_emissions_factor
+                END AS ef_12
+                , CASE
+                    WHEN subsector = 'electricity-generation' AND asset_type = 'biomass'
+                        THEN other4
+                    WHEN subsector = 'electricity-generation'
+                        THEN activity * coalesce(other7, average_emissions_factor)
+                    WHEN subsector = 'iron-and-steel'
+                        THEN other2
+                    WHEN subsector = 'cement'
+                        THEN other2 + activity * other7 * (coalesce(ef_moer, other9) - other9)
+                    ELSE NULL
+                END AS eq_12_moer
+            FROM assets
+        )
+
+        SELECT * REPLACE ({nan_to_null('eq_12_moer')} AS eq_12_moer)
+            , {nan_to_null('''CASE
+                WHEN subsector IN ('electricity-generation', 'iron-and-steel', 'cement')
+                    THEN eq_12_moer / activity
+                ELSE NULL
+            END''')} AS ef_12_moer
+        FROM eq
+    '''
+
+    return asset_moer_sql
+
+
+'''
+This writes the MOER-enriched annual asset table to a single parquet file.
+DuckDB streams it from parquet to parquet, so memory stays near memory_limit
+(spilling to temp_directory) instead of holding the full asset frame in
+pandas. Row order isn't preserved; the aggregation step that reads this
+file doesn't depend on it.
+
+Returns: number of rows written
+
+Type: int
+'''
+def write_asset_moer(annual_asset_path, moer_path, output_file, memory_limit='2GB', temp_directory=None):
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    con = duckdb.connect()
+
+    try:
+        con.execute(f"SET memory_limit = '{memory_limit}'")
+        con.execute("SET preserve_insertion_order = false")
+        if temp_directory is not None:
+            con.execute(f"SET temp_directory = '{temp_directory}'")
+
+        con.execute(f"COPY ({build_asset_moer_sql(annual_asset_path, moer_path)}) TO '{output_file}' (FORMAT PARQUET)")
+        row_count = con.execute(f"SELECT count(*) FROM '{output_file}'").fetchone()[0]
+
+    finally:
+        con.close()
+
+    return row_count
+
+
+'''
+This builds SQL for the long format induced emissions table written during
+the data refresh: one row per asset, induced_sector_N slot, receiving
+subsector and set of filter columns, with the receiving sector already
+resolved through the asset schema. An asset with several geography rows
+keeps one row per geography, so the induction queries filter first and then
+dedupe per asset, as they did from the three induced_sector_N columns at
+request time.
+
+Returns: asset_induced_emissions_sql
+
+Type: string (SQL)
+'''
+def build_asset_induced_emissions_sql(annual_asset_path):
+
+    filter_columns = ", ".join(f"a.{c}" for c in ASSET_FILTER_COLUMNS)
+
+    induced_slots = "\n\n        UNION ALL\n".join(
+        f'''
+        SELECT DISTINCT a.asset_id
+            , a.sector AS inducing_sector
+            , a.subsector AS inducing_subsector
+            , {n} AS induced_slot
+            , CAST(a.induced_sector_{n} AS VARCHAR) AS receiving_subsector
+            , sm.sector AS receiving_sector
+            , a.induced_sector_{n}_induced_emissions AS induced_emissions
+            , {filter_columns}
+        FROM '{annual_asset_path}' a
+        INNER JOIN sector_mapping sm
+            ON sm.subsector = CAST(a.induced_sector_{n} AS VARCHAR)'''
+        for n in (1, 2, 3)
+    )
+
+    asset_induced_emissions_sql = f'''
+        WITH sector_mapping AS (
+            SELECT DISTINCT sector, subsector
+            FROM '{annual_asset_path}'
+        )
+        {induced_slots}
+    '''
+
+    return asset_induced_emissions_sql
+
+
+'''
+This builds SQL for the sector reduction rollup written during the data
+refresh: the asset table cut down to one row per asset and grain cell. Rows
+with a NULL receiving_sector hold an asset's static emissions and asset
+reductions in that cell; the remaining rows hold its induced emissions per
+induced_sector_N slot, read from asset_induced_emissions. An asset whose
+rows span several cells (e.g. two gadm_2 regions) keeps a row in each, so
+the rollup queries filter first and then count each asset once, exactly as
+the asset-level queries do. city_id is the cleaned ghs_fua id the city
+dropdown joins on.
+
+Returns: sector_reduction_rollup_sql
+
+Type: string (SQL)
+'''
+def build_sector_reduction_rollup_sql(annual_asset_path, induced_emissions_path):
+
+    grain = ", ".join(SECTOR_REDUCTION_ROLLUP_GRAIN)
+
+    sector_reduction_rollup_sql = f'''
+        WITH assets AS (
+            SELECT asset_id
+                , sector
+                , subsector
+                , iso3_country
+                , continent
+                , eu
+                , oecd
+                , unfccc_annex
+                , developed_un
+                , em_finance
+                , g20
+                , gadm_1
+                , gadm_2
+                , regexp_replace(ghs_fua[1], '[{{}}]', '', 'g') AS city_id
+                , most_granular
+                , sector = 'forestry-and-land-use' AS is_forestry
+                , emissions_quantity
+                , emissions_reduced_at_asset
+            FROM '{annual_asset_path}'
+        ),
+
+        asset_reductions AS (
+            SELECT asset_id
+                , {grain}
+                , sum(emissions_quantity) AS emissions_quantity
+                , emissions_reduced_at_asset
+            FROM assets
+            GROUP BY asset_id
+                , {grain}
+                , emissions_reduced_at_asset
+        ),
+
+        induced AS (
+            SELECT DISTINCT asset_id
+                , inducing_sector AS sector
+                , inducing_subsector AS subsector
+                , iso3_country
+                , continent
+                , eu
+                , oecd
+                , unfccc_annex
+                , developed_un
+                , em_finance
+                , g20
+                , gadm_1
+                , gadm_2
+                , regexp_replace(ghs_fua[1], '[{{}}]', '', 'g') AS city_id
+                , most_granular
+                , inducing_sector = 'forestry-and-land-use' AS is_forestry
+                , receiving_sector
+                , receiving_subsector
+                , induced_slot
+                , induced_emissions
+            FROM '{induced_emissions_path}'
+        )
+
+        SELECT asset_id
+            , {grain}
+            , CAST(NULL AS VARCHAR) AS receiving_sector
+            , CAST(NULL AS VARCHAR) AS receiving_subsector
+            , CAST(NULL AS INTEGER) AS induced_slot
+            , emissions_quantity
+            , emissions_reduced_at_asset
+            , CAST(NULL AS DOUBLE) AS induced_emissions
+        FROM asset_reductions
+
+        UNION ALL
+
+        SELECT asset_id
+            , {grain}
+            , receiving_sector
+            , receiving_subsector
+            , induced_slot
+            , NULL
+            , NULL
+            , induced_emissions
+        FROM induced
+    '''
+
+    return sector_reduction_rollup_sql
+
+
+'''
+This writes a parquet file (or DuckDB table) as a hive-partitioned dataset,
+e.g. output_path/sector=power/subsector=electricity-generation/data_0.parquet.
+Rows are sorted by order_by within each partition and written in small row
+groups, so filters on the partition columns skip whole directories and
+filters on the sort columns skip row groups by their min/max statistics.
+Files are capped at max_file_size to stay under GitHub's size limit. NULL
+partition values are written as NULL, which DuckDB reads back as NULL.
+
+Anything already in output_path is replaced, so archive it first.
+
+Returns: number of partitions written
+
+Type: int
+'''
+def write_partitioned_dataset(source,
+                              output_path,
+                              partition_by=('sector', 'subsector'),
+                              order_by=('iso3_country', 'gadm_1'),
+                              row_group_size=50_000,
+                              max_file_size='40MB'
+                            ):
+
+    output_path = Path(output_path)
+    if output_path.exists():
+        shutil.rmtree(output_path)
+
+    con = duckdb.connect()
+
+    try:
+        partitions = con.execute(
+            f"SELECT DISTINCT {', '.join(partition_by)} FROM '{source}'"
+        ).fetchall()
+
+        for values in partitions:
+            partition_dir = output_path.joinpath(*(
+                f"{col}={'NULL' if value is None else value}" for col, value in zip(partition_by, values)
+            ))
+            partition_dir.mkdir(parents=True, exist_ok=True)
+
+            partition_filter = " AND ".join(f"{col} IS NOT DISTINCT FROM ?" for col in partition_by)
+
+            # PARTITION_BY can't be combined with FILE_SIZE_BYTES, and rejects NULL
+            # partition values, so each partition is written on its own
+            con.execute(f'''
+                COPY (
+                    SELECT * EXCLUDE ({', '.join(partition_by)})
+                    FROM '{source}'
+                    WHERE {partition_filter}
+                    ORDER BY {', '.join(order_by)}
+                ) TO '{partition_dir}' (
+                    FORMAT PARQUET,
+                    ROW_GROUP_SIZE {row_group_size},
+                    FILE_SIZE_BYTES '{max_file_size}',
+                    OVERWRITE_OR_IGNORE
+                )
+            ''', list(values))
+
+            print(f"  - Saved {partition_dir}")
+
+    finally:
+        con.close()
+
+    return len(partitions)
+
+
+'''
+This moves a parquet file into output_dir, or splits it there into
+{stem}_chunk_N.parquet files of about target_size_mb each when it's larger.
+The file is read with ParquetFile.iter_batches and written back batch by
+batch, so only one batch of batch_rows rows is in memory at a time. A new
+chunk is started whenever the next batch would push the current one past
+target_size_mb, judged by how much the previous batch added to the file.
+Each chunk keeps the input's schema (including pandas metadata) and
+compression, and gets column statistics for every row group. The input is
+deleted once it's split.
+'''
+def split_or_move_parquet(input_file, output_dir, target_size_mb=40, batch_rows=65_536):
+
+    input_file = Path(input_file)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    file_size_mb = input_file.stat().st_size / (1024 * 1024)
+
+    # If file is already below threshold, just move it
+    if file_size_mb <= target_size_mb:
+        dest_file = output_dir / input_file.name
+        shutil.move(str(input_file), dest_file)
+        print(f"✅ File {input_file.name} was {file_size_mb:.1f} MB, moved to {dest_file}")
+        return
+
+    print(f"⚡ Splitting {input_file.name} ({file_size_mb:.1f} MB)...")
+
+    target_bytes = target_size_mb * 1024 * 1024
+    parquet_file = pq.ParquetFile(input_file)
+    schema = parquet_file.schema_arrow
+
+    compression = 'snappy'
+    if parquet_file.metadata.num_row_groups and parquet_file.metadata.num_columns:
+        compression = parquet_file.metadata.row_group(0).column(0).compression.lower()
+        compression = 'none' if compression == 'uncompressed' else compression
+
+    chunk = 0
+    sink = writer = output_path = None
+    chunk_start = rows = 0
+    last_batch_bytes = 0
+
+    def close_chunk():
+        writer.close()
+        sink.close()
+        size_mb = output_path.stat().st_size / (1024 * 1024)
+        print(f"  - Saved {output_path} ({size_mb:.1f} MB, rows {chunk_start}–{rows})")
+
+    try:
+        for batch in parquet_file.iter_batches(batch_size=batch_rows):
+
+            # roll over before the batch that would take this chunk past the target
+            if writer is not None and sink.tell() + last_batch_bytes > target_bytes:
+                close_chunk()
+                writer = None
+
+            if writer is None:
+                chunk += 1
+                chunk_start = rows
+                output_path = output_dir / f"{input_file.stem}_chunk_{chunk}.parquet"
+                sink = pa.OSFile(str(output_path), 'wb')
+                writer = pq.ParquetWriter(sink, schema, compression=compression, write_statistics=True)
+
+            position = sink.tell()
+            writer.write_batch(batch)
+            last_batch_bytes = sink.tell() - position
+            rows += batch.num_rows
+            del batch
+
+        if writer is not None:
+            close_chunk()
+            writer = None
+
+    finally:
+        if writer is not None:
+            writer.close()
+            sink.close()
+
+    # Delete original after chunking
+    input_file.unlink()
+    print(f"🗑️ Deleted original {input_file.name}")
+    print("✅ Splitting complete")
+
+
+def _write_parquet(sql, output_file):
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    con = duckdb.connect()
+
+    try:
+        con.execute(f"COPY ({sql}) TO '{output_file}' (FORMAT PARQUET)")
+        row_count = con.execute(f"SELECT count(*) FROM '{output_file}'").fetchone()[0]
+
+    finally:
+        con.close()
+
+    return row_count
+
+
+'''
+This writes asset_induced_emissions to a single parquet file, sorted by asset
+so the per-asset aggregations in the induction queries stay cheap.
+
+Returns: number of rows written
+
+Type: int
+'''
+def write_asset_induced_emissions(annual_asset_path, output_path):
+
+    sql = f'''
+        SELECT * FROM ({build_asset_induced_emissions_sql(annual_asset_path)})
+        ORDER BY iso3_country, asset_id
+    '''
+
+    return _write_parquet(sql, Path(output_path) / "asset_induced_emissions.parquet")
+
+
+'''
+This writes the sector reduction rollup to a single parquet file, sorted by
+country, sector and asset. Run it after asset_induced_emissions.
+
+Returns: number of rows written
+
+Type: int
+'''
+def write_sector_reduction_rollup(annual_asset_path, induced_emissions_path, output_path):
+
+    sql = f'''
+        SELECT * FROM ({build_sector_reduction_rollup_sql(annual_asset_path, induced_emissions_path)})
+        ORDER BY iso3_country, sector, subsector, asset_id
+    '''
+
+    return _write_parquet(sql, Path(output_path) / "sector_reduction_rollup.parquet")
+
+
+'''
+This writes the Heat Map reduction cube (reduction potential by geography
+level, geography and sector) to a single parquet file.
+
+Returns: number of rows written
+
+Type: int
+'''
+def write_reduction_cube(annual_asset_path, gadm_1_path, gadm_2_path, output_path):
+
+    sql = get_reduction_cube_sql(annual_asset_path, gadm_1_path, gadm_2_path)
+
+    return _write_parquet(sql, Path(output_path) / "reduction_cube.parquet")
+
+
+'''
+This writes the Monthly Trends cube (monthly emissions by region
+membership, gas, sector and subsector) to a single parquet file.
+
+Returns: number of rows written
+
+Type: int
+'''
+def write_monthly_cube(asset_path, totals_path, output_path):
+
+    return _write_parquet(get_monthly_cube_sql(asset_path, totals_path), Path(output_path) / "monthly_cube.parquet")
+
+
+'''
+This writes the gadm_1 emissions statistics to a single parquet file sorted
+by gadm_id and gas, in row groups of row_group_size rows with min/max
+statistics, so one state's rows sit in one or two row groups that a reader
+can pick from the footer (see utils/gadm_1_stats.py). The row groups are
+written with pyarrow because DuckDB won't go below 2,048 rows per group.
+The CSV index column is dropped.
+
+Returns: number of rows written
+
+Type: int
+'''
+def write_gadm_1_statistics_store(statistics_path, output_path, row_group_size=256):
+
+    output_file = Path(output_path) / "gadm_1_statistics.parquet"
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    con = duckdb.connect()
+
+    try:
+        table = con.execute(f'''
+            SELECT COLUMNS(c -> c NOT LIKE 'Unnamed:%')
+            FROM '{statistics_path}'
+            ORDER BY gadm_id, gas
+        ''').arrow()
+
+    finally:
+        con.close()
+
+    pq.write_table(table, output_file, row_group_size=row_group_size, write_statistics=True)
+
+    return table.num_rows
+
+
+'''
+This writes one parquet file per month of source into output_dir, named
+{file_prefix}_YYYY_MM.parquet, for just the given months (first-of-month
+dates). Each file is written next to its destination and renamed over it, so
+a reader never sees a half-written month. Rows are sorted by order_by so
+country/subsector filters can skip row groups.
+
+Returns: rows written per month (YYYY-MM -> rows)
+
+Type: dict
+'''
+def write_monthly_partitions(source,
+                             output_dir,
+                             months,
+                             file_prefix,
+                             time_col='start_time',
+                             order_by=('iso3_country', 'original_inventory_sector')
+                            ):
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    rows = {}
+    con = duckdb.connect()
+
+    try:
+        for month in sorted(months):
+            output_file = output_dir / f"{file_prefix}_{month:%Y_%m}.parquet"
+            tmp_file = output_file.with_suffix(".parquet.tmp")
+
+            con.execute(f'''
+                COPY (
+                    SELECT *
+                    FROM '{source}'
+                    WHERE {time_col} >= ?::DATE
+                      AND {time_col} < ?::DATE + INTERVAL 1 MONTH
+                    ORDER BY {', '.join(order_by)}
+                ) TO '{tmp_file}' (FORMAT PARQUET)
+            ''', [month, month])
+
+            rows[f"{month:%Y-%m}"] = con.execute(f"SELECT count(*) FROM read_parquet('{tmp_file}')").fetchone()[0]
+            tmp_file.replace(output_file)
+
+            print(f"  - Saved {output_file} ({rows[f'{month:%Y-%m}']} rows)")
+
+    finally:
+        con.close()
+
+    return rows
+
+
+'''
+This writes the Ownership page's fact table to a single parquet file: assets
+joined to their owners with the owner keys, cleaned names and emissions
+factors the page used to compute per rerun. Split it before moving it into
+data/, it grows with the ownership table.
+
+Returns: number of rows written
+
+Type: int
+'''
+def write_ownership_fact(annual_asset_path, ownership_path, gadm_0_path, output_path):
+
+    sql = get_ownership_fact_sql(annual_asset_path, ownership_path, gadm_0_path)
+
+    return _write_parquet(sql, Path(output_path) / "ownership_fact.parquet")
+
+
+'''
+This writes the ownership closure table and the share-weighted ownership
+rollup from the ownership fact table, one parquet file each.
+
+Returns: number of rows written per table
+
+Type: dict
+'''
+def write_ownership_hierarchy(ownership_fact_path, closure_output_path, rollup_output_path):
+
+    return {
+        'closure': _write_parquet(get_ownership_closure_sql(ownership_fact_path),
+                                  Path(closure_output_path) / "ownership_closure.parquet"),
+        'rollup': _write_parquet(get_ownership_rollup_sql(ownership_fact_path),
+                                 Path(rollup_output_path) / "ownership_rollup.parquet"),
+    }
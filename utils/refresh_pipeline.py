@@ -0,0 +1,1630 @@
+"""
+The data refresh as a stage DAG. Each stage declares the stages it depends
+on. Stages whose dependencies are done run concurrently in a bounded thread
+pool, since they spend their time waiting on Postgres or DuckDB.
+
+Completed stages are recorded in a checkpoint file in the landing zone,
+together with the stages the run was asked for. A run that fails stops
+scheduling new stages. The next run over the same stages resumes at the
+failed stage and skips everything already completed; a run over different
+stages starts over. A successful run clears the checkpoint. Selecting a
+stage also runs the derived stages built from it (e.g. monthly_cube after
+country_subsector_level), so the app never reads a stale derived table.
+
+Run from the repo root (credentials come from .env as CLIMATETRACE_*,
+point them at a local Postgres to try a run end to end). The scheduler,
+retries and checkpointing are tested with stub stages in
+utils/test_refresh_pipeline.py.
+
+    python -m utils.refresh_pipeline                    # full refresh, resuming if needed
+    python -m utils.refresh_pipeline --stages gadm_2    # just these stages
+    python -m utils.refresh_pipeline --fresh            # ignore the checkpoint
+    python -m utils.refresh_pipeline --stages country_subsector_level   # new months, then monthly_cube
+    python -m utils.refresh_pipeline --list
+"""
+import argparse
+import duckdb
+import json
+import math
+import os
+import pandas as pd
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from pathlib import Path
+from urllib.parse import quote_plus
+from utils.refresh import (
+    export_query_to_parquet,
+    split_or_move_parquet,
+    write_asset_induced_emissions,
+    write_asset_moer,
+    write_gadm_1_statistics_store,
+    write_monthly_cube,
+    write_monthly_partitions,
+    write_ownership_hierarchy,
+    write_ownership_fact,
+    write_partitioned_dataset,
+    write_reduction_cube,
+    write_sector_reduction_rollup,
+)
+from utils.run_sql import close_pools, pooled_connection
+
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+LANDING_ZONE = "zzz_landing_zone"
+CHECKPOINT_FILE = "refresh_checkpoint.json"
+
+COUNTRY_SUBSECTOR_DIR = "asset_emissions/country_subsector_level"
+COUNTRY_SUBSECTOR_PREFIX = "asset_emissions_country_subsector"
+MANIFEST_FILE = "_manifest.json"
+
+# folders updated in place month by month rather than rebuilt, so the archive
+# copies them instead of moving them out from under the incremental stage
+INCREMENTAL_DATASETS = {COUNTRY_SUBSECTOR_DIR}
+
+
+def postgres_url_from_env():
+
+    user = quote_plus(os.getenv("CLIMATETRACE_USER"))
+    password = quote_plus(os.getenv("CLIMATETRACE_PASS"))
+    host = os.getenv("CLIMATETRACE_HOST")
+    port = os.getenv("CLIMATETRACE_PORT")
+    database = os.getenv("CLIMATETRACE_DB")
+
+    return f"postgresql://{user}:{password}@{host}:{port}/{database}"
+
+
+def _postgres_rows(dsn, sql):
+
+    with pooled_connection(dsn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            return cur.fetchall()
+
+
+def _write_json(path, data):
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    tmp.replace(path)
+
+
+def _postgres_duckdb():
+
+    con = duckdb.connect()
+    con.execute("LOAD postgres;")
+
+    return con
+
+
+def _export_postgres_scan(ctx, select_sql, parquet_name, output_dir):
+
+    parquet_path = ctx['data_dir'] / LANDING_ZONE / parquet_name
+
+    con = _postgres_duckdb()
+    try:
+        con.execute(f"COPY ({select_sql}) TO '{parquet_path}' (FORMAT PARQUET)")
+    finally:
+        con.close()
+
+    split_or_move_parquet(parquet_path, ctx['data_dir'] / output_dir)
+
+
+# ------------------------------------------------------------------------------------------------
+# SQL
+# ------------------------------------------------------------------------------------------------
+
+# the Trends page shows the current year and the three before it
+def country_subsector_window_start(max_date):
+
+    return date(max_date.year - 3, 1, 1)
+
+
+# months: first-of-month dates to export, or None for the whole window. The
+# start_time range is what gets pushed down to Postgres, the IN list trims it
+def country_subsector_level_sql(postgres_url, window_start, months=None):
+
+    month_filter = ""
+    if months:
+        month_list = ", ".join(f"DATE '{m}'" for m in sorted(months))
+        month_filter = f"""
+      AND ae.start_time >= DATE '{min(months)}'
+      AND ae.start_time < DATE '{max(months)}' + INTERVAL 1 MONTH
+      AND date_trunc('month', ae.start_time) IN ({month_list})"""
+
+    return f"""
+    SELECT ae.iso3_country,
+        ae.original_inventory_sector,
+        itm.activity_is_temporal,
+        ae.start_time,
+        ae.gas,
+        sch.sector,
+        ca.name as country_name,
+        ca.continent,
+        ca.unfccc_annex,
+        ca.em_finance,
+        ca.g20,
+        ca.eu,
+        ca.oecd,
+        ca.developed_un,
+        ae.release,
+        sum(emissions_quantity) emissions_quantity,
+        case when activity_is_temporal = true then sum(activity) else avg(activity) end as activity,
+        sum(emissions_quantity) / sum(activity) weighted_average_emissions_factor
+    
+    FROM postgres_scan('{postgres_url}', 'public', 'asset_emissions') ae
+    LEFT JOIN postgres_scan('{postgres_url}', 'public', 'country_analysis') ca
+        ON CAST(ca.iso3_country AS VARCHAR) = CAST(ae.iso3_country AS VARCHAR)
+    LEFT JOIN (
+        SELECT DISTINCT sector, subsector FROM postgres_scan('{postgres_url}', 'public', 'asset_schema')
+    ) sch
+        ON CAST(sch.subsector AS VARCHAR) = CAST(ae.original_inventory_sector AS VARCHAR)
+    left join postgres_scan('{postgres_url}', 'public', 'is_temporal_map') itm
+        on itm.original_inventory_sector = ae.original_inventory_sector
+    
+    WHERE ae.start_time >= DATE '{window_start}'
+      AND ae.gas in ('co2e_100yr','ch4')
+      AND ae.most_granular = TRUE{month_filter}
+    
+    GROUP BY ae.iso3_country,
+        ae.original_inventory_sector,
+        itm.activity_is_temporal,
+        ae.start_time,
+        ae.gas,
+        sch.sector,
+        ca.name,
+        ca.continent,
+        ca.unfccc_annex,
+        ca.em_finance,
+        ca.g20,
+        ca.eu,
+        ca.oecd,
+        ca.developed_un,
+        ae.release
+    """
+
+
+# runs in Postgres itself, so only one row per month comes back. Same filters
+# as country_subsector_level_sql, the sums tell whether a month was revised
+def country_subsector_month_stats_sql(window_start):
+
+    return f"""
+    SELECT date_trunc('month', start_time)::date AS month,
+        max(release) AS release,
+        count(*) AS rows,
+        sum(emissions_quantity)::float8 AS emissions_quantity,
+        sum(activity)::float8 AS activity
+    FROM asset_emissions
+    WHERE start_time >= DATE '{window_start}'
+      AND gas in ('co2e_100yr','ch4')
+      AND most_granular = TRUE
+    GROUP BY 1
+    ORDER BY 1
+    """
+
+# CURRENTLY USING DATA FUSION TABLES, NEEDS TO BE CHANGED BACK WHEN READY
+def asset_annual_sql():
+
+    return '''
+
+		select extract(year from ae.start_time) as year
+			, cast(ae.asset_id as text) as asset_id
+			, ai.asset_type
+			, CASE 
+					WHEN ae.original_inventory_sector = 'iron-and-steel' AND ai.asset_type LIKE '%BF%' 
+						THEN '{''iron-and-steel'': [''BF'', ''DRI-EAF'']}'
+					WHEN ae.original_inventory_sector = 'aluminum' AND ai.asset_type LIKE '%Refinery%' 
+						THEN '{''aluminum'': [''Refinery'']}'
+					WHEN ae.original_inventory_sector = 'aluminum' AND ai.asset_type LIKE '%Smelting%' 
+						THEN '{''aluminum'': [''Smelting'']}'
+					ELSE 'all' 
+				END AS asset_type_2
+			, ai.asset_name
+			, ae.iso3_country
+			, ca.name as country_name
+			, abc.region balancing_authority_region
+			, ca.continent
+			, ca.eu
+			, ca.oecd
+			, ca.unfccc_annex
+			, ca.developed_un
+			, ca.em_finance
+            , ca.g20
+			, asch.sector
+			, ae.original_inventory_sector as subsector
+            , itm.capacity_is_temporal
+			, itm.activity_is_temporal
+			, ST_AsText(al.location) as lat_lon
+			, al.gadm_1
+			, al.gadm_2
+            , ae.most_granular
+			, al.ghs_fua
+			, al.city_id
+			, ae.other1
+			, ae.other2
+			, ae.other3
+			, ae.other4
+			, ae.other5
+			, ae.other6
+			, ae.other7
+			, ae.other8
+			, ae.other9
+			, ae.other10
+			, ae.activity_units
+			, case when capacity_is_temporal = true then sum(capacity) else avg(capacity) end as capacity
+			, case when activity_is_temporal = true then sum(activity) else avg(activity) end as activity
+			, avg(emissions_factor) average_emissions_factor
+			, sum(emissions_quantity) emissions_quantity
+			, 'asset' as reduction_q_type
+			, ers.strategy_id
+			, ers.strategy_name
+			, ers.strategy_description
+			, ers.mechanism
+			, ers.old_activity
+			, ers.affected_activity
+			, ers.old_emissions_factor
+			, ers.new_emissions_factor
+			, ers.emissions_reduced_at_asset
+			, ers.induced_sector_1
+			, ers.induced_sector_1_induced_emissions
+			, ers.induced_sector_2
+			, ers.induced_sector_2_induced_emissions
+			, ers.induced_sector_3
+			, ers.induced_sector_3_induced_emissions
+			, ers.total_emissions_reduced_per_year
+            , ers.feasibility
+            , ers.feasibility_score
+            , ers.cost
+            , ers.cost_score
+            , ers.asset_rf_score
+            , ers.asset_difficulty_score
+
+		from public.asset_emissions_data_fusion ae
+		left join public.asset_information_data_fusion ai
+			on ai.asset_id = ae.asset_id
+		left join public.asset_location_data_fusion al
+			on al.asset_id = ae.asset_id
+		left join (
+			select distinct sector, subsector from public.asset_schema
+		) asch
+			on cast(asch.subsector as varchar) = cast(ae.original_inventory_sector as varchar)
+		left join public.country_analysis ca
+			on cast(ca.iso3_country as varchar) = cast(ae.iso3_country as varchar)
+		left join public.asset_ba_crosswalk abc
+			on cast(abc.asset_id as text) = cast(ae.asset_id as text)
+		left join (
+			select rdf.* 
+			from public.reductions_data_fusion rdf
+			where strategy_rank = 1
+				and rdf.gas = 'co2e_100yr'
+		) ers
+			on ers.asset_id = ae.asset_id
+		left join public.is_temporal_map itm
+			on cast(itm.original_inventory_sector as text) = cast(ae.original_inventory_sector as text)
+
+		where extract(year from ae.start_time) = 2024
+			and ae.gas = 'co2e_100yr'
+
+		group by extract(year from ae.start_time)
+			, ae.asset_id
+			, ai.asset_type
+			, CASE 
+					WHEN ae.original_inventory_sector = 'iron-and-steel' AND ai.asset_type LIKE '%BF%' 
+						THEN '{''iron-and-steel'': [''BF'', ''DRI-EAF'']}'
+					WHEN ae.original_inventory_sector = 'aluminum' AND ai.asset_type LIKE '%Refinery%' 
+						THEN '{''aluminum'': [''Refinery'']}'
+					WHEN ae.original_inventory_sector = 'aluminum' AND ai.asset_type LIKE '%Smelting%' 
+						THEN '{''aluminum'': [''Smelting'']}'
+					ELSE 'all' 
+				END
+			, ai.asset_name
+			, ae.iso3_country
+			, ca.name
+			, abc.region
+			, ca.continent
+			, ca.eu
+			, ca.oecd
+			, ca.unfccc_annex
+			, ca.developed_un
+			, ca.em_finance
+            , ca.g20
+			, asch.sector
+			, ae.original_inventory_sector
+            , itm.capacity_is_temporal
+			, itm.activity_is_temporal
+			, ST_AsText(al.location)
+			, al.gadm_1
+			, al.gadm_2
+            , ae.most_granular
+			, al.ghs_fua
+			, al.city_id
+			, ae.other1
+			, ae.other2
+			, ae.other3
+			, ae.other4
+			, ae.other5
+			, ae.other6
+			, ae.other7
+			, ae.other8
+			, ae.other9
+			, ae.other10
+			, ae.activity_units
+			, ers.strategy_id
+			, ers.strategy_name
+			, ers.strategy_description
+			, ers.mechanism
+			, ers.old_activity
+			, ers.affected_activity
+			, ers.old_emissions_factor
+			, ers.new_emissions_factor
+			, ers.emissions_reduced_at_asset
+			, ers.induced_sector_1
+			, ers.induced_sector_1_induced_emissions
+			, ers.induced_sector_2
+			, ers.induced_sector_2_induced_emissions
+			, ers.induced_sector_3
+			, ers.induced_sector_3_induced_emissions
+			, ers.total_emissions_reduced_per_year
+            , ers.feasibility
+            , ers.feasibility_score
+            , ers.cost
+            , ers.cost_score
+            , ers.asset_rf_score
+            , ers.asset_difficulty_score
+			
+			UNION ALL
+			
+			SELECT 
+				2024 AS year,
+				asset_id,
+				gr.asset_type,
+				NULL AS asset_type_2,
+				gr.asset_name,
+				ca.iso3_country,
+				ca.name AS country_name,
+				NULL AS balancing_authority_region,
+				ca.continent,
+				ca.eu,
+				ca.oecd,
+				ca.unfccc_annex,
+				ca.developed_un,
+				ca.em_finance,
+                ca.g20,
+				asch.sector,
+				gr.original_inventory_sector AS subsector,
+                itm.capacity_is_temporal,
+				itm.activity_is_temporal,
+				null as lat_lon,
+				CASE 
+					WHEN gb.admin_level = 1 THEN gb.gadm_id
+					WHEN gb.admin_level = 2 THEN gb.immediate_parent 
+					ELSE NULL 
+				END AS gadm_1,
+				CASE 
+					WHEN gb.admin_level = 2 THEN gb.gadm_id 
+					ELSE NULL 
+				END AS gadm_2,
+                true AS most_granular,
+				NULL AS ghs_fua,
+				NULL AS city_id,
+				NULL AS other1,
+				NULL AS other2,
+				NULL AS other3,
+				NULL AS other4,
+				NULL AS other5,
+				NULL AS other6,
+				NULL AS other7,
+				NULL AS other8,
+				NULL AS other9,
+				NULL AS other10,
+				NULL AS activity_units,
+				0 AS capacity,
+				0 AS activity,
+				0 AS average_emissions_factor,
+				0 AS emissions_quantity,
+				'remainder' AS reduction_q_type,
+				gr.strategy_id,
+				gr.strategy_name,
+				gr.strategy_description,
+				gr.mechanism,
+				gr.old_activity,
+				gr.affected_activity,
+				gr.old_emissions_factor,
+				gr.new_emissions_factor,
+				gr.emissions_reduced_at_asset,
+				gr.induced_sector_1,
+				gr.induced_sector_1_induced_emissions,
+				gr.induced_sector_2,
+				gr.induced_sector_2_induced_emissions,
+				gr.induced_sector_3,
+				gr.induced_sector_3_induced_emissions,
+				gr.total_emissions_reduced_per_year,
+                null as feasibility,
+				null as feasibility_score,
+				null as cost,
+				null as cost_score,
+				null as asset_rf_score,
+				null as asset_difficulty_score
+			
+			FROM public.gadm_reductions_data_fusion gr
+			LEFT JOIN (
+				select distinct sector, subsector from public.asset_schema
+			) asch
+				on cast(asch.subsector as varchar) = cast(gr.original_inventory_sector as varchar)
+			LEFT JOIN (
+				select distinct gadm_id, iso3_country, admin_level, immediate_parent
+				from public.gadm_boundaries
+			) gb
+				on gb.gadm_id = gr.asset_id
+			LEFT JOIN public.country_analysis ca
+				on ca.iso3_country = gb.iso3_country
+			LEFT JOIN public.is_temporal_map itm
+				on cast(itm.original_inventory_sector as text) = cast(gr.original_inventory_sector as text)
+				
+			WHERE gr.strategy_rank = 1
+				and gr.gas = 'co2e_100yr'
+                and total_emissions_reduced_per_year > 0
+                
+            UNION ALL
+
+            SELECT 
+				2024 AS year,
+				asset_id,
+				cr.asset_type,
+				NULL AS asset_type_2,
+				cr.asset_name,
+				ca.iso3_country,
+				ca.name AS country_name,
+				NULL AS balancing_authority_region,
+				ca.continent,
+				ca.eu,
+				ca.oecd,
+				ca.unfccc_annex,
+				ca.developed_un,
+				ca.em_finance,
+                ca.g20,
+				asch.sector,
+				cr.original_inventory_sector AS subsector,
+                itm.capacity_is_temporal,
+				itm.activity_is_temporal,
+				null as lat_lon,
+				null AS gadm_1,
+				NULL AS gadm_2,
+                false AS most_granular,
+				array[cr.asset_id] AS ghs_fua,
+				cr.asset_id AS city_id,
+				NULL AS other1,
+				NULL AS other2,
+				NULL AS other3,
+				NULL AS other4,
+				NULL AS other5,
+				NULL AS other6,
+				NULL AS other7,
+				NULL AS other8,
+				NULL AS other9,
+				NULL AS other10,
+				NULL AS activity_units,
+				0 AS capacity,
+				0 AS activity,
+				0 AS average_emissions_factor,
+				0 AS emissions_quantity,
+				'remainder' AS reduction_q_type,
+				cr.strategy_id,
+				cr.strategy_name,
+				cr.strategy_description,
+				cr.mechanism,
+				cr.old_activity,
+				cr.affected_activity,
+				cr.old_emissions_factor,
+				cr.new_emissions_factor,
+				cr.emissions_reduced_at_asset,
+				cr.induced_sector_1,
+				cr.induced_sector_1_induced_emissions,
+				cr.induced_sector_2,
+				cr.induced_sector_2_induced_emissions,
+				cr.induced_sector_3,
+				cr.induced_sector_3_induced_emissions,
+				cr.total_emissions_reduced_per_year,
+                null as feasibility,
+				null as feasibility_score,
+				null as cost,
+				null as cost_score,
+				null as asset_rf_score,
+				null as asset_difficulty_score
+			
+			FROM public.city_reductions_data_fusion cr
+			LEFT JOIN (
+				select distinct sector, subsector from public.asset_schema
+			) asch
+				on cast(asch.subsector as varchar) = cast(cr.original_inventory_sector as varchar)
+
+            ------ CHANGE THIS JOIN AHHHHHHH ------    
+			LEFT JOIN (
+				select distinct city_id, iso3_country
+				from public.city_boundaries
+			) cb
+				on cb.city_id = cr.asset_id
+                
+            
+			LEFT JOIN public.country_analysis ca
+				on ca.iso3_country = cb.iso3_country
+			LEFT JOIN public.is_temporal_map itm
+				on cast(itm.original_inventory_sector as text) = cast(cr.original_inventory_sector as text)
+				
+			WHERE cr.strategy_rank = 1
+				and cr.gas = 'co2e_100yr'
+                and total_emissions_reduced_per_year > 0
+                and asset_id not like '%_EXT'
+    '''
+
+
+def asset_aggregated_sql(moer_path):
+
+    return f'''
+            select year
+                , asset_id
+                , asset_type
+                , asset_type_2
+                , asset_name
+                , iso3_country
+                , country_name
+                , balancing_authority_region
+                , continent
+                , eu
+                , oecd
+                , unfccc_annex
+                , developed_un
+                , em_finance
+                , g20
+                , sector
+                , subsector
+                , capacity_is_temporal
+                , activity_is_temporal
+                , lat_lon
+                , gadm_1
+                , gadm_2
+                , most_granular
+                , ghs_fua
+                , city_id
+                , activity_units
+                , case when capacity_is_temporal = true then sum(capacity) else avg(capacity) end as capacity
+                , case when activity_is_temporal = true then sum(activity) else avg(activity) end as activity
+                , avg(average_emissions_factor) average_emissions_factor
+                , sum(emissions_quantity) emissions_quantity
+                , reduction_q_type
+                , strategy_id
+                , strategy_name
+                , strategy_description
+                , mechanism
+                , old_activity
+                , affected_activity
+                , old_emissions_factor
+                , new_emissions_factor
+                , emissions_reduced_at_asset
+                , induced_sector_1
+                , induced_sector_1_induced_emissions
+                , induced_sector_2
+                , induced_sector_2_induced_emissions
+                , induced_sector_3
+                , induced_sector_3_induced_emissions
+                , total_emissions_reduced_per_year
+                , feasibility
+                , feasibility_score
+                , cost
+                , cost_score
+                , asset_rf_score
+                , asset_difficulty_score
+                , avg(ef_moer) ef_moer
+                , sum(eq_12) eq_12
+                , avg(ef_12) ef_12
+                , sum(eq_12_moer) eq_12_moer
+                , avg(ef_12_moer) ef_12_moer
+                
+            from '{moer_path}'
+
+            group by year
+                , asset_id
+                , asset_type
+                , asset_type_2
+                , asset_name
+                , iso3_country
+                , country_name
+                , balancing_authority_region
+                , continent
+                , eu
+                , oecd
+                , unfccc_annex
+                , developed_un
+                , em_finance
+                , g20
+                , sector
+                , subsector
+                , capacity_is_temporal
+                , activity_is_temporal
+                , lat_lon
+                , gadm_1
+                , gadm_2
+                , most_granular
+                , ghs_fua
+                , city_id
+                , activity_units
+                , reduction_q_type
+                , strategy_id
+                , strategy_name
+                , strategy_description
+                , mechanism
+                , old_activity
+                , affected_activity
+                , old_emissions_factor
+                , new_emissions_factor
+                , emissions_reduced_at_asset
+                , induced_sector_1
+                , induced_sector_1_induced_emissions
+                , induced_sector_2
+                , induced_sector_2_induced_emissions
+                , induced_sector_3
+                , induced_sector_3_induced_emissions
+                , total_emissions_reduced_per_year
+                , feasibility
+                , feasibility_score
+                , cost
+                , cost_score
+                , asset_rf_score
+                , asset_difficulty_score
+    '''
+
+
+def gadm_0_sql(postgres_url):
+
+    return f'''
+    select extract(year from g0e.start_time) as year 
+        , g0e.gadm_id
+        , gb.gid
+        , gb.admin_level
+        , g0e.iso3_country
+        , ca.name as country_name
+        , gb.name gadm_0_name
+        , gb.corrected_name gadm_0_corrected_name
+        , ca.continent
+        , ca.eu
+        , ca.oecd
+        , ca.unfccc_annex
+        , ca.developed_un
+        , ca.em_finance
+        , ca.g20
+        , asch.sector
+        , g0e.original_inventory_sector subsector
+        , itm.activity_is_temporal
+        , g0e.gas
+        , case when activity_is_temporal = true then sum(asset_activity) else avg(asset_activity) end as asset_activity
+        , sum(asset_emissions) asset_emissions
+        , case when activity_is_temporal = true then sum(remainder_activity) else avg(remainder_activity) end as remainder_activity
+        , sum(remainder_emissions) remainder_emissions
+        , sum(asset_emissions) + sum(remainder_emissions) as emissions_quantity
+
+    from postgres_scan('{postgres_url}', 'public', 'gadm_0_emissions') g0e
+    left join (
+        select distinct gadm_id
+            , gid
+            , name
+            , corrected_name
+            , admin_level
+        from postgres_scan('{postgres_url}','public', 'gadm_boundaries') 
+        where admin_level = 0
+    ) as gb
+        on g0e.gadm_id = gb.gadm_id
+    left join (
+        select distinct sector
+            , subsector
+        from postgres_scan('{postgres_url}','public', 'asset_schema') 
+    ) asch
+        on cast(asch.subsector as varchar) = cast(g0e.original_inventory_sector as varchar)
+    left join postgres_scan('{postgres_url}','public', 'country_analysis') ca
+		on cast(ca.iso3_country as varchar) = cast(g0e.iso3_country as varchar)
+    left join postgres_scan('{postgres_url}', 'public', 'is_temporal_map') itm
+         on itm.original_inventory_sector = g0e.original_inventory_sector
+
+    where g0e.gas = 'co2e_100yr'
+        and extract(year from start_time) = 2024
+        
+    group by extract(year from g0e.start_time) 
+        , g0e.gadm_id
+        , gb.gid
+        , gb.admin_level
+        , g0e.iso3_country
+        , ca.name
+        , gb.name 
+        , gb.corrected_name
+        , ca.continent
+        , ca.eu
+        , ca.oecd
+        , ca.unfccc_annex
+        , ca.developed_un
+        , ca.em_finance
+        , ca.g20
+        , asch.sector
+        , g0e.original_inventory_sector
+        , itm.activity_is_temporal
+        , g0e.gas
+    '''
+
+
+def gadm_1_sql(postgres_url):
+
+    return f'''
+    select extract(year from g1e.start_time) as year 
+        , g1e.gadm_id
+        , gb.gid
+        , gb.admin_level
+        , g1e.iso3_country
+        , ca.name as country_name
+        , gb.name gadm_1_name
+        , gb.corrected_name gadm_1_corrected_name
+        , ca.continent
+        , ca.eu
+        , ca.oecd
+        , ca.unfccc_annex
+        , ca.developed_un
+        , ca.em_finance
+        , ca.g20
+        , asch.sector
+        , g1e.original_inventory_sector subsector
+        , itm.activity_is_temporal
+        , g1e.gas
+        , case when activity_is_temporal = true then sum(asset_activity) else avg(asset_activity) end as asset_activity
+        , sum(asset_emissions) asset_emissions
+        , case when activity_is_temporal = true then sum(remainder_activity) else avg(remainder_activity) end as remainder_activity
+        , sum(remainder_emissions) remainder_emissions
+        , sum(asset_emissions) + sum(remainder_emissions) as emissions_quantity
+
+    from postgres_scan('{postgres_url}', 'public', 'gadm_1_emissions') g1e
+    left join (
+        select distinct gadm_id
+            , gid
+            , name
+            , corrected_name
+            , admin_level
+        from postgres_scan('{postgres_url}','public', 'gadm_boundaries') 
+        where admin_level = 1
+    ) as gb
+        on g1e.gadm_id = gb.gadm_id
+    left join (
+        select distinct sector
+            , subsector
+        from postgres_scan('{postgres_url}','public', 'asset_schema') 
+    ) asch
+        on cast(asch.subsector as varchar) = cast(g1e.original_inventory_sector as varchar)
+    left join postgres_scan('{postgres_url}','public', 'country_analysis') ca
+		on cast(ca.iso3_country as varchar) = cast(g1e.iso3_country as varchar)
+    left join postgres_scan('{postgres_url}', 'public', 'is_temporal_map') itm
+         on itm.original_inventory_sector = g1e.original_inventory_sector
+
+    where g1e.gas = 'co2e_100yr'
+        and extract(year from start_time) = 2024
+        
+
+    group by extract(year from g1e.start_time) 
+        , g1e.gadm_id
+        , gb.gid
+        , gb.admin_level
+        , g1e.iso3_country
+        , ca.name
+        , gb.name 
+        , gb.corrected_name
+        , ca.continent
+        , ca.eu
+        , ca.oecd
+        , ca.unfccc_annex
+        , ca.developed_un
+        , ca.em_finance
+        , ca.g20
+        , asch.sector
+        , g1e.original_inventory_sector
+        , itm.activity_is_temporal
+        , g1e.gas
+    '''
+
+
+def gadm_2_sql():
+
+    return """
+     select extract(year from ge.start_time) as year 
+        , gb1.gadm_id gadm_1_id
+        , gb1.name gadm_1_name
+        , gb1.corrected_name gadm_1_corrected_name
+        , ge.gadm_id gadm_2_id
+        , gb2.name gadm_2_name
+        , gb2.corrected_name gadm_2_corrected_name
+        , gb2.gid
+        , gb2.admin_level
+        , ge.iso3_country
+        , ca.name as country_name
+        , ca.continent
+        , ca.eu
+        , ca.oecd
+        , ca.unfccc_annex
+        , ca.developed_un
+        , ca.em_finance
+        , ca.g20
+        , asch.sector
+        , ge.original_inventory_sector subsector
+        , itm.activity_is_temporal
+        , case when activity_is_temporal = true then sum(asset_activity) else avg(asset_activity) end as asset_activity
+        , sum(asset_emissions) asset_emissions
+        , case when activity_is_temporal = true then sum(remainder_activity) else avg(remainder_activity) end as remainder_activity
+        , sum(remainder_emissions) remainder_emissions
+        , sum(asset_emissions) + sum(remainder_emissions) as emissions_quantity
+
+    from gadm_emissions ge
+    inner join (
+        select distinct gadm_id
+            , gid
+            , immediate_parent
+            , name
+            , corrected_name
+            , admin_level
+        from gadm_boundaries
+        where admin_level = 2
+    ) as gb2
+        on ge.gadm_id = gb2.gadm_id
+    left join (
+        select distinct sector
+            , subsector
+        from asset_schema
+    ) asch
+        on cast(asch.subsector as varchar) = cast(ge.original_inventory_sector as varchar)
+    left join (
+        select gadm_id
+            , name
+            , corrected_name
+        from gadm_boundaries
+        where admin_level = 1
+    ) gb1
+        on gb1.gadm_id = gb2.immediate_parent
+    left join country_analysis ca
+        on cast(ca.iso3_country as varchar) = cast(ge.iso3_country as varchar)
+    left join is_temporal_map itm
+        on itm.original_inventory_sector = cast(ge.original_inventory_sector as text)
+
+    where ge.gas = 'co2e_100yr'
+        and extract(year from start_time) = 2024
+
+
+    group by extract(year from ge.start_time)
+        , gb1.gadm_id 
+        , gb1.name
+        , gb1.corrected_name
+        , ge.gadm_id 
+        , gb2.name
+        , gb2.corrected_name
+        , gb2.gid
+        , gb2.admin_level
+        , ge.iso3_country
+        , ca.name
+        , ca.continent
+        , ca.eu
+        , ca.oecd
+        , ca.unfccc_annex
+        , ca.developed_un
+        , ca.em_finance
+        , ca.g20
+        , asch.sector
+        , ge.original_inventory_sector
+        , itm.activity_is_temporal
+    """
+
+
+def city_sql(postgres_url):
+
+    return f'''
+    
+	select extract(year from start_time) as year
+		, ce.city_id
+		, cb.name as city_name
+		, cb.corrected_name as corrected_name
+		, ce.iso3_country
+		, ca.name as country_name
+        , ca.continent
+        , ca.eu
+        , ca.oecd
+        , ca.unfccc_annex
+        , ca.developed_un
+        , ca.em_finance
+        , ca.g20
+		, asch.sector
+		, ce.original_inventory_sector as subsector
+        , itm.activity_is_temporal
+		, case when activity_is_temporal = true then sum(asset_activity) else avg(asset_activity) end as asset_activity
+		, sum(asset_emissions) asset_emissions
+		, case when activity_is_temporal = true then sum(remainder_activity) else avg(remainder_activity) end as remainder_activity
+		, sum(remainder_emissions) remainder_emissions
+		, sum(asset_emissions) + sum(remainder_emissions) as emissions_quantity
+
+	from postgres_scan('{postgres_url}','public', 'city_emissions') ce
+	left join postgres_scan('{postgres_url}','public', 'city_boundaries') cb
+		on cb.city_id = ce.city_id
+        and cb.reporting_entity = 'ghs-fua'
+	left join (
+		select distinct sector, subsector
+		from postgres_scan('{postgres_url}','public', 'asset_schema')
+	) asch
+		on cast(asch.subsector as varchar) = cast(ce.original_inventory_sector as varchar)
+	left join postgres_scan('{postgres_url}','public', 'country_analysis') ca
+		on cast(ca.iso3_country as varchar) = cast(ce.iso3_country as varchar)
+    left join postgres_scan('{postgres_url}', 'public', 'is_temporal_map') itm
+         on itm.original_inventory_sector = ce.original_inventory_sector
+
+	where extract(year from ce.start_time) = 2024
+		and ce.gas = 'co2e_100yr'
+        and cb.city_id is not null
+
+	group by extract(year from start_time) 
+		, ce.city_id
+		, cb.name 
+		, cb.corrected_name 
+		, ce.iso3_country
+		, ca.name 
+        , ca.continent
+        , ca.eu
+        , ca.oecd
+        , ca.unfccc_annex
+        , ca.developed_un
+        , ca.em_finance
+        , ca.g20
+		, asch.sector
+		, ce.original_inventory_sector
+        , itm.activity_is_temporal
+    '''
+
+
+def ownership_sql(postgres_url):
+
+    return f'''
+            
+    SELECT *
+    FROM postgres_scan('{postgres_url}','public', 'asset_ownership')
+    '''
+
+
+def demographic_sql(postgres_url):
+
+    return f'''
+            
+    select *
+    from postgres_scan('{postgres_url}', 'public', 'demographic_data')
+    where version = 'global_pop_2024_CN_1km_R2024B_UA_v1'
+    '''
+
+
+# ------------------------------------------------------------------------------------------------
+# Stages
+# ------------------------------------------------------------------------------------------------
+
+def archive_parquets(ctx, archive_folder_name='zzz_archive'):
+
+    """
+    Recursively finds ALL .parquet files under /data (at any depth),
+    excluding certain root-level folders, and moves them to zzz_archive.
+    Files are moved into a staging folder first and the previous archive is
+    only replaced once everything is moved, so a retry after a failure
+    carries on where it stopped instead of deleting the previous release.
+    """
+
+    data_dir = ctx['data_dir']
+    archive_dir = data_dir / archive_folder_name
+    staging_dir = data_dir / f"{archive_folder_name}_staging"
+
+    # Root-level folders/files to ignore
+    ignore_list = {
+        'percentile_moer',
+        'raw_csvs',
+        'strategy',
+        archive_folder_name,
+        staging_dir.name,
+        'zzz_landing_zone',
+        'README.md',
+        'refresh_data.ipynb'
+    }
+
+    # a staging folder left by a failed attempt already holds moved files, keep it
+    staging_dir.mkdir(parents=True, exist_ok=True)
+
+    for parquet_file in data_dir.rglob("*.parquet"):
+
+        # parts[0] is the top-level folder name
+        parts = parquet_file.relative_to(data_dir).parts
+        if parts and parts[0] in ignore_list:
+            continue
+
+        # keep the folder structure, partitioned datasets reuse file names
+        # like data_0.parquet in every partition folder
+        dest = staging_dir / parquet_file.relative_to(data_dir)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        if parquet_file.parent.relative_to(data_dir).as_posix() in INCREMENTAL_DATASETS:
+            shutil.copy2(str(parquet_file), str(dest))
+            print(f"Copied: {parquet_file} → {dest}")
+        else:
+            shutil.move(str(parquet_file), str(dest))
+            print(f"Moved: {parquet_file} → {dest}")
+
+    print(f"Replacing {archive_folder_name}...")
+    if archive_dir.exists():
+        shutil.rmtree(archive_dir)
+    staging_dir.rename(archive_dir)
+
+
+def route_statistics_csvs(ctx):
+
+    """
+    Converts CSVs dropped into data/zzz_landing_zone to parquet and routes
+    them to their statistics folder by file name, splitting large ones.
+    """
+
+    input_dir = ctx['data_dir'] / LANDING_ZONE
+    output_base = ctx['data_dir'] / "statistics"
+
+    routing_map = {
+        "country_subsector_emissions_statistics": "country_subsector_emissions_statistics",
+        "country_subsector_emissions_totals": "country_subsector_emissions_totals",
+        "gadm_1_emissions_statistics": "gadm_1_emissions_statistics"
+    }
+
+    for subfolder in routing_map.values():
+        (output_base / subfolder).mkdir(parents=True, exist_ok=True)
+
+    for csv_file in input_dir.glob("*.csv"):
+        print(f"Converting {csv_file.name}...")
+
+        df = pd.read_csv(csv_file)
+        parquet_file = input_dir / csv_file.with_suffix(".parquet").name
+        df.to_parquet(parquet_file, engine="pyarrow", index=False)
+        csv_file.unlink()
+
+        destination = None
+        for pattern, subfolder in routing_map.items():
+            if pattern in parquet_file.name:
+                destination = output_base / subfolder
+                break
+
+        if destination:
+            split_or_move_parquet(parquet_file, destination)
+        else:
+            print(f"⚠️ No matching subfolder for {parquet_file.name}, skipping.")
+
+
+def _same_total(a, b):
+
+    if a is None or b is None:
+        return a is b
+
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+
+
+def _month_changed(on_disk, source):
+
+    return (
+        on_disk is None
+        or on_disk['source_rows'] != source['source_rows']
+        or not _same_total(on_disk['emissions_quantity'], source['emissions_quantity'])
+        or not _same_total(on_disk['activity'], source['activity'])
+    )
+
+
+def _relabel_release(parquet_file, release):
+
+    tmp_file = parquet_file.with_suffix(".parquet.tmp")
+
+    con = duckdb.connect()
+    try:
+        con.execute(f"""
+            COPY (SELECT * REPLACE (?::VARCHAR AS release) FROM '{parquet_file}')
+            TO '{tmp_file}' (FORMAT PARQUET)
+        """, [release])
+    finally:
+        con.close()
+
+    tmp_file.replace(parquet_file)
+
+
+def export_country_subsector_level(ctx):
+
+    """
+    Keeps asset_emissions/country_subsector_level as one parquet file per month
+    and only re-exports the months that are new or were revised. Per-month row
+    counts and totals, computed inside Postgres, are compared with the
+    _manifest.json written by the previous run. Months that are unchanged
+    apart from the release label are relabelled locally. Months that left the
+    window are deleted. Without a manifest, or with full_refresh set in ctx,
+    the whole window is rebuilt.
+    """
+
+    output_dir = ctx['data_dir'] / COUNTRY_SUBSECTOR_DIR
+    manifest_path = output_dir / MANIFEST_FILE
+
+    manifest = None
+    if manifest_path.exists() and not ctx.get('full_refresh'):
+        manifest = json.loads(manifest_path.read_text())
+
+    max_date = _postgres_rows(ctx['postgres_url'], "SELECT max(start_time) FROM asset_emissions")[0][0]
+    if max_date is None:
+        raise Exception("asset_emissions is empty.")
+
+    window_start = country_subsector_window_start(max_date)
+    source = {
+        f"{month:%Y-%m}": {
+            'release': release,
+            'source_rows': rows,
+            'emissions_quantity': emissions_quantity,
+            'activity': activity,
+        }
+        for month, release, rows, emissions_quantity, activity
+        in _postgres_rows(ctx['postgres_url'], country_subsector_month_stats_sql(window_start))
+    }
+
+    if manifest is None:
+        print("No manifest, rebuilding every month...")
+        for f in output_dir.glob("*.parquet"):
+            f.unlink()
+        on_disk = {}
+    else:
+        on_disk = manifest['months']
+
+    changed = [m for m in source if _month_changed(on_disk.get(m), source[m])]
+    relabel = [m for m in source if m not in changed and on_disk[m]['release'] != source[m]['release']]
+    dropped = [m for m in on_disk if m not in source]
+
+    print(
+        f"Source through {max_date:%Y-%m}: {len(changed)} month(s) to export, "
+        f"{len(relabel)} to relabel, {len(dropped)} to drop, "
+        f"{len(source) - len(changed) - len(relabel)} unchanged"
+    )
+
+    def month_file(month):
+        return output_dir / f"{COUNTRY_SUBSECTOR_PREFIX}_{month.replace('-', '_')}.parquet"
+
+    if changed:
+        months = [date.fromisoformat(f"{m}-01") for m in changed]
+        parquet_path = ctx['data_dir'] / LANDING_ZONE / f"{COUNTRY_SUBSECTOR_PREFIX}.parquet"
+
+        con = _postgres_duckdb()
+        try:
+            sql = country_subsector_level_sql(ctx['postgres_url'], window_start, None if manifest is None else months)
+            con.execute(f"COPY ({sql}) TO '{parquet_path}' (FORMAT PARQUET)")
+        finally:
+            con.close()
+
+        write_monthly_partitions(parquet_path, output_dir, months, COUNTRY_SUBSECTOR_PREFIX)
+        parquet_path.unlink()
+
+    for m in relabel:
+        _relabel_release(month_file(m), source[m]['release'])
+        print(f"  - Relabelled {month_file(m).name} as {source[m]['release']}")
+
+    for m in dropped:
+        month_file(m).unlink(missing_ok=True)
+        print(f"  - Dropped {month_file(m).name}")
+
+    _write_json(manifest_path, {
+        'max_month': f"{max_date:%Y-%m}",
+        'window_start': window_start.isoformat(),
+        'updated_at': datetime.now().isoformat(timespec='seconds'),
+        'months': source,
+    })
+
+
+def export_asset_annual(ctx):
+
+    # streamed to parquet in batches through a server-side cursor
+    export_query_to_parquet(
+        ctx['postgres_url'],
+        asset_annual_sql(),
+        ctx['data_dir'] / LANDING_ZONE / "asset_annual_emissions.parquet"
+    )
+
+
+def add_asset_moer(ctx):
+
+    landing_zone = ctx['data_dir'] / LANDING_ZONE
+    parquet_path = landing_zone / "asset_annual_emissions.parquet"
+
+    write_asset_moer(
+        parquet_path,
+        ctx['data_dir'] / "percentile_moer/asset_moer_2023.parquet",
+        landing_zone / "asset_annual_emissions_moer.parquet",
+        temp_directory=landing_zone / "duckdb_tmp"
+    )
+
+    parquet_path.unlink()
+
+
+def write_asset_level(ctx):
+
+    landing_zone = ctx['data_dir'] / LANDING_ZONE
+    moer_path = landing_zone / "asset_annual_emissions_moer.parquet"
+    agg_path = landing_zone / "asset_aggregated.parquet"
+
+    con = duckdb.connect()
+    try:
+        con.execute(f"COPY ({asset_aggregated_sql(moer_path)}) TO '{agg_path}' (FORMAT PARQUET)")
+    finally:
+        con.close()
+
+    # hive-partitioned by sector/subsector and sorted by country/state within each partition,
+    # so the app's subsector and geography filters only read the files/row groups they need
+    write_partitioned_dataset(agg_path, ctx['data_dir'] / "asset_emissions/asset_level_2024")
+
+    agg_path.unlink()
+    moer_path.unlink()
+
+
+def write_induced_emissions(ctx):
+
+    write_asset_induced_emissions(
+        ctx['data_dir'] / "asset_emissions/asset_level_2024/**/*.parquet",
+        ctx['data_dir'] / "asset_emissions/asset_induced_emissions"
+    )
+
+
+def write_reduction_rollup(ctx):
+
+    data_dir = ctx['data_dir']
+    landing_zone = data_dir / LANDING_ZONE
+    rollup_dir = data_dir / "asset_emissions/sector_reduction_rollup"
+
+    for f in rollup_dir.glob("*.parquet"):
+        f.unlink()
+
+    write_sector_reduction_rollup(
+        data_dir / "asset_emissions/asset_level_2024/**/*.parquet",
+        data_dir / "asset_emissions/asset_induced_emissions/*.parquet",
+        landing_zone
+    )
+
+    # one row per asset and grain cell, so it can outgrow a single file
+    split_or_move_parquet(landing_zone / "sector_reduction_rollup.parquet", rollup_dir)
+
+
+def write_heatmap_cube(ctx):
+
+    data_dir = ctx['data_dir']
+    cube_dir = data_dir / "asset_emissions/reduction_cube"
+
+    for f in cube_dir.glob("*.parquet"):
+        f.unlink()
+
+    row_count = write_reduction_cube(
+        data_dir / "asset_emissions/asset_level_2024/**/*.parquet",
+        data_dir / "gadm_emissions/gadm_1/*.parquet",
+        data_dir / "gadm_emissions/gadm_2/*.parquet",
+        cube_dir
+    )
+    print(f"Reduction cube: {row_count} rows")
+
+
+def write_trends_cube(ctx):
+
+    data_dir = ctx['data_dir']
+    cube_dir = data_dir / "asset_emissions/monthly_cube"
+
+    for f in cube_dir.glob("*.parquet"):
+        f.unlink()
+
+    row_count = write_monthly_cube(
+        data_dir / f"{COUNTRY_SUBSECTOR_DIR}/*.parquet",
+        data_dir / "statistics/country_subsector_emissions_totals/*.parquet",
+        cube_dir
+    )
+    print(f"Monthly cube: {row_count} rows")
+
+
+def write_gadm_1_store(ctx):
+
+    data_dir = ctx['data_dir']
+    store_dir = data_dir / "statistics/gadm_1_emissions_statistics_store"
+
+    for f in store_dir.glob("*.parquet"):
+        f.unlink()
+
+    row_count = write_gadm_1_statistics_store(
+        data_dir / "statistics/gadm_1_emissions_statistics/*.parquet",
+        store_dir
+    )
+    print(f"gadm_1 statistics store: {row_count} rows")
+
+
+def export_gadm_0(ctx):
+
+    _export_postgres_scan(ctx, gadm_0_sql(ctx['postgres_url']), "gadm_0_emissions.parquet", "gadm_emissions/gadm_0")
+
+
+def export_gadm_1(ctx):
+
+    _export_postgres_scan(ctx, gadm_1_sql(ctx['postgres_url']), "gadm_1_emissions.parquet", "gadm_emissions/gadm_1")
+
+
+def export_gadm_2(ctx):
+
+    output_file = ctx['data_dir'] / LANDING_ZONE / "gadm_2_emissions.parquet"
+
+    row_count = export_query_to_parquet(ctx['postgres_url'], gadm_2_sql(), output_file, batch_rows=10000)
+    if row_count == 0:
+        raise Exception("No data returned from query.")
+
+    split_or_move_parquet(output_file, ctx['data_dir'] / "gadm_emissions/gadm_2")
+
+
+def export_city(ctx):
+
+    _export_postgres_scan(ctx, city_sql(ctx['postgres_url']), "city_emissions.parquet", "city_emissions")
+
+
+def export_ownership(ctx):
+
+    _export_postgres_scan(ctx, ownership_sql(ctx['postgres_url']), "asset_ownership.parquet", "ownership")
+
+
+def write_ownership_tables(ctx):
+
+    data_dir = ctx['data_dir']
+    landing_zone = data_dir / LANDING_ZONE
+    fact_dir = data_dir / "ownership/ownership_fact"
+
+    for f in fact_dir.glob("*.parquet"):
+        f.unlink()
+
+    row_count = write_ownership_fact(
+        data_dir / "asset_emissions/asset_level_2024/**/*.parquet",
+        data_dir / "ownership/*.parquet",
+        data_dir / "gadm_emissions/gadm_0/*.parquet",
+        landing_zone
+    )
+    print(f"Ownership fact table: {row_count} rows")
+
+    split_or_move_parquet(landing_zone / "ownership_fact.parquet", fact_dir)
+
+
+def write_ownership_rollup(ctx):
+
+    data_dir = ctx['data_dir']
+    closure_dir = data_dir / "ownership/ownership_closure"
+    rollup_dir = data_dir / "ownership/ownership_rollup"
+
+    for f in [*closure_dir.glob("*.parquet"), *rollup_dir.glob("*.parquet")]:
+        f.unlink()
+
+    row_counts = write_ownership_hierarchy(data_dir / "ownership/ownership_fact/*.parquet", closure_dir, rollup_dir)
+    print(f"Ownership closure: {row_counts['closure']} rows, rollup: {row_counts['rollup']} rows")
+
+
+def export_demographic(ctx):
+
+    _export_postgres_scan(ctx, demographic_sql(ctx['postgres_url']), "demographic.parquet", "demographic")
+
+
+# stage name -> function and the stages it needs first, in the order the
+# notebook used to run them. Everything that writes into data/ waits for the
+# archive; the asset annual export only writes to the landing zone.
+# Incremental stages keep their own manifest and run even when resuming.
+# Derived stages rebuild tables the app prefers over their inputs, so a run
+# that selects one of their dependencies runs them too.
+REFRESH_STAGES = {
+    'archive': {'run': archive_parquets, 'deps': [], 'postgres': False},
+    'statistics': {'run': route_statistics_csvs, 'deps': ['archive'], 'postgres': False},
+    'country_subsector_level': {'run': export_country_subsector_level, 'deps': ['archive'], 'postgres': True, 'incremental': True},
+    'monthly_cube': {'run': write_trends_cube, 'deps': ['statistics', 'country_subsector_level'], 'postgres': False, 'derived': True},
+    'gadm_1_statistics_store': {'run': write_gadm_1_store, 'deps': ['statistics'], 'postgres': False, 'derived': True},
+    'asset_annual': {'run': export_asset_annual, 'deps': [], 'postgres': True},
+    'asset_moer': {'run': add_asset_moer, 'deps': ['asset_annual'], 'postgres': False},
+    'asset_level': {'run': write_asset_level, 'deps': ['archive', 'asset_moer'], 'postgres': False},
+    'asset_induced_emissions': {'run': write_induced_emissions, 'deps': ['asset_level'], 'postgres': False},
+    'sector_reduction_rollup': {'run': write_reduction_rollup, 'deps': ['asset_induced_emissions'], 'postgres': False},
+    'reduction_cube': {'run': write_heatmap_cube, 'deps': ['asset_level', 'gadm_1', 'gadm_2'], 'postgres': False},
+    'gadm_0': {'run': export_gadm_0, 'deps': ['archive'], 'postgres': True},
+    'gadm_1': {'run': export_gadm_1, 'deps': ['archive'], 'postgres': True},
+    'gadm_2': {'run': export_gadm_2, 'deps': ['archive'], 'postgres': True},
+    'city': {'run': export_city, 'deps': ['archive'], 'postgres': True},
+    'ownership': {'run': export_ownership, 'deps': ['archive'], 'postgres': True},
+    'ownership_fact': {'run': write_ownership_tables, 'deps': ['asset_level', 'ownership', 'gadm_0'], 'postgres': False},
+    'ownership_rollup': {'run': write_ownership_rollup, 'deps': ['ownership_fact'], 'postgres': False},
+    'demographic': {'run': export_demographic, 'deps': ['archive'], 'postgres': True},
+}
+
+
+# ------------------------------------------------------------------------------------------------
+# Runner
+# ------------------------------------------------------------------------------------------------
+
+def _with_derived_stages(selected):
+
+    selected = list(selected)
+
+    while True:
+        derived = [
+            name for name, stage in REFRESH_STAGES.items()
+            if stage.get('derived') and name not in selected and any(d in selected for d in stage['deps'])
+        ]
+        if not derived:
+            return selected
+        selected += derived
+
+
+def _new_checkpoint(stages):
+
+    return {'stages': sorted(stages), 'completed': {}, 'failed': {}}
+
+
+def _load_checkpoint(path, stages):
+
+    if path.exists():
+        checkpoint = json.loads(path.read_text())
+
+        # only a failed run over the same stages is resumed
+        if checkpoint.get('stages') == sorted(stages):
+            return checkpoint
+
+        print(f"Ignoring {path.name}, it was written by a run over other stages", flush=True)
+
+    return _new_checkpoint(stages)
+
+
+def _run_stage(name, ctx, retries, retry_delay):
+
+    for attempt in range(1, retries + 2):
+        start = time.perf_counter()
+        print(f"▶️ [{name}] starting (attempt {attempt})", flush=True)
+
+        try:
+            REFRESH_STAGES[name]['run'](ctx)
+        except Exception as e:
+            print(f"⚠️ [{name}] failed after {time.perf_counter() - start:,.1f}s: {e!r}", flush=True)
+            if attempt > retries:
+                raise
+            time.sleep(retry_delay * attempt)
+        else:
+            seconds = time.perf_counter() - start
+            print(f"✅ [{name}] done in {seconds:,.1f}s", flush=True)
+            return seconds
+
+
+'''
+This runs the refresh stages (all of REFRESH_STAGES, or just `stages`) in
+dependency order, up to max_workers at a time. Dependencies outside `stages`
+are assumed to be in place already. Each stage is retried `retries` times
+with a growing delay. Progress is checkpointed after every stage, so a rerun
+of the same stages after a failure picks up where it stopped unless
+fresh=True; the checkpoint is deleted once every selected stage succeeded.
+Incremental stages (country_subsector_level) are never skipped on resume,
+and only export new or revised months unless full_refresh=True.
+
+Returns: seconds per stage run in this call
+
+Type: dict
+'''
+def run_refresh(postgres_url=None, data_dir=DATA_DIR, stages=None, max_workers=3, retries=2, retry_delay=30, fresh=False, full_refresh=False):
+
+    data_dir = Path(data_dir)
+    selected = list(stages or REFRESH_STAGES)
+    unknown = [s for s in selected if s not in REFRESH_STAGES]
+    if unknown:
+        raise ValueError(f"Unknown refresh stages: {unknown}")
+
+    # e.g. new country_subsector_level months also have to reach the monthly cube
+    pulled_in = [s for s in _with_derived_stages(selected) if s not in selected]
+    if pulled_in:
+        print(f"Also running the stages built from the selection: {', '.join(pulled_in)}", flush=True)
+        selected += pulled_in
+
+    checkpoint_path = data_dir / LANDING_ZONE / CHECKPOINT_FILE
+    checkpoint = _new_checkpoint(selected) if fresh else _load_checkpoint(checkpoint_path, selected)
+
+    # incremental stages compare against their own manifest, so they always run
+    done = {s for s in selected if s in checkpoint['completed'] and not REFRESH_STAGES[s].get('incremental')}
+    pending = [s for s in selected if s not in done]
+    deps = {s: [d for d in REFRESH_STAGES[s]['deps'] if d in selected] for s in pending}
+
+    if done:
+        print(f"Resuming, already completed: {', '.join(sorted(done))}", flush=True)
+
+    if any(REFRESH_STAGES[s]['postgres'] for s in pending):
+        if postgres_url is None:
+            raise ValueError("postgres_url is required for the Postgres export stages")
+        # once up front, so concurrent stages don't race on the download
+        duckdb.execute("INSTALL postgres;")
+
+    ctx = {'data_dir': data_dir, 'postgres_url': postgres_url, 'full_refresh': full_refresh}
+    (data_dir / LANDING_ZONE).mkdir(parents=True, exist_ok=True)
+
+    timings = {}
+    failed = {}
+    running = {}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+
+            # nothing new starts once a stage has failed; running ones finish
+            if not failed:
+                for name in [s for s in pending if all(d in done for d in deps[s])]:
+                    running[pool.submit(_run_stage, name, ctx, retries, retry_delay)] = name
+                    pending.remove(name)
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    timings[name] = future.result()
+                except Exception as e:
+                    failed[name] = e
+                    checkpoint['failed'][name] = repr(e)
+                else:
+                    done.add(name)
+                    checkpoint['completed'][name] = {
+                        'finished_at': datetime.now().isoformat(timespec='seconds'),
+                        'seconds': round(timings[name], 1),
+                    }
+                    checkpoint['failed'].pop(name, None)
+                _write_json(checkpoint_path, checkpoint)
+
+    print(f"\nRefresh ran {len(timings)} stage(s) in {time.perf_counter() - start:,.1f}s", flush=True)
+    for name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"  {name:<28}{seconds:>10,.1f}s", flush=True)
+
+    if failed:
+        raise RuntimeError(
+            f"Refresh stopped, failed stage(s): {', '.join(failed)}. "
+            f"Run again to resume from {checkpoint_path}."
+        )
+
+    checkpoint_path.unlink(missing_ok=True)
+    print("🎉 Data refresh complete!", flush=True)
+
+    return timings
+
+
+def main():
+
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Run the data refresh stages.")
+    parser.add_argument("--stages", nargs="+", choices=list(REFRESH_STAGES), help="only run these stages")
+    parser.add_argument("--workers", type=int, default=3, help="stages to run at once")
+    parser.add_argument("--retries", type=int, default=2, help="retries per stage")
+    parser.add_argument("--retry-delay", type=float, default=30, help="seconds before the first retry")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--fresh", action="store_true", help="ignore the checkpoint of a previous run")
+    parser.add_argument("--full", action="store_true", help="rebuild incremental datasets from scratch")
+    parser.add_argument("--list", action="store_true", help="list the stages and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, stage in REFRESH_STAGES.items():
+            derived = " (derived)" if stage.get('derived') else ""
+            print(f"{name:<28}after: {', '.join(stage['deps']) or '-'}{derived}")
+        return
+
+    load_dotenv()
+    needs_postgres = any(REFRESH_STAGES[s]['postgres'] for s in (args.stages or REFRESH_STAGES))
+
+    try:
+        run_refresh(
+            postgres_url=postgres_url_from_env() if needs_postgres else None,
+            data_dir=args.data_dir,
+            stages=args.stages,
+            max_workers=args.workers,
+            retries=args.retries,
+            retry_delay=args.retry_delay,
+            fresh=args.fresh,
+            full_refresh=args.full,
+        )
+    finally:
+        close_pools()
+
+
+if __name__ == "__main__":
+    main()
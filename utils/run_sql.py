@@ -1,34 +1,193 @@
+import itertools
 import os
 import psycopg2
 import pandas as pd
+import pyarrow as pa
+import threading
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
+from config import CONFIG
+
+
+# one pool per dsn (None = the CLIMATETRACE_* environment), created on first use
+_pools = {}
+_pools_lock = threading.Lock()
+_cursor_ids = itertools.count()
+
+# arrow types for postgres type oids; anything else is written as text
+PG_ARROW_TYPES = {
+    16: pa.bool_(),                         # bool
+    20: pa.int64(),                         # int8
+    21: pa.int16(),                         # int2
+    23: pa.int32(),                         # int4
+    700: pa.float32(),                      # float4
+    701: pa.float64(),                      # float8
+    1700: pa.float64(),                     # numeric (fetched as float, like pandas did)
+    1082: pa.date32(),                      # date
+    1114: pa.timestamp('us'),               # timestamp
+    1184: pa.timestamp('us', tz='UTC'),     # timestamptz
+    1000: pa.list_(pa.bool_()),             # bool[]
+    1005: pa.list_(pa.int16()),             # int2[]
+    1007: pa.list_(pa.int32()),             # int4[]
+    1016: pa.list_(pa.int64()),             # int8[]
+    1021: pa.list_(pa.float32()),           # float4[]
+    1022: pa.list_(pa.float64()),           # float8[]
+    1009: pa.list_(pa.string()),            # text[]
+    1015: pa.list_(pa.string()),            # varchar[]
+}
+
+_NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    'NUMERIC_AS_FLOAT',
+    lambda value, cursor: float(value) if value is not None else None
+)
+
+
+def _connect_kwargs():
+
+    return {
+        'host': os.getenv('CLIMATETRACE_HOST'),
+        'port': os.getenv('CLIMATETRACE_PORT'),
+        'dbname': os.getenv('CLIMATETRACE_DB'),
+        'user': os.getenv('CLIMATETRACE_USER'),
+        'password': os.getenv('CLIMATETRACE_PASS'),
+    }
+
 
 def db_connect():
-    DB_HOST = os.getenv('CLIMATETRACE_HOST')
-    DB_PORT = os.getenv('CLIMATETRACE_PORT')
-    DB_USER = os.getenv('CLIMATETRACE_USER')
-    DB_PASS = os.getenv('CLIMATETRACE_PASS')
-    DB_NAME = os.getenv('CLIMATETRACE_DB')
 
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS
-    )
+    return psycopg2.connect(**_connect_kwargs())
+
+
+'''
+This returns the connection pool for dsn (a libpq connection string or
+postgresql:// url), or for the CLIMATETRACE_* environment when dsn is None.
+Pool sizes come from CONFIG['postgres_pool_min'] and
+CONFIG['postgres_pool_max'] unless passed in; they only apply when the pool
+is first created.
+
+Returns: connection pool
+Type: psycopg2.pool.ThreadedConnectionPool
+'''
+def get_pool(dsn=None, minconn=None, maxconn=None):
+
+    with _pools_lock:
+        pool = _pools.get(dsn)
+
+        if pool is None or pool.closed:
+            minconn = CONFIG.get('postgres_pool_min', 1) if minconn is None else minconn
+            maxconn = CONFIG.get('postgres_pool_max', 8) if maxconn is None else maxconn
+            connect_args = {'dsn': dsn} if dsn is not None else _connect_kwargs()
+
+            pool = ThreadedConnectionPool(minconn, maxconn, **connect_args)
+            _pools[dsn] = pool
+
+    return pool
+
+
+def close_pools():
+
+    with _pools_lock:
+        for pool in _pools.values():
+            if not pool.closed:
+                pool.closeall()
+        _pools.clear()
+
 
-    return conn
+'''
+This borrows a connection from the pool for the duration of a with block.
+Whatever transaction is left open is rolled back before the connection goes
+back, and connections that broke mid-use are closed rather than reused.
+Raises psycopg2.pool.PoolError when all maxconn connections are in use.
 
+Returns: connection
+Type: psycopg2.extensions.connection
+'''
+@contextmanager
+def pooled_connection(dsn=None):
 
-def run_sql(query):
+    pool = get_pool(dsn)
+    conn = pool.getconn()
+    broken = False
 
-    conn = db_connect()
-    
     try:
-        result = pd.read_sql(query, conn)
+        yield conn
+
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
 
     finally:
-        conn.close()
-   
+        broken = broken or conn.closed != 0
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        pool.putconn(conn, close=broken)
+
+
+def run_sql(query, params=None, dsn=None):
+
+    with pooled_connection(dsn) as conn:
+        result = pd.read_sql(query, conn, params=params)
+
     return result
 
+
+def _arrow_array(values, arrow_type):
+
+    if arrow_type == pa.string():
+        values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+
+    return pa.array(values, type=arrow_type)
+
+
+'''
+This streams the results of a query through a named (server-side) cursor,
+batch_rows rows at a time, so only one batch is ever held client-side. Yields
+Arrow record batches, or DataFrames when output='pandas'. Column types come
+from the cursor description (see PG_ARROW_TYPES), so every batch has the
+same schema whatever its values. An empty result yields a single empty batch
+so callers still see the columns. The connection is borrowed from the pool
+until the generator is exhausted or closed.
+
+Returns: result batches
+Type: generator of pyarrow.RecordBatch or pandas.DataFrame
+'''
+def stream_sql(query, params=None, batch_rows=50_000, output='arrow', dsn=None):
+
+    if output not in ('arrow', 'pandas'):
+        raise ValueError(f"output must be 'arrow' or 'pandas', got {output!r}")
+
+    with pooled_connection(dsn) as conn:
+
+        # a named cursor keeps the result on the server until fetched
+        with conn.cursor(name=f"stream_sql_{next(_cursor_ids)}") as cur:
+            psycopg2.extensions.register_type(_NUMERIC_AS_FLOAT, cur)
+            cur.itersize = batch_rows
+            cur.execute(query.strip().rstrip(';'), params)
+
+            schema = None
+            while True:
+                records = cur.fetchmany(batch_rows)
+
+                if schema is None:
+                    schema = pa.schema([
+                        (column.name, PG_ARROW_TYPES.get(column.type_code, pa.string()))
+                        for column in cur.description
+                    ])
+                    if not records:
+                        batch = pa.RecordBatch.from_pylist([], schema=schema)
+                        yield batch.to_pandas() if output == 'pandas' else batch
+
+                if not records:
+                    break
+
+                batch = pa.RecordBatch.from_arrays(
+                    [_arrow_array(values, field.type) for values, field in zip(zip(*records), schema)],
+                    schema=schema
+                )
+                del records
+
+                yield batch.to_pandas() if output == 'pandas' else batch
@@ -0,0 +1,202 @@
+import bisect
+import re
+import numpy as np
+import streamlit as st
+from utils.connection import get_database, get_release, table_ref
+from utils.ownership import get_ownership
+
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+
+# characters sorting after anything a token can contain, for prefix range ends
+_PREFIX_END = "\U0010ffff"
+
+
+def _tokens(text):
+
+    return _TOKEN.findall(str(text).casefold())
+
+
+class SearchIndex:
+
+    '''
+    Prefix index over display labels. Every label (plus optional extra search
+    text, e.g. IDs that aren't in the label) is split into lowercase
+    alphanumeric tokens. The sorted token vocabulary points into one postings
+    array (CSR layout), so a query term is two bisects and a slice. A label
+    matches when every query term is a prefix of one of its tokens. Matches
+    are ranked by exact token hits, then weight (largest first), then label.
+    '''
+
+    def __init__(self, labels, texts=None, weights=None):
+
+        self.labels = list(labels)
+        texts = self.labels if texts is None else texts
+
+        token_ids = {}
+        pairs = []
+        for label_id, text in enumerate(texts):
+            for token in set(_tokens(text)):
+                pairs.append((token_ids.setdefault(token, len(token_ids)), label_id))
+
+        vocab = sorted(token_ids)
+        order = np.empty(len(vocab), dtype=np.int64)
+        order[[token_ids[t] for t in vocab]] = np.arange(len(vocab))
+
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        pairs[:, 0] = order[pairs[:, 0]]
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+        self.vocab = vocab
+        self.offsets = np.searchsorted(pairs[:, 0], np.arange(len(vocab) + 1)).astype(np.int64)
+        self.postings = pairs[:, 1].astype(np.int32)
+
+        weights = np.zeros(len(self.labels)) if weights is None else np.nan_to_num(np.asarray(weights, dtype=float))
+        alpha = np.empty(len(self.labels), dtype=np.int64)
+        alpha[np.argsort(np.array(self.labels, dtype=object), kind='stable')] = np.arange(len(self.labels))
+
+        # one precomputed rank so a search sorts integers, not strings
+        self.rank = np.empty(len(self.labels), dtype=np.int64)
+        self.rank[np.lexsort((alpha, -weights))] = np.arange(len(self.labels))
+
+    def __len__(self):
+
+        return len(self.labels)
+
+    def _term_postings(self, term):
+
+        lo = bisect.bisect_left(self.vocab, term)
+        hi = bisect.bisect_left(self.vocab, term + _PREFIX_END, lo)
+
+        matches = self.postings[self.offsets[lo]:self.offsets[hi]]
+        exact = np.empty(0, dtype=np.int32)
+        if lo < len(self.vocab) and self.vocab[lo] == term:
+            exact = self.postings[self.offsets[lo]:self.offsets[lo + 1]]
+
+        return matches, exact
+
+    '''
+    This returns up to limit labels matching query, best first. allowed, if
+    given, is a set of labels to restrict the results to.
+
+    Returns: labels
+    Type: list
+    '''
+    def search(self, query, limit=50, allowed=None):
+
+        terms = list(dict.fromkeys(_tokens(query)))
+        if not terms:
+            return []
+
+        candidates = None
+        exact_hits = []
+        for term in terms:
+            matches, exact = self._term_postings(term)
+            matches = np.unique(matches)
+            candidates = matches if candidates is None else np.intersect1d(candidates, matches, assume_unique=True)
+            exact_hits.append(exact)
+            if not len(candidates):
+                return []
+
+        exact_count = sum(np.isin(candidates, exact).astype(np.int64) for exact in exact_hits)
+        candidates = candidates[np.lexsort((self.rank[candidates], -exact_count))]
+
+        results = []
+        for label_id in candidates:
+            label = self.labels[label_id]
+            if allowed is None or label in allowed:
+                results.append(label)
+                if len(results) == limit:
+                    break
+
+        return results
+
+
+'''
+This builds the owner search indexes once per data release, one per owner
+type, over the owner labels (entity ID, name and LEI). Owners are ranked by
+their share-weighted emissions.
+
+Returns: owner type -> search index
+Type: dict
+'''
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_owner_search(release):
+
+    indexes = {}
+
+    for owner_type, table in get_ownership()['rollup'].items():
+        totals = table['rows'].groupby('owner')['share_emissions_quantity'].sum()
+        indexes[owner_type] = SearchIndex(totals.index, weights=totals.to_numpy())
+
+    return indexes
+
+
+'''
+This builds the asset search index once per data release over every asset's
+highlight label ("iso3: asset name (asset id)", as the Abatement Curve lists
+them), ranked by emissions.
+
+Returns: asset search index
+Type: SearchIndex
+'''
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_asset_search(release):
+
+    con = get_database().cursor()
+
+    try:
+        rows = con.execute(f"""
+            SELECT iso3_country || ': ' || asset_name || ' (' || CAST(asset_id AS TEXT) || ')' AS label,
+                MAX(emissions_quantity) AS emissions_quantity
+            FROM '{table_ref('annual_asset_path')}'
+            WHERE asset_name IS NOT NULL
+            GROUP BY 1
+        """).fetchall()
+    finally:
+        con.close()
+
+    return SearchIndex([row[0] for row in rows], weights=[row[1] for row in rows])
+
+
+def search_owners(owner_type, query, limit=50):
+
+    return load_owner_search(get_release())[owner_type].search(query, limit)
+
+
+def search_assets(query, limit=50, allowed=None):
+
+    return load_asset_search(get_release()).search(query, limit, allowed)
+
+
+'''
+This renders a search box and a multiselect that only offers the top matches
+for the search, plus whatever is already selected, instead of every option.
+search(query, limit) returns the matching labels. The selection is kept in
+st.session_state[key], so it survives new searches and can be reset by
+assigning to it.
+
+Returns: selected labels
+Type: list
+'''
+def typeahead_multiselect(label, search, key, limit=50, placeholder="Type a name or ID and press Enter"):
+
+    selected = list(st.session_state.get(key, []))
+
+    query = st.text_input(f"Search {label.lower()}", key=f"{key}_search", placeholder=placeholder)
+    matches = search(query, limit) if query.strip() else []
+
+    if query.strip() and not matches:
+        st.caption("No matches")
+
+    # the options (and so the widget) change with every search; the default
+    # carries the selection over to the new widget
+    selected = st.multiselect(
+        label,
+        options=list(dict.fromkeys([*selected, *matches])),
+        default=selected,
+        key=f"{key}_options"
+    )
+    st.session_state[key] = selected
+
+    return selected
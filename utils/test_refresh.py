@@ -0,0 +1,142 @@
+'''
+Tests for the refresh outputs in utils/refresh.py that the Reduction
+Opportunities tab reads instead of the asset table. The rollup queries have
+to give the same answers as the asset-level queries for any filter, so both
+run on a small asset table here:
+
+    python -m pytest utils/test_refresh.py
+'''
+import duckdb
+import pytest
+from utils.queries import (
+    build_sector_induction_from_rollup_sql,
+    build_sector_induction_sql,
+    build_sector_reduction_from_rollup_sql,
+    build_sector_reduction_sql,
+)
+from utils.refresh import write_asset_induced_emissions, write_sector_reduction_rollup
+
+
+# A1 has two most_granular rows that differ only in gadm_2 (plus a
+# non-granular country row), so its reduction and inductions have to count
+# once in any view above gadm_2
+ASSET_ROWS = """
+    ('A1', 'power', 'electricity-generation', 'USA', 'NA', false, true, 'USA.1', 'USA.1.1', ['{c1}'], true, 4.0, 10.0, 'cement', 'steel', 50.0, 7.0),
+    ('A1', 'power', 'electricity-generation', 'USA', 'NA', false, true, 'USA.1', 'USA.1.2', ['{c1}'], true, 6.0, 10.0, 'cement', 'steel', 50.0, 7.0),
+    ('A1', 'power', 'electricity-generation', 'USA', 'NA', false, true, 'USA.1', NULL, ['{c1}'], false, 10.0, 10.0, 'cement', 'steel', 50.0, 7.0),
+    ('A2', 'manufacturing', 'cement', 'USA', 'NA', false, true, 'USA.2', 'USA.2.1', ['{c2}'], true, 30.0, 5.0, 'electricity-generation', NULL, -8.0, NULL),
+    ('A3', 'manufacturing', 'steel', 'FRA', 'EU', true, false, 'FRA.1', 'FRA.1.1', NULL, true, 20.0, 3.0, 'electricity-generation', 'cement', 2.0, 1.0)
+"""
+
+CITY_JOIN = """
+    INNER JOIN (SELECT 'c1' AS city_id) c
+        ON c.city_id = {city_column}
+"""
+
+
+@pytest.fixture
+def tables(tmp_path):
+
+    annual_path = tmp_path / "asset_level.parquet"
+
+    duckdb.connect().execute(f"""
+        COPY (
+            SELECT *
+                , 'NA' AS unfccc_annex
+                , true AS oecd
+                , true AS developed_un
+                , false AS em_finance
+                , CAST(NULL AS VARCHAR) AS induced_sector_3
+                , CAST(NULL AS DOUBLE) AS induced_sector_3_induced_emissions
+            FROM (VALUES {ASSET_ROWS}) t(asset_id, sector, subsector, iso3_country, continent, eu, g20, gadm_1, gadm_2,
+                ghs_fua, most_granular, emissions_quantity, emissions_reduced_at_asset, induced_sector_1,
+                induced_sector_2, induced_sector_1_induced_emissions, induced_sector_2_induced_emissions)
+        ) TO '{annual_path}' (FORMAT PARQUET)
+    """)
+
+    write_asset_induced_emissions(annual_path, tmp_path)
+    induced_path = tmp_path / "asset_induced_emissions.parquet"
+    write_sector_reduction_rollup(annual_path, induced_path, tmp_path)
+
+    return {
+        'annual': annual_path,
+        'induced': induced_path,
+        'rollup': tmp_path / "sector_reduction_rollup.parquet",
+    }
+
+
+def _query(sql, sort_by):
+
+    return duckdb.connect().execute(sql).df().sort_values(sort_by).reset_index(drop=True)
+
+
+def _reductions(tables, dropdown_join, where_sql):
+
+    asset_level = _query(build_sector_reduction_sql(
+        use_ct_ers=True,
+        annual_asset_path=tables['annual'],
+        dropdown_join=dropdown_join.format(city_column="regexp_replace(ae.ghs_fua[1], '[{}]', '', 'g')"),
+        reduction_where_sql=where_sql,
+        induced_emissions_path=tables['induced'],
+    ), 'sector')
+
+    rollup = _query(build_sector_reduction_from_rollup_sql(
+        tables['rollup'], dropdown_join.format(city_column='ae.city_id'), where_sql
+    ), 'sector')
+
+    return asset_level, rollup
+
+
+def _inductions(tables, dropdown_join, where_sql):
+
+    sort_by = ['receiving_sector', 'inducing_sector']
+
+    asset_level = _query(build_sector_induction_sql(
+        tables['induced'],
+        dropdown_join.format(city_column="regexp_replace(ae.ghs_fua[1], '[{}]', '', 'g')"),
+        where_sql,
+    ), sort_by)
+
+    rollup = _query(build_sector_induction_from_rollup_sql(
+        tables['rollup'], dropdown_join.format(city_column='ae.city_id'), where_sql
+    ), sort_by)
+
+    return asset_level, rollup
+
+
+@pytest.mark.parametrize('dropdown_join, where_sql', [
+    ("", "WHERE most_granular is true"),
+    ("", "WHERE ae.iso3_country = 'USA' AND most_granular is true"),
+    ("", "WHERE ae.continent IN ('NA', 'EU') AND most_granular is true"),
+    ("", "WHERE ae.gadm_1 = 'USA.1' AND most_granular is true"),
+    ("", "WHERE ae.gadm_2 = 'USA.1.2' AND most_granular is true"),
+    ("", "WHERE ae.iso3_country = 'USA'"),
+    (CITY_JOIN, "WHERE ae.iso3_country = 'USA'"),
+])
+def test_rollup_queries_match_the_asset_level_queries(tables, dropdown_join, where_sql):
+
+    asset_level, rollup = _reductions(tables, dropdown_join, where_sql)
+    assert not asset_level.empty
+    assert rollup.equals(asset_level)
+
+    asset_level, rollup = _inductions(tables, dropdown_join, where_sql)
+    assert not asset_level.empty
+    assert rollup.equals(asset_level)
+
+
+def test_asset_spanning_two_regions_counts_once(tables):
+
+    where_sql = "WHERE most_granular is true"
+
+    for df in _reductions(tables, "", where_sql):
+        power = df.set_index('sector').loc['power']
+        assert power['emissions_quantity'] == 10.0
+        assert power['emissions_reduced_at_asset'] == 10.0
+
+        # A1 induces 50 + 7 into manufacturing, A3 another 1
+        induced = df.set_index('sector')['induced_emissions']
+        assert induced['manufacturing'] == 58.0
+
+    for df in _inductions(tables, "", where_sql):
+        induced = df.set_index(['receiving_sector', 'inducing_sector'])['induced_emissions']
+        assert induced['manufacturing', 'power'] == 50.0
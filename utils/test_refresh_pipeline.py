@@ -0,0 +1,290 @@
+'''
+Tests for the refresh runner in utils/refresh_pipeline.py. The stages are
+stubs that record when they run, so the scheduler, retry, checkpoint and
+resume logic can be checked without Postgres:
+
+    python -m pytest utils/test_refresh_pipeline.py
+'''
+import json
+from datetime import datetime
+import pytest
+import utils.refresh_pipeline as rp
+
+
+def _stage(calls, name, fail_times=0):
+
+    attempts = {'count': 0}
+
+    def run(ctx):
+        attempts['count'] += 1
+        calls.append(name)
+        if attempts['count'] <= fail_times:
+            raise RuntimeError(f"{name} failed")
+
+    return run
+
+
+def _use_stages(monkeypatch, calls, deps, fail_times=None):
+
+    fail_times = fail_times or {}
+    stages = {
+        name: {'run': _stage(calls, name, fail_times.get(name, 0)), 'deps': stage_deps, 'postgres': False}
+        for name, stage_deps in deps.items()
+    }
+    monkeypatch.setattr(rp, 'REFRESH_STAGES', stages)
+
+    return stages
+
+
+def _checkpoint_path(data_dir):
+
+    return data_dir / rp.LANDING_ZONE / rp.CHECKPOINT_FILE
+
+
+def test_stages_run_after_their_dependencies(monkeypatch, tmp_path):
+
+    calls = []
+    deps = {'a': [], 'b': ['a'], 'c': ['b'], 'd': ['a'], 'e': ['c', 'd']}
+    _use_stages(monkeypatch, calls, deps)
+
+    timings = rp.run_refresh(data_dir=tmp_path, max_workers=3, retry_delay=0)
+
+    assert sorted(calls) == sorted(deps)
+    assert set(timings) == set(deps)
+    for name, stage_deps in deps.items():
+        assert all(calls.index(d) < calls.index(name) for d in stage_deps)
+    assert not _checkpoint_path(tmp_path).exists()
+
+
+def test_failed_stage_is_retried(monkeypatch, tmp_path):
+
+    calls = []
+    _use_stages(monkeypatch, calls, {'a': [], 'b': ['a']}, fail_times={'a': 1})
+
+    rp.run_refresh(data_dir=tmp_path, retries=1, retry_delay=0)
+
+    assert calls == ['a', 'a', 'b']
+    assert not _checkpoint_path(tmp_path).exists()
+
+
+def test_rerun_resumes_after_a_failure(monkeypatch, tmp_path):
+
+    calls = []
+    _use_stages(monkeypatch, calls, {'a': [], 'b': ['a'], 'c': ['b']}, fail_times={'b': 1})
+
+    with pytest.raises(RuntimeError):
+        rp.run_refresh(data_dir=tmp_path, retries=0, retry_delay=0)
+
+    assert calls == ['a', 'b']
+    checkpoint = json.loads(_checkpoint_path(tmp_path).read_text())
+    assert set(checkpoint['completed']) == {'a'}
+    assert set(checkpoint['failed']) == {'b'}
+
+    # b fails only on its first call, so the rerun gets through
+    rp.run_refresh(data_dir=tmp_path, retries=0, retry_delay=0)
+
+    assert calls == ['a', 'b', 'b', 'c']
+    assert not _checkpoint_path(tmp_path).exists()
+
+
+def test_fresh_run_ignores_the_checkpoint(monkeypatch, tmp_path):
+
+    calls = []
+    _use_stages(monkeypatch, calls, {'a': [], 'b': ['a']}, fail_times={'b': 1})
+
+    with pytest.raises(RuntimeError):
+        rp.run_refresh(data_dir=tmp_path, retries=0, retry_delay=0)
+
+    rp.run_refresh(data_dir=tmp_path, retries=0, retry_delay=0, fresh=True)
+
+    assert calls == ['a', 'b', 'a', 'b']
+
+
+def test_subset_run_leaves_nothing_for_later_runs(monkeypatch, tmp_path):
+
+    calls = []
+    _use_stages(monkeypatch, calls, {'a': [], 'b': ['a'], 'c': ['a']})
+
+    rp.run_refresh(data_dir=tmp_path, stages=['b'], retry_delay=0)
+    rp.run_refresh(data_dir=tmp_path, stages=['b'], retry_delay=0)
+
+    assert calls == ['b', 'b']
+    assert not _checkpoint_path(tmp_path).exists()
+
+    rp.run_refresh(data_dir=tmp_path, retry_delay=0)
+
+    assert sorted(calls[2:]) == ['a', 'b', 'c']
+
+
+def test_failed_subset_run_is_not_resumed_by_another_selection(monkeypatch, tmp_path):
+
+    calls = []
+    _use_stages(monkeypatch, calls, {'a': [], 'b': ['a'], 'c': ['a']}, fail_times={'c': 1})
+
+    with pytest.raises(RuntimeError):
+        rp.run_refresh(data_dir=tmp_path, stages=['b', 'c'], max_workers=1, retries=0, retry_delay=0)
+
+    assert 'b' in json.loads(_checkpoint_path(tmp_path).read_text())['completed']
+
+    # a full run was not what failed, so it runs every stage
+    rp.run_refresh(data_dir=tmp_path, retry_delay=0)
+
+    assert sorted(calls[2:]) == ['a', 'b', 'c']
+    assert not _checkpoint_path(tmp_path).exists()
+
+
+def test_subset_run_also_runs_derived_stages(monkeypatch, tmp_path):
+
+    calls = []
+    stages = _use_stages(monkeypatch, calls, {'a': [], 'b': [], 'cube': ['a', 'b'], 'store': ['cube'], 'c': ['a']})
+    stages['cube']['derived'] = True
+    stages['store']['derived'] = True
+
+    rp.run_refresh(data_dir=tmp_path, stages=['a'], retry_delay=0)
+
+    # b isn't selected, so its output on disk is used as is; c isn't derived
+    assert calls == ['a', 'cube', 'store']
+
+    rp.run_refresh(data_dir=tmp_path, stages=['c'], retry_delay=0)
+
+    assert calls[3:] == ['c']
+
+
+def test_archive_retry_keeps_the_previous_archive(monkeypatch, tmp_path):
+
+    previous = tmp_path / "zzz_archive" / "gadm_emissions" / "gadm_0" / "old.parquet"
+    previous.parent.mkdir(parents=True)
+    previous.write_text("previous release")
+
+    for name in ["gadm_0", "gadm_1", "gadm_2"]:
+        current = tmp_path / "gadm_emissions" / name / f"{name}.parquet"
+        current.parent.mkdir(parents=True)
+        current.write_text(name)
+
+    move = rp.shutil.move
+    moves = {'count': 0}
+
+    def flaky_move(src, dst):
+        moves['count'] += 1
+        if moves['count'] == 2:
+            raise OSError("disk hiccup")
+        return move(src, dst)
+
+    monkeypatch.setattr(rp.shutil, 'move', flaky_move)
+
+    with pytest.raises(OSError):
+        rp.archive_parquets({'data_dir': tmp_path})
+
+    # the previous release is untouched until every file is moved
+    assert previous.read_text() == "previous release"
+
+    rp.archive_parquets({'data_dir': tmp_path})
+
+    archived = sorted(p.name for p in (tmp_path / "zzz_archive").rglob("*.parquet"))
+    assert archived == ["gadm_0.parquet", "gadm_1.parquet", "gadm_2.parquet"]
+    assert not (tmp_path / "zzz_archive_staging").exists()
+    assert not list((tmp_path / "gadm_emissions").rglob("*.parquet"))
+
+
+class _CountrySubsectorSource:
+
+    '''
+    Stands in for Postgres' asset_emissions in export_country_subsector_level:
+    per-month stats (the month fingerprints) and the rows to export come from
+    self.rows, read through an in-memory DuckDB.
+    '''
+
+    def __init__(self, monkeypatch, rows):
+
+        self.rows = rows
+        self.exported = []
+
+        monkeypatch.setattr(rp, '_postgres_rows', self.postgres_rows)
+        monkeypatch.setattr(rp, '_postgres_duckdb', rp.duckdb.connect)
+        monkeypatch.setattr(rp, 'country_subsector_level_sql', self.level_sql)
+        # run_refresh installs the postgres extension up front
+        monkeypatch.setattr(rp.duckdb, 'execute', lambda *args, **kwargs: None)
+
+    def values_sql(self):
+
+        return """
+            SELECT * FROM (VALUES {}) t(start_time, iso3_country, original_inventory_sector, release, emissions_quantity, activity)
+        """.format(", ".join(
+            f"(DATE '{day}', '{iso3}', 'electricity-generation', '{release}', {emissions}::DOUBLE, {activity}::DOUBLE)"
+            for day, iso3, release, emissions, activity in self.rows
+        ))
+
+    def postgres_rows(self, dsn, sql):
+
+        if "max(start_time)" in sql:
+            return [(datetime.fromisoformat(max(row[0] for row in self.rows)),)]
+
+        return rp.duckdb.connect().execute(f"""
+            SELECT date_trunc('month', start_time)::date, max(release), count(*), sum(emissions_quantity), sum(activity)
+            FROM ({self.values_sql()}) GROUP BY 1 ORDER BY 1
+        """).fetchall()
+
+    def level_sql(self, postgres_url, window_start, months=None):
+
+        self.exported.append(None if months is None else sorted(f"{m:%Y-%m}" for m in months))
+        month_filter = "" if months is None else "WHERE date_trunc('month', start_time) IN ({})".format(
+            ", ".join(f"DATE '{m}'" for m in months)
+        )
+
+        return f"SELECT * FROM ({self.values_sql()}) {month_filter}"
+
+
+def _month_totals(data_dir):
+
+    files = data_dir / rp.COUNTRY_SUBSECTOR_DIR / f"{rp.COUNTRY_SUBSECTOR_PREFIX}_*.parquet"
+
+    return dict(rp.duckdb.connect().execute(f"""
+        SELECT strftime(start_time, '%Y-%m'), sum(emissions_quantity) FROM '{files}' GROUP BY 1
+    """).fetchall())
+
+
+def test_incremental_stage_exports_revised_months_every_run(monkeypatch, tmp_path):
+
+    source = _CountrySubsectorSource(monkeypatch, [
+        ('2025-01-01', 'USA', 'v1', 10.0, 1.0),
+        ('2025-02-01', 'USA', 'v1', 20.0, 2.0),
+    ])
+    cube_builds = []
+    monkeypatch.setitem(rp.REFRESH_STAGES, 'monthly_cube',
+                        dict(rp.REFRESH_STAGES['monthly_cube'], run=lambda ctx: cube_builds.append(_month_totals(tmp_path))))
+
+    rp.run_refresh(postgres_url='stub', data_dir=tmp_path, stages=['country_subsector_level'], retry_delay=0)
+    assert _month_totals(tmp_path) == {'2025-01': 10.0, '2025-02': 20.0}
+
+    # February is revised and March arrives
+    source.rows[1] = ('2025-02-01', 'USA', 'v2', 25.0, 2.0)
+    source.rows.append(('2025-03-01', 'USA', 'v2', 30.0, 3.0))
+
+    rp.run_refresh(postgres_url='stub', data_dir=tmp_path, stages=['country_subsector_level'], retry_delay=0)
+
+    assert source.exported == [None, ['2025-02', '2025-03']]
+    assert _month_totals(tmp_path) == {'2025-01': 10.0, '2025-02': 25.0, '2025-03': 30.0}
+
+    # the monthly cube is rebuilt after each export, so the Trends charts see the new months
+    assert cube_builds == [{'2025-01': 10.0, '2025-02': 20.0}, {'2025-01': 10.0, '2025-02': 25.0, '2025-03': 30.0}]
+
+
+def test_incremental_stage_runs_again_when_resuming(monkeypatch, tmp_path):
+
+    calls = []
+    country_subsector_level = dict(rp.REFRESH_STAGES['country_subsector_level'], deps=[])
+    stages = _use_stages(monkeypatch, calls, {'country_subsector_level': [], 'monthly_cube': ['country_subsector_level']},
+                         fail_times={'monthly_cube': 1})
+    stages['country_subsector_level'] = country_subsector_level
+
+    source = _CountrySubsectorSource(monkeypatch, [('2025-01-01', 'USA', 'v1', 10.0, 1.0)])
+
+    with pytest.raises(RuntimeError):
+        rp.run_refresh(postgres_url='stub', data_dir=tmp_path, retries=0, retry_delay=0)
+
+    source.rows.append(('2025-02-01', 'USA', 'v1', 20.0, 2.0))
+    rp.run_refresh(postgres_url='stub', data_dir=tmp_path, retries=0, retry_delay=0)
+
+    assert source.exported == [None, ['2025-02']]
+    assert calls == ['monthly_cube', 'monthly_cube']
+    assert _month_totals(tmp_path) == {'2025-01': 10.0, '2025-02': 20.0}
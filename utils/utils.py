@@ -145,7 +145,6 @@ def create_excel_file(dataframes_dict):
 def get_release_version(con, path):
     
     release_version = con.execute(f"SELECT DISTINCT release FROM '{path}'").fetchone()[0]
-    con.close()
 
     return release_version
 
@@ -410,12 +409,12 @@ def is_country(region_selection):
     
 def reset_city():
     st.session_state["city_selector_RO"] = "-- Select City --"
-    st.session_state.needs_recompute_RO = True
+    st.session_state.needs_recompute_reduction_opportunities = True
 
 def reset_state_and_county():
     st.session_state["state_province_selector_RO"] = "-- Select State / Province --"
     st.session_state["county_district_selector_RO"] = "-- Select County / District --"
-    st.session_state.needs_recompute_RO = True
+    st.session_state.needs_recompute_reduction_opportunities = True
 
 
 abatement_subsector_options = {
@@ -576,7 +575,164 @@ def define_color_lines(metric):
     return dict_color, dict_lines
 
 
-def plot_abatement_curve(gdf_asset, selected_group, selected_color, dict_color, dict_lines, selected_list, selected_assets, selected_x, selected_y, threshold, fill=False, cond={}):
+def bucket_and_aggregate(df, group_col, group_2_col, total_col, bucket_col, asset_id_col, asset_name_col, sum_cols=None, first_cols=None, max_buckets=1000):
+    """
+    Collapses each group (e.g. sector) of an abatement curve into at most
+    ~max_buckets consecutive buckets along total_col. Rows are sorted once
+    globally by (group, total_col) and every aggregate is a single
+    np.*.reduceat over the bucket boundaries, so the cost is one sort plus a
+    few linear passes regardless of how many groups or assets there are.
+
+    Each bucket gets sum_cols summed, the first non-null value of first_cols,
+    total_col max, bucket_col min/max (and max as bucket_col itself), the
+    unique group_2_col values, the asset count and a label for asset_name_col.
+    """
+    sum_cols = sum_cols or []
+    first_cols = first_cols or []
+    group_cols = group_col if isinstance(group_col, list) else [group_col]
+
+    group_ids = df.groupby(group_cols, sort=True, observed=True, dropna=True).ngroup().to_numpy()
+    keep = group_ids >= 0
+    df = df.loc[keep]
+    group_ids = group_ids[keep]
+
+    total = df[total_col].to_numpy(dtype=float)
+    order = np.lexsort((total, group_ids))
+    group_ids = group_ids[order]
+    n = len(order)
+
+    # position of each row within its group, and per-group bucket sizes
+    group_starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]]) if n else np.array([], dtype=int)
+    group_sizes = np.diff(np.r_[group_starts, n])
+    row_group = np.repeat(np.arange(len(group_starts)), group_sizes)
+    position = np.arange(n) - group_starts[row_group]
+    bucket = position // np.maximum(1, group_sizes // max_buckets)[row_group]
+
+    # a new bucket starts wherever the group or the in-group bucket changes
+    bucket_starts = np.flatnonzero(np.r_[True, (row_group[1:] != row_group[:-1]) | (bucket[1:] != bucket[:-1])]) if n else np.array([], dtype=int)
+    bucket_sizes = np.diff(np.r_[bucket_starts, n])
+
+    def column(col):
+        return df[col].to_numpy()[order]
+
+    def reduce(ufunc, values):
+        if not n:
+            return values[:0].astype(float)
+        return ufunc.reduceat(values, bucket_starts)
+
+    def first_valid(values):
+        # pandas' "first" skips nulls; take the lowest non-null position per bucket
+        positions = np.where(pd.notna(values), np.arange(n), n)
+        first = reduce(np.minimum, positions).astype(int)
+        out = np.empty(len(bucket_starts), dtype=object)
+        found = first < n
+        out[found] = values[first[found]]
+        out[~found] = None if values.dtype == object else np.nan
+        return out
+
+    bucket_values = column(bucket_col).astype(float)
+    y_min = reduce(np.fmin, bucket_values)
+    y_max = reduce(np.fmax, bucket_values)
+
+    # same key order/overwrite semantics as a named-aggregation dict, e.g. when
+    # bucket_col is also one of sum_cols its max wins
+    agg = {'bucket': bucket[bucket_starts] if n else bucket[:0]}
+    for col in sum_cols:
+        agg[col] = reduce(np.add, np.nan_to_num(column(col).astype(float), nan=0.0))
+    for col in first_cols:
+        agg[col] = first_valid(column(col))
+    agg[total_col] = reduce(np.fmax, column(total_col).astype(float))
+    agg[f"{bucket_col}_min"] = y_min
+    agg[f"{bucket_col}_max"] = y_max
+    agg[bucket_col] = y_max
+
+    # unique group_2 values per bucket, in order of appearance
+    bucket_index = np.repeat(np.arange(len(bucket_starts)), bucket_sizes)
+    pairs = pd.DataFrame({'b': bucket_index, 'v': column(group_2_col)}).drop_duplicates()
+    split_at = np.flatnonzero(np.diff(pairs['b'].to_numpy())) + 1
+    uniques = np.empty(len(bucket_starts), dtype=object)
+    if n:
+        # one object array per bucket (O(buckets), not O(rows))
+        for i, chunk in enumerate(np.split(pairs['v'].to_numpy(), split_at)):
+            uniques[i] = chunk
+    agg[group_2_col] = uniques
+
+    agg[asset_id_col] = reduce(np.add, pd.notna(column(asset_id_col)).astype(int))
+    agg[asset_name_col] = (
+        f"assets with {bucket_col} from "
+        + pd.Series(np.char.mod('%.2f', y_min), dtype=object)
+        + " to "
+        + pd.Series(np.char.mod('%.2f', y_max), dtype=object)
+    ).to_numpy()
+
+    for col in group_cols:
+        agg[col] = column(col)[bucket_starts] if n else column(col)[:0]
+
+    return pd.DataFrame(agg)
+
+
+# bucket resolutions (max buckets per sector) kept for the asset abatement
+# curve, and how many steps a single render may send to the browser
+ABATEMENT_LOD_LEVELS = [250, 1000, 5000]
+ABATEMENT_LOD_MAX_POINTS = 5_000
+
+
+def steps_in_range(x_cum, x_lo, x_hi):
+    """
+    Flags the steps of an abatement curve that overlap [x_lo, x_hi]. Row i
+    draws the step from x_cum[i-1] to x_cum[i], so row 0 never does.
+    """
+    x_cum = np.asarray(x_cum, dtype=float)
+    visible = np.zeros(len(x_cum), dtype=bool)
+    if len(x_cum) > 1:
+        x0, x1 = x_cum[:-1], x_cum[1:]
+        visible[1:] = (np.minimum(x0, x1) <= x_hi) & (np.maximum(x0, x1) >= x_lo)
+    return visible
+
+
+def pick_lod_level(df, group_col, visible, levels=ABATEMENT_LOD_LEVELS, max_points=ABATEMENT_LOD_MAX_POINTS):
+    """
+    Picks the finest resolution whose visible steps fit in max_points: None
+    (raw rows) if the visible rows already fit, otherwise the largest of
+    levels that does, falling back to the coarsest. Bucket counts are
+    estimated the way bucket_and_aggregate splits each group, so nothing is
+    bucketed to decide.
+    """
+    if visible.sum() <= max_points:
+        return None
+
+    group_ids = df.groupby(group_col, observed=True, dropna=True).ngroup().to_numpy()
+    in_group = group_ids >= 0
+    group_sizes = np.bincount(group_ids[in_group])
+    group_visible = np.bincount(group_ids[in_group & visible], minlength=len(group_sizes))
+
+    for level in sorted(levels, reverse=True):
+        bucket_size = np.maximum(1, group_sizes // level)
+        if np.ceil(group_visible / bucket_size).sum() <= max_points:
+            return level
+
+    return min(levels)
+
+
+def clip_to_range(df, x_col, x_lo, x_hi):
+    """
+    Trims a curve to the contiguous run of rows whose steps overlap
+    [x_lo, x_hi], keeping the row before the first one so its step still
+    has a starting point.
+    """
+    visible = np.flatnonzero(steps_in_range(df[x_col].to_numpy(dtype=float), x_lo, x_hi))
+    if not len(visible):
+        return df.iloc[:0].reset_index(drop=True)
+    return df.iloc[visible[0] - 1:visible[-1] + 1].reset_index(drop=True)
+
+
+def plot_abatement_curve(gdf_asset, selected_group, selected_color, dict_color, dict_lines, selected_list, selected_assets, selected_x, selected_y, threshold, fill=False, cond={}, x_range=None, lod_cache=None):
+    """
+    x_range is the visible part of the x-axis as (start, end) fractions of the
+    full curve; asset curves are drawn at the bucket resolution that fits it.
+    lod_cache is a dict the caller keeps per selection so bucketed levels are
+    only built once.
+    """
 
     def weighted_avg(group, x_col, y_col, weight_x=0.5, weight_y=0.5):
         def min_max_normalize(series):
@@ -599,48 +755,6 @@ def plot_abatement_curve(gdf_asset, selected_group, selected_color, dict_color,
         b = int(hex_color[4:6], 16)
         return f'rgba({r}, {g}, {b}, {opacity})'
 
-    def bucket_and_aggregate(df, group_col, group_2_col, total_col, bucket_col, asset_id_col, asset_name_col, sum_cols=None, first_cols=None, max_buckets=1000):
-        sum_cols = sum_cols or []
-        first_cols = first_cols or []
-        result = []
-
-        for group_vals, group_df in df.groupby(group_col):
-                group_sorted = group_df.sort_values(by=total_col)
-                n = len(group_sorted)
-                bucket_size = max(1, n // max_buckets)
-
-                group_sorted['bucket'] = (np.arange(n) // bucket_size)
-
-                agg_dict = {
-                    **{f"{col}": (col, "sum") for col in sum_cols},
-                    **{f"{col}": (col, "first") for col in first_cols},
-                    f"{total_col}": (total_col, "max"),
-                    f"{bucket_col}_min": (bucket_col, "min"),
-                    f"{bucket_col}_max": (bucket_col, "max"),
-                    f"{bucket_col}": (bucket_col, "max"),
-                    f"{group_2_col}": (group_2_col, "unique")
-                }
-                agg_df = group_sorted.groupby('bucket').agg(**agg_dict).reset_index()
-
-                asset_count = group_sorted.groupby('bucket')[asset_id_col].count().reset_index(drop=True)
-                agg_df[asset_id_col] = asset_count
-
-                agg_df[asset_name_col] = agg_df.apply(
-                    lambda row: f"assets with {bucket_col} from {row[f'{bucket_col}_min']:.2f} to {row[f'{bucket_col}_max']:.2f}",
-                    axis=1
-                )
-
-                if isinstance(group_col, list):
-                    for col_name, val in zip(group_col, group_vals if isinstance(group_vals, tuple) else (group_vals,)):
-                        agg_df[col_name] = val
-                else:
-                    agg_df[group_col] = group_vals
-
-                result.append(agg_df)
-
-        final_df = pd.concat(result).reset_index(drop=True)
-        return final_df
-
     # clean df
     df = gdf_asset.copy()
     df['asset_value'] = 1
@@ -649,8 +763,6 @@ def plot_abatement_curve(gdf_asset, selected_group, selected_color, dict_color,
     df[selected_color] = df[selected_color].apply(lambda x: False if pd.isna(x)==True else x)
     df['color'] = df[selected_color].map(dict_color[selected_color])
 
-    num_sectors = df['subsector'].nunique()
-
     # threshold
     if threshold == '':
         threshold = df[selected_y].max() + 1
@@ -754,97 +866,116 @@ def plot_abatement_curve(gdf_asset, selected_group, selected_color, dict_color,
     # create a selected_df based on highlighted assets
     selected_df = df[df[selected_list].isin(selected_assets)].copy()
 
+    # visible x-range, in value_cum units
+    x_full = (df['value_cum'].min(), df['value_cum'].max())
+    if x_range is None:
+        x_lo, x_hi = x_full
+    else:
+        x_lo = x_full[0] + x_range[0] * (x_full[1] - x_full[0])
+        x_hi = x_full[0] + x_range[1] * (x_full[1] - x_full[0])
+
     if selected_group == 'asset':
 
-        # limit number of assets plotted
-        if num_sectors > 3 or len(df) > 5000:
-            subset_df = bucket_and_aggregate(df, 'sector', 'subsector', 'value_cum', selected_y, 'asset_id', 'asset_name', ['emissions_quantity', 'net_reduction_potential'], ['color'])
-            subset_df['asset_type'] = 'N/A'
-            subset_df['country_name'] = 'Aggregated'
-            asset_id_txt = 'Total Assets:'
-        else:
+        # limit number of assets plotted to what the visible range needs
+        visible = steps_in_range(df['value_cum'], x_lo, x_hi)
+        lod_level = pick_lod_level(df, 'sector', visible)
+        if lod_cache is None:
+            lod_cache = {}
+
+        if lod_level is None:
             subset_df = df.copy()
             asset_id_txt = 'Asset ID:'
+        else:
+            if lod_level not in lod_cache:
+                lod_df = bucket_and_aggregate(df, 'sector', 'subsector', 'value_cum', selected_y, 'asset_id', 'asset_name', ['emissions_quantity', 'net_reduction_potential'], ['color'], max_buckets=lod_level)
+                lod_df['asset_type'] = 'N/A'
+                lod_df['country_name'] = 'Aggregated'
+                lod_cache[lod_level] = lod_df
+            subset_df = lod_cache[lod_level].copy()
+            asset_id_txt = 'Total Assets:'
+
+        if x_range is not None:
+            subset_df = clip_to_range(subset_df, 'value_cum', x_lo, x_hi)
 
         # set up formatting
         hover_id = 'asset_id'
         hover_name = 'asset_name'
+        hover_cols = ['subsector', 'country_name', hover_id, hover_name, 'asset_type', 'emissions_quantity', 'net_reduction_potential']
+        hover_template = (
+            "%{customdata[0]}<br>"
+            "%{customdata[1]}<br>"
+            f"<i>{asset_id_txt} %{{customdata[2]}}</i><br>"
+            "%{customdata[3]}<br>"
+            "Asset Type: %{customdata[4]}<br>"
+            f"{selected_y}: %{{y:.2~f}}<br><br>"
+            "Total Emissions: %{customdata[5]:,.0f}<br>"
+            "Total Reductions: %{customdata[6]:,.0f}"
+        )
         #asset highlights
-        highlight_hover_text = [
-            (
-                f"{subsector}<br>"
-                f"{country}<br>"
-                f"<i>{asset_id_txt} {hover_val}</i><br>"
-                f"{hover_val2}<br>"
-                f"Asset Type: {type}<br>"
-                f"{selected_y}: {yval}<br><br>"
-                f"Emissions: {emissions:,.0f}<br>"
-                f"Reduction: {reduction:,.0f}"
-            )
-            for subsector, country, hover_val, hover_val2, type, yval, emissions, reduction in zip(
-                selected_df['subsector'],
-                selected_df['country_name'],
-                selected_df[hover_id],
-                selected_df[hover_name],
-                selected_df['asset_type'],
-                selected_df[selected_y],
-                selected_df['emissions_quantity'],
-                selected_df['net_reduction_potential']
-            )
-        ]
+        highlight_template = (
+            "%{customdata[0]}<br>"
+            "%{customdata[1]}<br>"
+            f"<i>{asset_id_txt} %{{customdata[2]}}</i><br>"
+            "%{customdata[3]}<br>"
+            "Asset Type: %{customdata[4]}<br>"
+            f"{selected_y}: %{{y}}<br><br>"
+            "Emissions: %{customdata[5]:,.0f}<br>"
+            "Reduction: %{customdata[6]:,.0f}"
+        )
 
     elif selected_group == 'country':
         # set up formatting
         hover_id = 'iso3_country'
         hover_name = 'country_name'
+        hover_cols = ['subsector', hover_id, hover_name, 'emissions_quantity', 'net_reduction_potential']
+        hover_template = (
+            "%{customdata[0]}<br>"
+            "%{customdata[1]}<br>"
+            "%{customdata[2]}<br>"
+            f"{selected_y}: %{{y:.2~f}}<br><br>"
+            "Emissions: %{customdata[3]:,.0f}<br>"
+            "Reduction: %{customdata[4]:,.0f}"
+        )
         #asset highlights
-        highlight_hover_text = [
-            (
-                f"{subsector}<br>"
-                f"<i>{hover_val}</i><br>"
-                f"{hover_val2}<br>"
-                f"{selected_y}: {yval}<br><br>"
-                f"Emissions: {emissions:,.0f}<br>"
-                f"Reduction: {reduction:,.0f}"
-            )
-            for subsector, hover_val, hover_val2,  yval, emissions, reduction in zip(
-                selected_df['subsector'],
-                selected_df[hover_id],
-                selected_df[hover_name],
-                selected_df[selected_y],
-                selected_df['emissions_quantity'],
-                selected_df['net_reduction_potential']
-            )
-        ]
+        highlight_template = (
+            "%{customdata[0]}<br>"
+            "<i>%{customdata[1]}</i><br>"
+            "%{customdata[2]}<br>"
+            f"{selected_y}: %{{y}}<br><br>"
+            "Emissions: %{customdata[3]:,.0f}<br>"
+            "Reduction: %{customdata[4]:,.0f}"
+        )
         subset_df = df.copy()
 
     elif selected_group == 'strategy_name':
         # set up formatting
         hover_id = 'subsector'
         hover_name = 'strategy_name'
+        hover_cols = ['sector', hover_id, hover_name, 'emissions_quantity', 'net_reduction_potential']
+        hover_template = (
+            "%{customdata[0]}<br>"
+            "%{customdata[1]}<br>"
+            "%{customdata[2]}<br>"
+            f"{selected_y}: %{{y:.2~f}}<br><br>"
+            "Emissions: %{customdata[3]:,.0f}<br>"
+            "Reduction: %{customdata[4]:,.0f}"
+        )
         #asset highlights
-        highlight_hover_text = [
-            (
-                f"{sector}<br>"
-                f"<i>{hover_val}</i><br>"
-                f"{hover_val2}<br>"
-                f"{selected_y}: {yval}<br><br>"
-                f"Emissions: {emissions:,.0f}<br>"
-                f"Reduction: {reduction:,.0f}"
-            )
-            for sector, hover_val, hover_val2, yval, emissions, reduction in zip(
-                selected_df['sector'],
-                selected_df[hover_id],
-                selected_df[hover_name],
-                selected_df[selected_y],
-                selected_df['emissions_quantity'],
-                selected_df['net_reduction_potential']
-            )
-        ]
+        highlight_template = (
+            "%{customdata[0]}<br>"
+            "<i>%{customdata[1]}</i><br>"
+            "%{customdata[2]}<br>"
+            f"{selected_y}: %{{y}}<br><br>"
+            "Emissions: %{customdata[3]:,.0f}<br>"
+            "Reduction: %{customdata[4]:,.0f}"
+        )
         subset_df = df.copy()
 
     # create the fig
     fig = go.Figure()
+    traces = []
+    shapes = []
+    annotations = []
 
     # calculate metrics for formatting
     x_min, x_max = min(df['value_cum']), max(df['value_cum'])
@@ -852,88 +983,77 @@ def plot_abatement_curve(gdf_asset, selected_group, selected_color, dict_color,
     y_max = df[selected_y].max()
     y_offset = (y_max) * 0.01
     y_range_quantile = 0.99
-    
-    for i in range(1, len(subset_df)):
-        if selected_group == 'asset':
-            hover_text = (
-                f"{subset_df['subsector'][i]}<br>"
-                f"{subset_df['country_name'][i]}<br>"
-                f"<i>{asset_id_txt} {subset_df[hover_id][i]}</i><br>"
-                f"{subset_df[hover_name][i]}</i><br>"
-                f"Asset Type: {subset_df['asset_type'][i]}</i><br>"
-                f"{selected_y}: {round(subset_df[selected_y][i], 2)}</i><br><br>"
-                f"Total Emissions: {round(subset_df['emissions_quantity'][i]):,.0f}<br>"
-                f"Total Reductions: {round(subset_df['net_reduction_potential'][i]):,.0f}"
-            )
-        elif selected_group == 'country':
-            hover_text = (
-                f"{subset_df['subsector'][i]}<br>"
-                f"{subset_df[hover_id][i]}<br>"
-                f"{subset_df[hover_name][i]}<br>"
-                f"{selected_y}: {round(subset_df[selected_y][i], 2)}</i><br><br>"
-                f"Emissions: {round(subset_df['emissions_quantity'][i]):,.0f}<br>"
-                f"Reduction: {round(subset_df['net_reduction_potential'][i]):,.0f}"
-            )
-        elif selected_group == 'strategy_name':
-            hover_text = (
-                f"{subset_df['sector'][i]}<br>"
-                f"{subset_df[hover_id][i]}<br>"
-                f"{subset_df[hover_name][i]}<br>"
-                f"{selected_y}: {round(subset_df[selected_y][i], 2)}</i><br><br>"
-                f"Emissions: {round(subset_df['emissions_quantity'][i]):,.0f}<br>"
-                f"Reduction: {round(subset_df['net_reduction_potential'][i]):,.0f}"
-            )
-
-        color_value = subset_df['color'][i] 
-        y_vals = [subset_df[selected_y].iloc[i-1], subset_df[selected_y].iloc[i]]
-        if all(y <= threshold for y in y_vals):
-            fill_col = hex_to_rgba(color_value, 0.9)
-        else:
-            if fill:
-                fill_col = hex_to_rgba(color_value, 0.9)
-            else:
-                fill_col = 'rgba(0,0,0,0)'
-        
-
-        # if subset_df['sector'].iloc[i] != subset_df['sector'].iloc[i-1]:
-        #     continue
 
-        fig.add_trace(go.Scatter(
-            x=[subset_df['value_cum'].iloc[i-1], subset_df['value_cum'].iloc[i]],
-            y=[subset_df[selected_y].iloc[i], subset_df[selected_y].iloc[i]],
-            fill='tozeroy',
-            fillcolor=fill_col,
+    # one step per row after the first: from the previous row's cumulative x
+    # to this row's, at this row's y
+    x_cum = subset_df['value_cum'].to_numpy(dtype=float)
+    y_step = subset_df[selected_y].to_numpy(dtype=float)
+    x0, x1, y_seg = x_cum[:-1], x_cum[1:], y_step[1:]
+    under_threshold = (y_step[:-1] <= threshold) & (y_seg <= threshold)
+    filled = under_threshold | fill
+    seg_color = subset_df['color'].to_numpy()[1:]
+    seg_hover = subset_df[hover_cols].to_numpy(dtype=object)[1:]
+
+    # one line trace per color: steps separated by NaN gaps, hover data repeated
+    # for both ends of each step
+    for color_value in pd.unique(seg_color):
+        in_color = seg_color == color_value
+        n = int(in_color.sum())
+
+        x_line = np.full(3 * n, np.nan)
+        x_line[0::3], x_line[1::3] = x0[in_color], x1[in_color]
+        y_line = np.full(3 * n, np.nan)
+        y_line[0::3] = y_line[1::3] = y_seg[in_color]
+
+        # filled steps are drawn as one polygon that drops back to zero between
+        # steps, so a single tozeroy fill covers them all
+        in_fill = in_color & filled
+        if in_fill.any():
+            traces.append(go.Scattergl(
+                x=np.repeat(np.stack([x0[in_fill], x1[in_fill]], axis=1), 2, axis=1).ravel(),
+                y=(np.array([0, 1, 1, 0]) * y_seg[in_fill][:, None]).ravel(),
+                fill='tozeroy',
+                fillcolor=hex_to_rgba(color_value, 0.9),
+                line=dict(width=0),
+                mode='lines',
+                legendgroup=f'{color_value}',
+                showlegend=False,
+                hoverinfo='skip'))
+
+        traces.append(go.Scattergl(
+            x=x_line,
+            y=y_line,
+            customdata=np.repeat(seg_hover[in_color], 3, axis=0),
+            hovertemplate=hover_template + '<extra></extra>',
             line=dict(color=f'{color_value}', width=4),
             mode='lines',
-            name=f'{subset_df[hover_name][i]}',
-            line_shape='linear',
             legendgroup=f'{color_value}',
             showlegend=False,
-            hoverinfo='text',
-            hovertext=hover_text,
             hoverlabel=dict(
                 bgcolor='white',
                 font=dict(color=color_value, size=14))))
 
     #add line for threshold if needed
     if threshold != (df[selected_y].max() + 1):
-        fig.add_hline(
-            y=threshold,
-            line=dict(color='gray', width=2, dash='dot'))
-    
-    fig.add_trace(go.Scatter(
+        shapes.append(dict(
+            type='line',
+            xref='paper', x0=0, x1=1,
+            y0=threshold, y1=threshold,
+            line=dict(color='gray', width=2, dash='dot')))
+
+    traces.append(go.Scattergl(
         x=selected_df['value_cum'] - selected_df[selected_x] / 2,
         y=selected_df[selected_y],
+        customdata=selected_df[hover_cols].to_numpy(dtype=object),
         mode='markers',
         marker=dict(size=8, color='#A94442', symbol='diamond'),
         name="Selected Assets",
-        hoverinfo='text',
-        hovertext=highlight_hover_text,
+        hovertemplate=highlight_template + '<extra></extra>',
         hoverlabel=dict(
             bgcolor="white",
             font=dict(color='#A94442', size=14))))
-    
-    fig.add_trace(go.Scatter(
+
+    traces.append(go.Scatter(
         x=selected_df['value_cum'] - selected_df[selected_x] / 2,
         y=selected_df[selected_y] + y_offset,
         mode='text',
@@ -942,19 +1062,48 @@ def plot_abatement_curve(gdf_asset, selected_group, selected_color, dict_color,
         textposition="top right",
         textfont=dict(size=14, color="#A94442"),
         showlegend=False))
-    
+
     # fig.update_yaxes(showgrid=False, zeroline=False)
-    
+
     # add custom legend items
     for color_label, color_value in dict_color[selected_color].items():
-        fig.add_trace(go.Scatter(
+        traces.append(go.Scatter(
             x=[None], y=[None],
             mode='markers',
             marker=dict(color=color_value, size=10),
-            name=f'{color_label}', 
+            name=f'{color_label}',
             showlegend=True
         ))
 
+    # add line to the plot if overflowing information
+    ax_y_max = max(df[selected_y])
+    for line_name, line_y in dict_lines['outlier'].items():
+        shapes.append(dict(
+            type='line',
+            x0=x_min, x1=x_max,
+            y0=line_y, y1=line_y,
+            line=dict(color='#444546', width=1, dash='dash'),
+        ))
+        text_y = line_y
+        if line_y + 0.015 * ax_y_max > ax_y_max:
+            text_y = line_y - 0.015 * ax_y_max
+        elif line_y - 0.015 * ax_y_max < 0:
+            text_y = line_y + 0.015 * ax_y_max
+        annotations.append(dict(
+            x=x_max + 1,
+            y=text_y,
+            text=line_name,
+            showarrow=False,
+            font=dict(size=12, color='#444546'),
+            align='left',
+            xanchor='left',
+            yanchor='middle',
+            xref='x',
+            yref='y'
+        ))
+
+    fig.add_traces(traces)
+
     # format plot layout
     fig.update_layout(
         xaxis_title=x_axis_title,
@@ -968,43 +1117,18 @@ def plot_abatement_curve(gdf_asset, selected_group, selected_color, dict_color,
             zeroline=True,
             zerolinecolor='lightgrey',
             gridcolor='lightgrey',
-            range=[min(df['value_cum']), math.ceil(max(df['value_cum']))*1.1]),
+            range=[min(df['value_cum']), math.ceil(max(df['value_cum']))*1.1] if x_range is None else [x_lo, x_hi]),
         yaxis=dict(
             showgrid=True,
             zeroline=True,
             zerolinecolor='lightgrey',
             gridcolor='lightgrey',
             range=[min(df[selected_y]), df[selected_y].quantile(y_range_quantile) * 1.05]),
+        shapes=shapes,
+        annotations=annotations,
         height=700
-    
-    )
 
-    # add line to the plot if overflowing information
-    for line_name, line_y in dict_lines['outlier'].items():
-        fig.add_shape(
-            type='line',
-            x0=x_min, x1=x_max,
-            y0=line_y, y1=line_y,
-            line=dict(color='#444546', width=1, dash='dash'),
-        )
-        ax_y_max = max(df[selected_y])
-        text_y = line_y
-        if line_y + 0.015 * ax_y_max > ax_y_max:
-            text_y = line_y - 0.015 * ax_y_max
-        elif line_y - 0.015 * ax_y_max < 0:
-            text_y = line_y + 0.015 * ax_y_max
-        fig.add_annotation(
-            x=x_max + 1, 
-            y=text_y,
-            text=line_name,
-            showarrow=False,
-            font=dict(size=12, color='#444546'),
-            align='left',
-            xanchor='left',
-            yanchor='middle',
-            xref='x',
-            yref='y'
-        )
+    )
 
     # create csv to download the data
     if selected_group == 'asset':
@@ -1089,43 +1213,82 @@ def return_sector_type(sector):
 
 
 
-def get_reduction_induction_json(df_stacked_bar, df_induced):
-    def safe_format_number(x):
-        if x is None or (isinstance(x, float) and math.isnan(x)):
-            return "0"
-        return format_number_short(x)
+def format_number_short_array(values):
+    """
+    Vectorized format_number_short for a whole column. Nulls format as "0",
+    like the hover text has always shown them.
+    """
+    values = np.asarray(values, dtype=float)
+    magnitude = np.abs(values)
+    formatted = np.full(len(values), '0', dtype=object)
+
+    # (lower bound, scale, format, suffix), largest first like format_number_short
+    branches = [
+        (1_000_000_000, 1e9, '%.1f', 'B'),
+        (1_000_000, 1e6, '%.1f', 'M'),
+        (1_000, 1e3, '%.0f', 'K'),
+        (-np.inf, 1, '%.0f', ''),
+    ]
+    remaining = ~np.isnan(values)
+    for lower, scale, fmt, suffix in branches:
+        in_branch = remaining & (magnitude >= lower)
+        if in_branch.any():
+            formatted[in_branch] = np.char.add(np.char.mod(fmt, values[in_branch] / scale), suffix)
+        remaining &= ~in_branch
+
+    return formatted
 
-    summary = []
 
-    for _, row in df_stacked_bar.iterrows():
-        sector = row["sector"]
+def get_reduction_induction_json(df_stacked_bar, df_induced):
 
-        # gather inductions
-        sector_inductions = df_induced[df_induced["receiving_sector"] == sector]
-        inductions_list = []
-        for _, ind in sector_inductions.iterrows():
-            if ind["induced_emissions"] is not None and not math.isnan(ind["induced_emissions"]):
-                inductions_list.append({
-                    "inducing_sector": ind["inducing_sector"],
-                    "induced_emissions": ind["induced_emissions"],
-                    "formatted": safe_format_number(ind["induced_emissions"])
-                })
-
-        # core values
-        asset_reductions = row.get("emissions_reduced_at_asset", 0) or 0
-        reduction_potential = row.get("emissions_reduction_potential", 0) or 0
-        static_emissions = row.get("static_emissions_q", 0) or 0
-
-        asset_reductions_fmt = safe_format_number(asset_reductions)
-        reduction_potential_fmt = safe_format_number(reduction_potential)
-        static_emissions_fmt = safe_format_number(static_emissions)
-
-        # total inductions
-        total_inductions = sum(
-            ind["induced_emissions"] for ind in inductions_list if ind["induced_emissions"] is not None
+    # inductions: format every row at once, then split by receiving sector
+    df_ind = df_induced.loc[
+        df_induced["induced_emissions"].notna(),
+        ["receiving_sector", "inducing_sector", "induced_emissions"]
+    ].reset_index(drop=True)
+
+    induced_values = df_ind["induced_emissions"].to_numpy(dtype=float)
+    df_ind["formatted"] = format_number_short_array(induced_values)
+    df_ind["hover_line"] = (
+        "&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;(<span style='color:"
+        + pd.Series(np.where(induced_values >= 0, "red", "green"), dtype=object)
+        + "'>" + df_ind["formatted"] + "</span>) <i>"
+        + df_ind["inducing_sector"].astype(str) + "</i>"
+    )
+
+    records = [
+        {"inducing_sector": inducing_sector, "induced_emissions": induced_emissions, "formatted": formatted}
+        for inducing_sector, induced_emissions, formatted in zip(
+            df_ind["inducing_sector"].to_numpy(),
+            induced_values,
+            df_ind["formatted"].to_numpy()
         )
-        total_inductions_fmt = safe_format_number(total_inductions)
-        total_inductions_color = "red" if total_inductions >= 0 else "green"
+    ]
+    grouped = df_ind.groupby("receiving_sector", sort=False, observed=True)
+    sector_rows = grouped.indices
+    sector_totals = grouped["induced_emissions"].sum()
+    sector_totals_fmt = dict(zip(sector_totals.index, format_number_short_array(sector_totals.to_numpy())))
+    sector_lines = grouped["hover_line"].agg("<br>".join)
+
+    # core values, `or 0` as before: missing/None -> 0, NaN formats as "0"
+    def column(col):
+        if col not in df_stacked_bar:
+            return [0] * len(df_stacked_bar)
+        return [value or 0 for value in df_stacked_bar[col]]
+
+    asset_reductions_col = column("emissions_reduced_at_asset")
+    reduction_potential_col = column("emissions_reduction_potential")
+    static_emissions_col = column("static_emissions_q")
+
+    asset_reductions_fmt_col = format_number_short_array(asset_reductions_col)
+    reduction_potential_fmt_col = format_number_short_array(reduction_potential_col)
+    static_emissions_fmt_col = format_number_short_array(static_emissions_col)
+
+    summary = []
+
+    for i, sector in enumerate(df_stacked_bar["sector"]):
+        asset_reductions_fmt = asset_reductions_fmt_col[i]
+        reduction_potential_fmt = reduction_potential_fmt_col[i]
 
         # build hover text lines
         hover_lines = [f"<b>{sector}</b>"]
@@ -1133,7 +1296,6 @@ def get_reduction_induction_json(df_stacked_bar, df_induced):
         # Asset reductions (moved down with space)
         hover_lines.append("&nbsp;")
         hover_lines.append(
-            #f"<span style='color:green; font-size:13px; font-weight:bold'>{asset_reductions_fmt}</span> "
             f"<span style='color:green; font-size:13px; font-weight:bold'>&nbsp;{asset_reductions_fmt}</span>&nbsp;&nbsp;&nbsp;<span style='font-size:13px; font-weight:bold'>Asset Reductions</span>"
         )
 
@@ -1141,24 +1303,18 @@ def get_reduction_induction_json(df_stacked_bar, df_induced):
         hover_lines.append("&nbsp;")
 
         # Inductions
-        if inductions_list:
+        if sector in sector_rows:
+            inductions_list = [records[j] for j in sector_rows[sector]]
+            total_inductions = sector_totals[sector]
+            total_inductions_fmt = sector_totals_fmt[sector]
+            total_inductions_color = "red" if total_inductions >= 0 else "green"
             hover_lines.append(
                 f"<span style='color:{total_inductions_color}; font-size:13px; font-weight:bold'>{total_inductions_fmt}</span> "
                 f"<span style='font-size:13px; font-weight:bold'>&nbsp;&nbsp;Net Inductions:</span>"
             )
-            for ind in inductions_list:
-                val = ind["induced_emissions"]
-                if val is None or math.isnan(val):
-                    continue
-                if val >= 0:
-                    hover_lines.append(
-                        f"&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;(<span style='color:red'>{ind['formatted']}</span>) <i>{ind['inducing_sector']}</i>"
-                    )
-                else:
-                    hover_lines.append(
-                        f"&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;(<span style='color:green'>{ind['formatted']}</span>) <i>{ind['inducing_sector']}</i>"
-                    )
+            hover_lines.append(sector_lines[sector])
         else:
+            inductions_list = []
             hover_lines.append(
                 f"<span style='color:green; font-size:13px; font-weight:bold'>&nbsp;0&nbsp;&nbsp;</span> "
                 f"<span style='font-size:13px; font-weight:bold'>Net Inductions</span>"
@@ -1172,19 +1328,17 @@ def get_reduction_induction_json(df_stacked_bar, df_induced):
             f"<span style='color:green; font-size:14px; font-weight:bold'>✅ {reduction_potential_fmt} Net Reduction Opportunity</span>"
         )
 
-        # join with <br>
-        hover_text = "<br>".join(hover_lines)
-
         summary.append({
             "sector": sector,
-            "asset_reductions": asset_reductions,
+            "asset_reductions": asset_reductions_col[i],
             "asset_reductions_formatted": asset_reductions_fmt,
-            "reduction_potential": reduction_potential,
+            "reduction_potential": reduction_potential_col[i],
             "reduction_potential_formatted": reduction_potential_fmt,
-            "static_emissions": static_emissions,
-            "static_emissions_formatted": static_emissions_fmt,
+            "static_emissions": static_emissions_col[i],
+            "static_emissions_formatted": static_emissions_fmt_col[i],
             "inductions": inductions_list,
-            "hover_text": hover_text
+            # join with <br>
+            "hover_text": "<br>".join(hover_lines)
         })
 
     return summary